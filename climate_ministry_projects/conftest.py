@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Scripts import their modules from src and the shared modules from etis_common
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "etis_common"))
@@ -0,0 +1,246 @@
+# local
+import query_operations
+import snapshot_operations
+# standard
+import json
+import sqlite3
+
+
+# Structure: {table name: {column name: SQLite type name}}
+tables = {
+    # Contribution of every relevant project to the aggregates
+    "Contribution": {
+        "Key": "TEXT PRIMARY KEY",
+        "StartYear": "INTEGER",
+        "BudgetCents": "INTEGER"},
+    # Projects without start year are aggregated under a null StartYear
+    "Aggregate": {
+        "StartYear": "INTEGER UNIQUE",
+        "NProjects": "INTEGER",
+        "BudgetCents": "INTEGER"},
+    "Setting": {
+        "Key": "TEXT PRIMARY KEY",
+        "Value": "TEXT"}}
+
+
+def get_contribution(project: dict, financier_guids: set) -> tuple[int, int] | None:
+    """
+    Get contribution of a project record to the yearly aggregates.
+    :return: Start year and budget in whole cents. None if the project has no relevant financiers.
+    """
+    financier_guids_of_project = {financier.get("Guid") for financier in project.get("FinancingInstitutions") or []}
+    if financier_guids.isdisjoint(financier_guids_of_project):
+        return None
+    start_date = project.get("ProjectStartDate")
+    start_year = int(start_date[-4:]) if start_date else None
+    # Sums in whole cents stay exact when contributions are subtracted
+    budget_cents = round((project.get("FinancingInPeriodsTotal") or 0) * 100)
+    return start_year, budget_cents
+
+
+class YearlyAggregates:
+    """
+    Yearly counts and budgets of projects with relevant financiers, kept in a SQLite database.
+    Stores the contribution of every relevant project, so that aggregates are updated by the changes
+    between the aggregated snapshot and the latest snapshot, instead of recomputing them from all projects.
+    Aggregates are rebuilt from the latest snapshot if the snapshots can't be compared
+    (first run, financier set changed or the aggregated snapshot was removed from the record store).
+    """
+    def __init__(self, path: str, financier_guids: list[str]) -> None:
+        self.connection = sqlite3.connect(path)
+        self.financier_guids = set(financier_guids)
+        with self.connection:
+            for table, columns in tables.items():
+                columns_string = ", ".join(f"{column} {type_name}" for column, type_name in columns.items())
+                self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns_string})")
+
+    def get_setting(self, key: str) -> str | None:
+        row = self.connection.execute("SELECT Value FROM Setting WHERE Key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_setting(self, key: str, value: str) -> None:
+        self.connection.execute("INSERT OR REPLACE INTO Setting (Key, Value) VALUES (?, ?)", (key, value))
+
+    def add_contribution(self, key: str, contribution: tuple[int, int]) -> None:
+        start_year, budget_cents = contribution
+        self.connection.execute(
+            "INSERT INTO Contribution (Key, StartYear, BudgetCents) VALUES (?, ?, ?)",
+            (key, start_year, budget_cents))
+        # Upsert by IS, because unique constraints don't apply to nulls
+        cursor = self.connection.execute(
+            "UPDATE Aggregate SET NProjects = NProjects + 1, BudgetCents = BudgetCents + ? WHERE StartYear IS ?",
+            (budget_cents, start_year))
+        if cursor.rowcount == 0:
+            self.connection.execute(
+                "INSERT INTO Aggregate (StartYear, NProjects, BudgetCents) VALUES (?, 1, ?)",
+                (start_year, budget_cents))
+
+    def remove_contribution(self, key: str) -> None:
+        row = self.connection.execute("SELECT StartYear, BudgetCents FROM Contribution WHERE Key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        start_year, budget_cents = row
+        self.connection.execute("DELETE FROM Contribution WHERE Key = ?", (key,))
+        self.connection.execute(
+            "UPDATE Aggregate SET NProjects = NProjects - 1, BudgetCents = BudgetCents - ? WHERE StartYear IS ?",
+            (budget_cents, start_year))
+        self.connection.execute("DELETE FROM Aggregate WHERE StartYear IS ? AND NProjects = 0", (start_year,))
+
+    def rebuild(self, snapshot_catalog: snapshot_operations.SnapshotCatalog, filename: str) -> None:
+        """Compute aggregates from all records of a snapshot."""
+        key_field = snapshot_catalog.manifest["snapshots"][filename].get("key_field") or "Guid"
+        self.connection.execute("DELETE FROM Contribution")
+        self.connection.execute("DELETE FROM Aggregate")
+        # Structure: {key: contribution}. The last record of a key counts, the same way as in snapshot comparison.
+        contributions = {
+            snapshot_operations.get_nested_value(project, key_field): get_contribution(project, self.financier_guids)
+            for project in snapshot_catalog.read(filename)}
+        for key, contribution in contributions.items():
+            if key is not None and contribution is not None:
+                self.add_contribution(key, contribution)
+
+    def update(self, snapshot_catalog: snapshot_operations.SnapshotCatalog, file_handle: str) -> int | None:
+        """
+        Update aggregates to the latest snapshot of the file_handle.
+        Applies the contributions of added, removed and modified projects since the aggregated snapshot.
+        :return: Number of applied changes. None if aggregates were rebuilt from the latest snapshot.
+        """
+        latest_filename = snapshot_catalog.manifest["latest"][file_handle]
+        aggregated_filename = self.get_setting("snapshot")
+        financier_guids_string = json.dumps(sorted(self.financier_guids))
+        n_changes = None
+        with self.connection:
+            if aggregated_filename == latest_filename and self.get_setting("financier_guids") == financier_guids_string:
+                return 0
+            try:
+                if self.get_setting("financier_guids") != financier_guids_string:
+                    raise KeyError(financier_guids_string)
+                changes = snapshot_catalog.diff(aggregated_filename, latest_filename)
+                n_changes = 0
+                for change in changes:
+                    self.remove_contribution(change["key"])
+                    contribution = get_contribution(change["record"], self.financier_guids)
+                    if change["change"] != "removed" and contribution is not None:
+                        self.add_contribution(change["key"], contribution)
+                    n_changes += 1
+            except KeyError:
+                # Snapshots that aren't in the record store can't be compared
+                n_changes = None
+                self.rebuild(snapshot_catalog, latest_filename)
+            self.set_setting("snapshot", latest_filename)
+            self.set_setting("financier_guids", financier_guids_string)
+        return n_changes
+
+    def get_results(self) -> tuple[dict, dict]:
+        """
+        :return: Number of projects by start year and total budget (eur) by start year,
+        in the form of {start year: value}, ordered by start year
+        """
+        rows = self.connection.execute(
+            "SELECT StartYear, NProjects, BudgetCents FROM Aggregate ORDER BY StartYear IS NULL, StartYear").fetchall()
+        n_projects_by_year = {start_year: n_projects for start_year, n_projects, _ in rows}
+        total_budget_eur_by_year = {start_year: budget_cents / 100 for start_year, _, budget_cents in rows}
+        return n_projects_by_year, total_budget_eur_by_year
+
+
+# Structure: {table name: {column name: SQLite type name}}
+funding_tables = {
+    # Project counts and funding (in cents) of every financier by start year and status
+    "FundingCube": {
+        "FinancierGuid": "TEXT",
+        "StartYear": "INTEGER",
+        "StatusNameEng": "TEXT",
+        "NProjects": "INTEGER",
+        "FinancingCents": "INTEGER"}}
+
+# Dimensions of the funding cube
+funding_dimensions = ["StartYear", "StatusNameEng"]
+
+# Projects with distinct Guids (a project can be listed more than once in a dump)
+distinct_projects_sql = "SELECT * FROM Project WHERE rowid IN (SELECT MIN(rowid) FROM Project GROUP BY Guid)"
+
+
+class FundingDatabase(query_operations.EtisDatabase):
+    """
+    Query database of the latest raw snapshots with a precomputed funding cube:
+    project counts and funding of every financier by start year and status.
+    The cube is rebuilt together with the database update, when the latest projects snapshot changes.
+    """
+    tables = query_operations.tables | funding_tables
+    indexes = query_operations.indexes | {"FundingCube": ["FinancierGuid"]}
+    snapshot_tables = query_operations.EtisDatabase.snapshot_tables | {
+        "projects": query_operations.EtisDatabase.snapshot_tables["projects"] | {
+            "tables": query_operations.EtisDatabase.snapshot_tables["projects"]["tables"] + ["FundingCube"]}}
+
+    def build_aggregates(self, changed_handles: set[str]) -> None:
+        if "projects" not in changed_handles:
+            return
+        # Every project is counted once per financier. Sums in whole cents can be subtracted exactly.
+        self.connection.execute("DELETE FROM FundingCube")
+        self.connection.execute(f"""
+            INSERT INTO FundingCube
+            SELECT
+                Financier.FinancierGuid,
+                Project.StartYear,
+                Project.StatusNameEng,
+                COUNT(*),
+                SUM(CAST(ROUND(IFNULL(Project.FinancingInPeriodsTotal, 0) * 100) AS INTEGER))
+            FROM (SELECT DISTINCT ProjectGuid, FinancierGuid FROM ProjectFinancier) AS Financier
+            JOIN ({distinct_projects_sql}) AS Project ON Project.Guid = Financier.ProjectGuid
+            GROUP BY Financier.FinancierGuid, Project.StartYear, Project.StatusNameEng
+            """)
+
+    def get_funding(self, financier_guids: list[str], group_by: list[str] = ("StartYear",)) -> list[dict]:
+        """
+        Get number and total funding of projects that have any of the given financiers.
+        Sums financier cells of the funding cube and subtracts projects that are counted more than once,
+        because they have several of the given financiers. Only these projects are looked up.
+        :param financier_guids: Financier Guids
+        :param group_by: Funding cube dimensions to group by (StartYear, StatusNameEng)
+        :return: Rows in the form of {dimension: value, ..., "NProjects": n, "FinancingInPeriodsTotal": eur},
+        ordered by dimensions
+        """
+        financier_guids = list(financier_guids)
+        group_by = list(group_by)
+        if set(group_by) - set(funding_dimensions):
+            raise ValueError(f'Can only group funding by {funding_dimensions}')
+        placeholders = ", ".join("?" * len(financier_guids))
+        group_by_string = ", ".join(group_by)
+        select_string = "".join(f"{column}, " for column in group_by)
+        group_by_sql = f"GROUP BY {group_by_string}" if group_by else ""
+
+        # Structure: {dimension values: [n projects, financing cents]}
+        funding = dict()
+        for row in self.connection.execute(f"""
+                SELECT {select_string}SUM(NProjects), SUM(FinancingCents)
+                FROM FundingCube
+                WHERE FinancierGuid IN ({placeholders})
+                {group_by_sql}
+                """, financier_guids):
+            funding[tuple(row)[:-2]] = [row[-2], row[-1]]
+        for row in self.connection.execute(f"""
+                SELECT {select_string}SUM(NFinanciers - 1), SUM((NFinanciers - 1) * FinancingCents)
+                FROM (
+                    SELECT ProjectGuid, COUNT(DISTINCT FinancierGuid) AS NFinanciers
+                    FROM ProjectFinancier
+                    WHERE FinancierGuid IN ({placeholders})
+                    GROUP BY ProjectGuid
+                    HAVING NFinanciers > 1) AS Financier
+                JOIN (
+                    SELECT *, CAST(ROUND(IFNULL(FinancingInPeriodsTotal, 0) * 100) AS INTEGER) AS FinancingCents
+                    FROM ({distinct_projects_sql})) AS Project
+                ON Project.Guid = Financier.ProjectGuid
+                {group_by_sql}
+                """, financier_guids):
+            # Without group by, the sums are null if no project has several of the financiers
+            if row[-2] is None:
+                continue
+            funding[tuple(row)[:-2]][0] -= row[-2]
+            funding[tuple(row)[:-2]][1] -= row[-1]
+
+        return [
+            dict(zip(group_by, dimension_values)) | {"NProjects": n_projects, "FinancingInPeriodsTotal": financing_cents / 100}
+            for dimension_values, (n_projects, financing_cents) in sorted(
+                funding.items(),
+                key=lambda item: [(value is None, value) for value in item[0]])
+            if n_projects]
@@ -3,11 +3,16 @@ import datetime
 import json
 import logging
 import os
-import re
 import sys
 # external
 import requests
 import tqdm
+# local
+# Modules shared between the ETIS projects
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "etis_common"))
+import aggregate_operations
+import result_operations
+import snapshot_operations
 
 ##########
 # Inputs #
@@ -38,6 +43,21 @@ ETIS_FINANCIER_GUIDS = {
 }
 
 RAW_DATA_DIRECTORY_PATH = "./climate_ministry_projects/data/raw/"
+# Partition columns of raw snapshots in the form of {partition column: (nested) field}.
+# Reads that filter by partition columns open only the matching partitions.
+PROJECT_PARTITIONS = {"Status": "StatusNameEng", "StartYear": "ProjectStartYear"}
+
+# Snapshot retention: older raw snapshots are kept deduplicated in the record store and materialised on demand
+MATERIALISED_SNAPSHOTS = 1          # Number of latest snapshots of every stage to keep as files (0 - record store only)
+SNAPSHOT_MAX_AGE_DAYS = None        # Delete snapshots older than this (None - keep all)
+
+# SQLite database of the latest raw snapshots for queries (in the raw data directory)
+QUERY_DATABASE_FILENAME = "etis.sql"
+
+# Incremental aggregation: yearly results are updated by the projects changed since the previous run
+INCREMENTAL_AGGREGATION = True
+AGGREGATES_DATABASE_FILENAME = "aggregates.sql"      # In the raw data directory
+
 RESULTS_DATA_DIRECTORY_PATH = "./climate_ministry_projects/data/results/"
 
 
@@ -88,25 +108,6 @@ def get_timestamp_string() -> str:
     return timestamp_string
 
 
-def read_latest_file(dir_path: str, file_handle: str = None) -> list[dict]:
-    """
-    Reads file with the latest timestamp in filename from given dir_path.
-    If file_handle is given, checks only filenames with the given file_handle followed by a timestamp.
-    """
-    if not file_handle:
-        file_handle = ".+"
-    name_pattern = file_handle + r'_(\d+)'
-
-    files = [file for file in os.listdir(dir_path) if re.match(name_pattern, file)]
-    files_latest = sorted(files, key=lambda x: re.match(name_pattern, x).group(1))[-1]
-    path = f'{dir_path.strip("/")}/{files_latest}'
-
-    with open(path, encoding="utf8") as read_file:
-        data = json.loads(read_file.read())
-    
-    return data
-
-
 #####################
 # Environment setup #
 #####################
@@ -118,6 +119,9 @@ if not os.path.exists(RAW_DATA_DIRECTORY_PATH):
 if not os.path.exists(RESULTS_DATA_DIRECTORY_PATH):
     os.makedirs(RESULTS_DATA_DIRECTORY_PATH)
 
+# Snapshot catalog
+snapshot_catalog = snapshot_operations.SnapshotCatalog(RAW_DATA_DIRECTORY_PATH, n_materialised=MATERIALISED_SNAPSHOTS)
+
 # Logger
 logger = logging.getLogger()
 logger.setLevel("INFO")
@@ -164,39 +168,41 @@ with tqdm.tqdm() as ETIS_progress_bar:
         _ = ETIS_progress_bar.update()
 
 
-projects_save_path = f'{RAW_DATA_DIRECTORY_PATH.strip("/")}/projects_{get_timestamp_string()}.json'
-with open(projects_save_path, "w", encoding="utf8") as save_file:
-    save_file.write(json.dumps(projects, indent=2, ensure_ascii=False))
+# Start year is a partition column of raw project snapshots
+for project in projects:
+    project["ProjectStartYear"] = int(project["ProjectStartDate"][-4:]) if project.get("ProjectStartDate") else None
+
+# Raw data is saved as columnar snapshots: analysis stages read only the columns they use
+projects_save_path = snapshot_catalog.save_snapshot(projects, "projects", get_timestamp_string(), partition_by=PROJECT_PARTITIONS)
 
 info_string = f'Found {len(projects)} projects in ETIS. Saved to {projects_save_path}'
 logger.info(info_string)
 
+n_project_changes = snapshot_catalog.count_changes("projects")
+if n_project_changes:
+    info_string = f'Compared to the previous harvest: {n_project_changes["added"]} projects added, {n_project_changes["removed"]} removed, {n_project_changes["modified"]} modified.'
+    logger.info(info_string)
+
 
 ############################
 # Filter relevant projects #
 ############################
 
 # Reload data from save file
-projects = read_latest_file(RAW_DATA_DIRECTORY_PATH, "projects")
-
-# Filter projects with relevant financiers
-relevant_projects = []
-for project in projects:
-    financier_GUIDs = [financier["Guid"] for financier in project["FinancingInstitutions"]]
+projects = snapshot_catalog.read_latest_snapshot("projects")
 
-    # Select only climate ministry related projects
-    if not any(guid in ETIS_FINANCIER_GUIDS.values() for guid in financier_GUIDs):
-        continue
+# Filter projects with relevant financiers, using the financier index of the query database
+etis_database = aggregate_operations.FundingDatabase(
+    f'{RAW_DATA_DIRECTORY_PATH.strip("/")}/{QUERY_DATABASE_FILENAME}',
+    snapshot_catalog,
+    file_handles=["projects"])
+relevant_project_guids = {project["Guid"] for project in etis_database.get_projects(financier_guids=list(ETIS_FINANCIER_GUIDS.values()))}
+relevant_projects = [project for project in projects if project["Guid"] in relevant_project_guids]
 
-    # Select projects started in last 10 years
-    # if datetime.datetime.strptime(project["ProjectStartDate"], "%d.%m.%Y").year < (datetime.datetime.now().year - 10):
-    #     continue
-    
-    relevant_projects += [project]
+# Select projects started in last 10 years
+# relevant_projects = [project for project in relevant_projects if project["ProjectStartYear"] >= (datetime.datetime.now().year - 10)]
 
-relevant_projects_save_path = f'{RAW_DATA_DIRECTORY_PATH.strip("/")}/relevant_projects_{get_timestamp_string()}.json'
-with open(relevant_projects_save_path, "w", encoding="utf8") as save_file:
-    save_file.write(json.dumps(relevant_projects, indent=2, ensure_ascii=False))
+relevant_projects_save_path = snapshot_catalog.save_snapshot(relevant_projects, "relevant_projects", get_timestamp_string())
 
 info_string = f'Found {len(relevant_projects)} relevant projects. Saved to {relevant_projects_save_path}'
 logger.info(info_string)
@@ -206,23 +212,30 @@ logger.info(info_string)
 # Process data #
 ################
 
-# Reload data from save file
-relevant_projects = read_latest_file(RAW_DATA_DIRECTORY_PATH, "relevant_projects")
-
-# Select relevant data
-n_projects_by_year = {}
-total_budget_eur_by_year = {}
-for project in relevant_projects:
-    start_year = datetime.datetime.strptime(project["ProjectStartDate"], "%d.%m.%Y").year
-    if start_year not in n_projects_by_year:
-        n_projects_by_year[start_year] = 0
-        total_budget_eur_by_year[start_year] = 0
-    
-    n_projects_by_year[start_year] += 1
-    total_budget_eur_by_year[start_year] += project["FinancingInPeriodsTotal"]
-
-n_projects_by_year = dict(sorted(n_projects_by_year.items()))
-total_budget_eur_by_year = dict(sorted(total_budget_eur_by_year.items()))
+# Yearly counts and budgets of projects with relevant financiers
+if INCREMENTAL_AGGREGATION:
+    yearly_aggregates = aggregate_operations.YearlyAggregates(
+        f'{RAW_DATA_DIRECTORY_PATH.strip("/")}/{AGGREGATES_DATABASE_FILENAME}',
+        list(ETIS_FINANCIER_GUIDS.values()))
+    n_applied_changes = yearly_aggregates.update(snapshot_catalog, "projects")
+    n_projects_by_year, total_budget_eur_by_year = yearly_aggregates.get_results()
+
+    info_string = f'Updated yearly aggregates with {n_applied_changes} changed projects.'
+    if n_applied_changes is None:
+        info_string = 'Computed yearly aggregates from all projects.'
+    logger.info(info_string)
+else:
+    # From the precomputed funding cube
+    yearly_totals = etis_database.get_funding(ETIS_FINANCIER_GUIDS.values(), group_by=["StartYear"])
+    n_projects_by_year = {row["StartYear"]: row["NProjects"] for row in yearly_totals}
+    total_budget_eur_by_year = {row["StartYear"]: row["FinancingInPeriodsTotal"] for row in yearly_totals}
+
+# Projects without start year have no place in the yearly results: they are only reported
+n_projects_by_year, n_undated_projects = result_operations.split_undated(n_projects_by_year)
+total_budget_eur_by_year, undated_budget_eur = result_operations.split_undated(total_budget_eur_by_year)
+if n_undated_projects:
+    info_string = f'Left out {n_undated_projects} relevant projects without start year ({undated_budget_eur} EUR) from the yearly results.'
+    logger.info(info_string)
 
 # Save results
 n_projects_by_year_save_path = f'{RESULTS_DATA_DIRECTORY_PATH.strip("/")}/n_projects_by_year_{get_timestamp_string()}.json'
@@ -232,3 +245,13 @@ with open(n_projects_by_year_save_path, "w", encoding="utf8") as save_file:
 total_budget_eur_by_year_save_path = f'{RESULTS_DATA_DIRECTORY_PATH.strip("/")}/total_budget_eur_by_year_{get_timestamp_string()}.json'
 with open(total_budget_eur_by_year_save_path, "w", encoding="utf8") as save_file:
     save_file.write(json.dumps(total_budget_eur_by_year, indent=2, ensure_ascii=False))
+
+
+############################
+# Apply snapshot retention #
+############################
+
+n_removed_snapshots, n_dematerialised_snapshots = snapshot_catalog.apply_retention(max_age_days=SNAPSHOT_MAX_AGE_DAYS)
+
+info_string = f'Removed {n_removed_snapshots} expired raw snapshots. Moved {n_dematerialised_snapshots} older raw snapshots to the record store.'
+logger.info(info_string)
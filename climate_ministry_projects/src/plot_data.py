@@ -1,9 +1,7 @@
-# standard
-import json
-import os
-import re
 # external
 import plotly   # Also requires kaleido for static image export
+# local
+import result_operations
 
 
 ##########
@@ -14,38 +12,15 @@ RESULTS_DATA_DIRECTORY_PATH = "climate_ministry_projects/data/results/"
 PLOT_SAVE_PATH = "climate_ministry_projects/data/results/climate_ministry_projects.png"
 
 
-#############
-# Functions #
-#############
-
-def read_latest_file(dir_path: str, file_handle: str = None) -> list[dict]:
-    """
-    Reads file with the latest timestamp in filename from given dir_path.
-    If file_handle is given, checks only filenames with the given file_handle followed by a timestamp.
-    """
-    if not file_handle:
-        file_handle = ".+"
-    name_pattern = file_handle + r'_(\d+)'
-
-    files = [file for file in os.listdir(dir_path) if re.match(name_pattern, file)]
-    files_latest = sorted(files, key=lambda x: re.match(name_pattern, x).group(1))[-1]
-    path = f'{dir_path.strip("/")}/{files_latest}'
-
-    with open(path, encoding="utf8") as read_file:
-        data = json.loads(read_file.read())
-    
-    return data
-
-
 ################
 # Process data #
 ################
 
-n_projects_by_year_raw = read_latest_file(RESULTS_DATA_DIRECTORY_PATH, "n_projects_by_year")
-total_budget_eur_by_year_raw = read_latest_file(RESULTS_DATA_DIRECTORY_PATH, "total_budget_eur_by_year")
+n_projects_by_year_raw = result_operations.read_latest_file(RESULTS_DATA_DIRECTORY_PATH, "n_projects_by_year")
+total_budget_eur_by_year_raw = result_operations.read_latest_file(RESULTS_DATA_DIRECTORY_PATH, "total_budget_eur_by_year")
 
-n_projects_by_year = {int(year): n_projects for year, n_projects in n_projects_by_year_raw.items()}
-total_budget_eur_by_year = {int(year): total_budget_eur for year, total_budget_eur in total_budget_eur_by_year_raw.items()}
+n_projects_by_year = result_operations.parse_yearly_results(n_projects_by_year_raw)
+total_budget_eur_by_year = result_operations.parse_yearly_results(total_budget_eur_by_year_raw)
 years = list(range(min(n_projects_by_year.keys()), max(n_projects_by_year.keys()) + 1))
 
 n_projects = [n_projects_by_year.get(year, 0) for year in years]
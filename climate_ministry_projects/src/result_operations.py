@@ -0,0 +1,42 @@
+# standard
+import json
+import os
+import re
+
+
+def split_undated(results_by_year: dict) -> tuple[dict, float | int | None]:
+    """
+    Separate the result of projects without start year (None key) from yearly results.
+    Result files are keyed by year: a None key would be saved as "null".
+    :return: Yearly results without the None key and the result of projects without start year (None if there is none)
+    """
+    results_by_year = dict(results_by_year)
+    undated_result = results_by_year.pop(None, None)
+    return results_by_year, undated_result
+
+
+def read_latest_file(dir_path: str, file_handle: str = None) -> list[dict]:
+    """
+    Reads file with the latest timestamp in filename from given dir_path.
+    If file_handle is given, checks only filenames that are exactly the given file_handle followed by a timestamp.
+    """
+    file_handle = re.escape(file_handle) if file_handle else ".+"
+    name_pattern = re.compile(file_handle + r'_(\d+)[A-Z]*(\.\w+)?')
+
+    timestamps = {}
+    for file in os.listdir(dir_path):
+        name_match = name_pattern.fullmatch(file)
+        if name_match:
+            timestamps[file] = name_match.group(1)
+    files_latest = max(timestamps, key=timestamps.get)
+    path = f'{dir_path.strip("/")}/{files_latest}'
+
+    with open(path, encoding="utf8") as read_file:
+        data = json.loads(read_file.read())
+
+    return data
+
+
+def parse_yearly_results(results_by_year_raw: dict) -> dict:
+    """Convert yearly results read from a results file to {year: value}. JSON keeps the years as strings."""
+    return {int(year): value for year, value in results_by_year_raw.items()}
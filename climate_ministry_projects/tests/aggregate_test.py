@@ -0,0 +1,102 @@
+import json
+import sqlite3
+from aggregate_operations import FundingDatabase, YearlyAggregates
+from result_operations import parse_yearly_results, read_latest_file, split_undated
+from snapshot_operations import SnapshotCatalog
+
+def get_project(guid, start_year, status, financing, financier_guids):
+    return {
+        "Guid": guid,
+        "StatusNameEng": status,
+        "ProjectStartDate": None if start_year is None else f"01.01.{start_year}",
+        "FinancingInPeriodsTotal": financing,
+        "FinancingInstitutions": [{"Guid": financier_guid} for financier_guid in financier_guids]}
+
+def get_projects():
+    return [
+        get_project("p1", 2020, "Finished", 100.1, ["f1", "f2"]),
+        get_project("p2", 2020, "Ongoing", 50.0, ["f2", "f2"]),
+        get_project("p3", 2021, "Ongoing", None, ["f1"]),
+        get_project("p4", None, "Ongoing", 10.0, ["f1"]),
+        get_project("p5", 2021, "Ongoing", 1000.0, ["f3"]),
+        # Listed twice in the dump
+        get_project("p1", 2020, "Finished", 100.1, ["f1", "f2"])]
+
+def test_funding_cube(tmp_path):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path))
+    snapshot_catalog.save_snapshot(get_projects(), "projects", "20240101000000")
+    funding_database = FundingDatabase(str(tmp_path / "etis.sql"), snapshot_catalog, file_handles=["projects"])
+
+    # Projects with several of the given financiers are counted once
+    assert funding_database.get_funding(["f1", "f2"]) == [
+        {"StartYear": 2020, "NProjects": 2, "FinancingInPeriodsTotal": 150.1},
+        {"StartYear": 2021, "NProjects": 1, "FinancingInPeriodsTotal": 0.0},
+        {"StartYear": None, "NProjects": 1, "FinancingInPeriodsTotal": 10.0}]
+    assert funding_database.get_funding(["f2"], group_by=["StatusNameEng"]) == [
+        {"StatusNameEng": "Finished", "NProjects": 1, "FinancingInPeriodsTotal": 100.1},
+        {"StatusNameEng": "Ongoing", "NProjects": 1, "FinancingInPeriodsTotal": 50.0}]
+    assert funding_database.get_funding(["f1", "f3"], group_by=[]) == [{"NProjects": 4, "FinancingInPeriodsTotal": 1110.1}]
+    # Same as counting the relevant projects
+    relevant_projects = funding_database.get_projects(financier_guids=["f1", "f2"])
+    assert len({project["Guid"] for project in relevant_projects}) == 4
+
+def test_funding_cube_rebuild(tmp_path):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path))
+    snapshot_catalog.save_snapshot(get_projects(), "projects", "20240101000000")
+    path = str(tmp_path / "etis.sql")
+    FundingDatabase(path, snapshot_catalog)
+    snapshot_catalog.save_snapshot(get_projects()[1:2], "projects", "20240102000000")
+    assert FundingDatabase(path, snapshot_catalog).get_funding(["f1", "f2"]) == [
+        {"StartYear": 2020, "NProjects": 1, "FinancingInPeriodsTotal": 50.0}]
+    # Funding cube is not shared with the base query database
+    table_names = {name for name, in sqlite3.connect(path).execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "FundingCube" in table_names
+
+def test_yearly_aggregates(tmp_path):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path))
+    snapshot_catalog.save_snapshot(get_projects(), "projects", "20240101000000")
+    yearly_aggregates = YearlyAggregates(str(tmp_path / "aggregates.sql"), ["f1", "f2"])
+    assert yearly_aggregates.update(snapshot_catalog, "projects") is None
+    assert yearly_aggregates.get_results() == ({2020: 2, 2021: 1, None: 1}, {2020: 150.1, 2021: 0.0, None: 10.0})
+    assert yearly_aggregates.update(snapshot_catalog, "projects") == 0
+
+    # Project without start year is added and removed, another one gets a start year
+    projects = get_projects()[:3] + [
+        get_project("p4", 2022, "Ongoing", 10.0, ["f1"]),
+        get_project("p6", None, "Ongoing", 5.0, ["f2"]),
+        get_project("p7", None, "Ongoing", 1.0, ["f2"])]
+    snapshot_catalog.save_snapshot(projects, "projects", "20240102000000")
+    assert yearly_aggregates.update(snapshot_catalog, "projects") == 4
+    assert yearly_aggregates.get_results() == ({2020: 2, 2021: 1, 2022: 1, None: 2}, {2020: 150.1, 2021: 0.0, 2022: 10.0, None: 6.0})
+    snapshot_catalog.save_snapshot(projects[:-2], "projects", "20240103000000")
+    assert yearly_aggregates.update(snapshot_catalog, "projects") == 2
+    incremental_results = yearly_aggregates.get_results()
+    assert incremental_results == ({2020: 2, 2021: 1, 2022: 1}, {2020: 150.1, 2021: 0.0, 2022: 10.0})
+
+    # Same as computing the aggregates from all projects
+    rebuilt_aggregates = YearlyAggregates(str(tmp_path / "rebuilt_aggregates.sql"), ["f1", "f2"])
+    assert rebuilt_aggregates.update(snapshot_catalog, "projects") is None
+    assert rebuilt_aggregates.get_results() == incremental_results
+
+def test_results_parse_for_plotting(tmp_path, monkeypatch):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path))
+    snapshot_catalog.save_snapshot(get_projects(), "projects", "20240101000000")
+    yearly_aggregates = YearlyAggregates(str(tmp_path / "aggregates.sql"), ["f1", "f2"])
+    yearly_aggregates.update(snapshot_catalog, "projects")
+    funding_database = FundingDatabase(str(tmp_path / "etis.sql"), snapshot_catalog, file_handles=["projects"])
+    yearly_totals = funding_database.get_funding(["f1", "f2"])
+    n_projects_by_year, total_budget_eur_by_year = yearly_aggregates.get_results()
+    # Incremental and funding cube results are saved the same way
+    assert n_projects_by_year == {row["StartYear"]: row["NProjects"] for row in yearly_totals}
+
+    # Projects without start year are reported separately, the result files only have years
+    n_projects_by_year, n_undated_projects = split_undated(n_projects_by_year)
+    total_budget_eur_by_year, undated_budget_eur = split_undated(total_budget_eur_by_year)
+    assert (n_undated_projects, undated_budget_eur) == (1, 10.0)
+    # Results directories are given relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    for file_handle, results in [("n_projects_by_year", n_projects_by_year), ("total_budget_eur_by_year", total_budget_eur_by_year)]:
+        (tmp_path / f"{file_handle}_20240101000000UTC.json").write_text(json.dumps(results, indent=2), encoding="utf8")
+    assert parse_yearly_results(read_latest_file("./", "n_projects_by_year")) == {2020: 2, 2021: 1}
+    assert parse_yearly_results(read_latest_file("./", "total_budget_eur_by_year")) == {2020: 150.1, 2021: 0.0}
+    assert split_undated({2020: 2}) == ({2020: 2}, None)
@@ -0,0 +1,307 @@
+# local
+import record_operations
+import snapshot_operations
+# standard
+import json
+import sqlite3
+
+
+# Structure: {table name: {column name: SQLite type name}}
+tables = {
+    "Project": {
+        "Guid": "TEXT",
+        "Title": "TEXT",
+        "StatusNameEng": "TEXT",
+        "StartDate": "TEXT",
+        "EndDate": "TEXT",
+        "StartYear": "INTEGER",
+        "FinancingInPeriodsTotal": "REAL"},
+    "ProjectFinancier": {
+        "ProjectGuid": "TEXT",
+        "FinancierGuid": "TEXT",
+        "FinancierName": "TEXT"},
+    "ProjectInstitution": {
+        "ProjectGuid": "TEXT",
+        "InstitutionGuid": "TEXT",
+        "InstitutionName": "TEXT"},
+    "ProjectPublication": {
+        "ProjectGuid": "TEXT",
+        "PublicationGuid": "TEXT"},
+    "Publication": {
+        "Guid": "TEXT",
+        "Title": "TEXT",
+        "ClassificationCode": "TEXT",
+        "PublicationStatusEng": "TEXT",
+        "PublishingYear": "INTEGER",
+        "DateCreated": "TEXT"},
+    "Setting": {
+        "Key": "TEXT PRIMARY KEY",
+        "Value": "TEXT"}}
+
+# Indexed lookup columns. Structure: {table name: [column name, ...]}
+indexes = {
+    "Project": ["Guid", "StartYear"],
+    "ProjectFinancier": ["ProjectGuid", "FinancierGuid"],
+    "ProjectInstitution": ["ProjectGuid", "InstitutionGuid"],
+    "ProjectPublication": ["ProjectGuid", "PublicationGuid"],
+    "Publication": ["Guid", "ClassificationCode"]}
+
+
+def get_iso_date(date_string: str) -> str | None:
+    """Convert ETIS date (31.01.2023) to ISO date (2023-01-31), so that dates sort and compare as strings."""
+    if not date_string:
+        return None
+    return record_operations.get_date(record_operations.get_epoch_day(date_string)).isoformat()
+
+
+def get_project_rows(projects: list[dict]) -> dict:
+    """
+    Flatten project records to table rows.
+    :return: Rows in the form of {table name: [row tuple, ...]}
+    """
+    rows = {"Project": list(), "ProjectFinancier": list(), "ProjectInstitution": list(), "ProjectPublication": list()}
+    for project in projects:
+        start_date = get_iso_date(project.get("ProjectStartDate"))
+        rows["Project"] += [(
+            project["Guid"],
+            project.get("Title"),
+            project.get("StatusNameEng"),
+            start_date,
+            get_iso_date(project.get("ProjectEndDate")),
+            int(start_date[:4]) if start_date else None,
+            project.get("FinancingInPeriodsTotal"))]
+        rows["ProjectFinancier"] += [
+            (project["Guid"], financier.get("Guid"), financier.get("Name"))
+            for financier in project.get("FinancingInstitutions") or []]
+        rows["ProjectInstitution"] += [
+            (project["Guid"], institution.get("Guid"), (institution.get("HeadInstitutionNameEng") or "").strip(" ") or None)
+            for institution in project.get("Institutions") or []]
+        rows["ProjectPublication"] += [
+            (project["Guid"], publication.get("Guid"))
+            for publication in project.get("Publications") or []]
+    return rows
+
+
+def get_publication_rows(publications: list[dict]) -> dict:
+    """
+    Flatten publication records (in the form of {"GUID": ..., "DATA": {...}}) to table rows.
+    :return: Rows in the form of {table name: [row tuple, ...]}
+    """
+    rows = {"Publication": list()}
+    for publication in publications:
+        data = publication.get("DATA") or {}
+        publishing_year = data.get("PublishingYear")
+        rows["Publication"] += [(
+            publication["GUID"],
+            data.get("Title"),
+            data.get("ClassificationCode"),
+            data.get("PublicationStatusEng"),
+            None if publishing_year is None else int(publishing_year),
+            data.get("DateCreated"))]
+    return rows
+
+
+class EtisDatabase:
+    """
+    SQLite database of the latest raw projects and publications snapshots for local queries:
+    group-by aggregates, joins and indexed lookups by project, financier, institution and publication Guid.
+    Kept up to date with the latest snapshots in the catalog: changed records are applied from the snapshot diff,
+    a snapshot is only loaded from scratch when there is nothing to compare to or its filters change.
+    Subclasses can add tables that are computed from the loaded tables (see build_aggregates).
+    """
+    tables = tables
+    indexes = indexes
+    # Structure: {snapshot file handle: {
+    #   "get_rows": function records -> {table name: rows},
+    #   "tables": [table name, ...],
+    #   "columns": [(nested) record field that get_rows reads, ...],
+    #   "key_field": (nested) record field that identifies a record between snapshots}}
+    snapshot_tables = {
+        "projects": {
+            "get_rows": get_project_rows,
+            "tables": ["Project", "ProjectFinancier", "ProjectInstitution", "ProjectPublication"],
+            "columns": [
+                "Guid", "Title", "StatusNameEng", "ProjectStartDate", "ProjectEndDate", "FinancingInPeriodsTotal",
+                "FinancingInstitutions", "Institutions", "Publications"],
+            "key_field": "Guid"},
+        "publications": {
+            "get_rows": get_publication_rows,
+            "tables": ["Publication"],
+            "columns": [
+                "GUID", "DATA.Title", "DATA.ClassificationCode", "DATA.PublicationStatusEng", "DATA.PublishingYear",
+                "DATA.DateCreated"],
+            "key_field": "GUID"}}
+    # Column that holds the record key in the tables of a snapshot. Structure: {table name: column name}
+    key_columns = {
+        "Project": "Guid",
+        "ProjectFinancier": "ProjectGuid",
+        "ProjectInstitution": "ProjectGuid",
+        "ProjectPublication": "ProjectGuid",
+        "Publication": "Guid"}
+
+    def __init__(
+            self,
+            path: str,
+            snapshot_catalog: snapshot_operations.SnapshotCatalog,
+            file_handles: list[str] = ("projects", "publications"),
+            filters: dict = None) -> None:
+        """
+        :param path: Database path
+        :param snapshot_catalog: Catalog of the raw snapshots
+        :param file_handles: Snapshots to load. Only the tables of these snapshots are created.
+        :param filters: Records to load in the form of {file handle: {(nested) field path: [allowed value, ...]}}.
+        Filters on partition fields only read the matching partitions of the snapshot.
+        """
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.snapshot_catalog = snapshot_catalog
+        self.filters = {file_handle: (filters or dict()).get(file_handle) or dict() for file_handle in file_handles}
+        # Structure: {file handle: {"snapshot": filename, "content_hash": ..., "filters": {field path: [value, ...]}}}
+        latest_snapshots = {
+            file_handle: {
+                "snapshot": snapshot_catalog.manifest["latest"][file_handle],
+                "content_hash": snapshot_catalog.manifest["snapshots"][snapshot_catalog.manifest["latest"][file_handle]]["content_hash"],
+                "filters": {field_path: list(values) for field_path, values in self.filters[file_handle].items()}}
+            for file_handle in file_handles
+            if file_handle in snapshot_catalog.manifest["latest"]}
+        loaded_snapshots = json.loads(self.get_setting("snapshots") or "{}")
+        if loaded_snapshots != latest_snapshots:
+            self.update(loaded_snapshots, latest_snapshots)
+
+    def get_setting(self, key: str) -> str | None:
+        try:
+            row = self.connection.execute("SELECT Value FROM Setting WHERE Key = ?", (key,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    def update(self, loaded_snapshots: dict, latest_snapshots: dict) -> None:
+        """
+        Bring the tables of changed snapshots up to date in one transaction.
+        :param loaded_snapshots: Snapshots in the database. See latest_snapshots.
+        :param latest_snapshots: Latest snapshots in the catalog in the form of
+        {file handle: {"snapshot": filename, "content_hash": ..., "filters": {field path: [value, ...]}}}
+        """
+        changed_handles = {
+            file_handle for file_handle, snapshot in latest_snapshots.items()
+            if loaded_snapshots.get(file_handle) != snapshot}
+        loaded_tables = ["Setting"] + [
+            table for file_handle in latest_snapshots for table in self.snapshot_tables[file_handle]["tables"]]
+        with self.connection:
+            # Tables of snapshots that are no longer loaded
+            for table in self.tables:
+                if table not in loaded_tables:
+                    self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS Setting (Key TEXT PRIMARY KEY, Value TEXT)")
+            for file_handle in changed_handles:
+                changes = self.get_changes(loaded_snapshots.get(file_handle), latest_snapshots[file_handle])
+                if changes is None:
+                    self.load(file_handle, latest_snapshots[file_handle]["snapshot"])
+                else:
+                    self.apply_changes(file_handle, changes)
+            self.build_aggregates(changed_handles)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO Setting (Key, Value) VALUES ('snapshots', ?)",
+                (json.dumps(latest_snapshots, sort_keys=True),))
+        self.connection.execute("ANALYZE")
+
+    def get_changes(self, loaded_snapshot: dict | None, latest_snapshot: dict) -> list[dict] | None:
+        """
+        Get record changes between the loaded and the latest snapshot of a file handle.
+        :return: Changes from SnapshotCatalog.diff. None if the snapshot has to be loaded from scratch:
+        nothing is loaded, filters changed or the snapshots can't be compared.
+        """
+        if loaded_snapshot is None or loaded_snapshot["filters"] != latest_snapshot["filters"]:
+            return None
+        if loaded_snapshot["snapshot"] not in self.snapshot_catalog.manifest["snapshots"]:
+            return None
+        try:
+            return list(self.snapshot_catalog.diff(loaded_snapshot["snapshot"], latest_snapshot["snapshot"]))
+        except KeyError:
+            return None
+
+    def insert_rows(self, file_handle: str, records: list[dict]) -> None:
+        for table, rows in self.snapshot_tables[file_handle]["get_rows"](records).items():
+            placeholders = ", ".join("?" * len(self.tables[table]))
+            self.connection.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+
+    def load(self, file_handle: str, filename: str) -> None:
+        """
+        (Re)create the tables of a snapshot and load the columns that they need.
+        Only the last record of a key is loaded, the same way as snapshots are compared.
+        """
+        snapshot_tables = self.snapshot_tables[file_handle]
+        for table in snapshot_tables["tables"]:
+            columns_string = ", ".join(f"{column} {type_name}" for column, type_name in self.tables[table].items())
+            self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+            self.connection.execute(f"CREATE TABLE {table} ({columns_string})")
+        filter_expression = snapshot_operations.get_filter_expression(
+            self.filters[file_handle],
+            self.snapshot_catalog.manifest["snapshots"][filename].get("partition_by"))
+        records = self.snapshot_catalog.read(filename, columns=snapshot_tables["columns"], filters=filter_expression)
+        # Structure: {key: record}
+        records_by_key = dict()
+        for record in records:
+            key = snapshot_operations.get_nested_value(record, snapshot_tables["key_field"])
+            if key is not None:
+                records_by_key[key] = record
+        self.insert_rows(file_handle, list(records_by_key.values()))
+        # Indexes are created after loading, which is faster than updating them on every insert
+        for table in snapshot_tables["tables"]:
+            for column in self.indexes.get(table, []):
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS {table}{column} ON {table} ({column})")
+
+    def apply_changes(self, file_handle: str, changes: list[dict]) -> None:
+        """Replace rows of changed records and delete rows of removed records (see SnapshotCatalog.diff)."""
+        keys = [(change["key"],) for change in changes]
+        for table in self.snapshot_tables[file_handle]["tables"]:
+            if table in self.key_columns:
+                self.connection.executemany(f"DELETE FROM {table} WHERE {self.key_columns[table]} = ?", keys)
+        self.insert_rows(file_handle, [
+            change["record"] for change in changes
+            if change["change"] != "removed"
+            and snapshot_operations.matches_filters(change["record"], self.filters[file_handle])])
+
+    def build_aggregates(self, changed_handles: set[str]) -> None:
+        """
+        Fill tables that are computed from the loaded tables. Runs in the same transaction as the update,
+        after the tables of changed snapshots are up to date. Nothing to compute in the base class.
+        :param changed_handles: File handles of the snapshots that changed
+        """
+        return
+
+    def query(self, sql: str, parameters: list = ()) -> list[dict]:
+        """
+        Run a SQL query. E.g. yearly project counts of a financier:
+        SELECT StartYear, COUNT(*) AS NProjects FROM Project JOIN ProjectFinancier ON ProjectGuid = Guid
+        WHERE FinancierGuid = ? GROUP BY StartYear
+        :return: Result rows as dicts of column name: value
+        """
+        return [dict(row) for row in self.connection.execute(sql, parameters)]
+
+    def get_projects(
+            self,
+            guids: list[str] = None,
+            financier_guids: list[str] = None,
+            institution_guids: list[str] = None) -> list[dict]:
+        """
+        Get projects by project Guids, by financier Guids (any financier matches)
+        and by institution Guids (any institution matches). Conditions are combined with AND.
+        """
+        conditions = list()
+        parameters = list()
+        for subquery, values in [
+                ("?", guids),
+                ("SELECT ProjectGuid FROM ProjectFinancier WHERE FinancierGuid IN (?)", financier_guids),
+                ("SELECT ProjectGuid FROM ProjectInstitution WHERE InstitutionGuid IN (?)", institution_guids)]:
+            if values is None:
+                continue
+            placeholders = ", ".join("?" * len(values))
+            conditions += [f"Guid IN ({subquery.replace('?', placeholders)})"]
+            parameters += list(values)
+        where_string = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self.query(f"SELECT * FROM Project {where_string} ORDER BY rowid", parameters)
+
+    def get_publications(self, guids: list[str]) -> list[dict]:
+        placeholders = ", ".join("?" * len(guids))
+        return self.query(f"SELECT * FROM Publication WHERE Guid IN ({placeholders}) ORDER BY rowid", list(guids))
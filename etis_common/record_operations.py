@@ -0,0 +1,131 @@
+# standard
+import dataclasses
+import datetime
+import functools
+import json
+import sys
+
+
+# Structure: {SQLite type name in settings.json: Python type of decoded values}
+column_types = {
+    "TEXT": str,
+    "INT": int,
+    "FLOAT": float,
+    "BLOB": object}
+
+epoch_date = datetime.date(1970, 1, 1)
+
+
+def load_settings(path: str) -> dict:
+    with open(path) as settings_file:
+        return json.loads(settings_file.read())
+
+
+@functools.lru_cache(maxsize=None)
+def get_epoch_day(date_string: str) -> int:
+    """
+    Get days since 1970-01-01 of a date string in ISO (2023-01-31) or ETIS (31.01.2023) format.
+    Cached: the same dates repeat a lot between records.
+    """
+    if date_string[2:3] == ".":
+        date = datetime.datetime.strptime(date_string, "%d.%m.%Y").date()
+    else:
+        date = datetime.date.fromisoformat(date_string)
+    return (date - epoch_date).days
+
+
+def get_date(epoch_day: int) -> datetime.date:
+    return epoch_date + datetime.timedelta(days=epoch_day)
+
+
+def decode_text(value):
+    return value
+
+
+def decode_category(value):
+    # Interned strings of repeated values share a single object
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def decode_int(value):
+    return None if value is None or value == "" else int(value)
+
+
+def decode_float(value):
+    return None if value is None or value == "" else float(value)
+
+
+def decode_date(value):
+    if not isinstance(value, str) or not value:
+        return value or None
+    # Time of day is dropped (e.g. 2023-01-31T12:00:00)
+    return get_epoch_day(value[:10])
+
+
+def decode_blob(value):
+    # Nested lists and dicts are kept as they are
+    return value
+
+
+class RecordDecoder:
+    """
+    Decodes raw API records (dicts) into compact typed rows in one pass.
+    Rows are slotted dataclass instances with a field for every column (missing values are None).
+    Column types are the SQLite type names in settings.json (TEXT, INT, FLOAT, BLOB).
+    """
+    # Structure: {SQLite type name: decoding function}
+    decoders = {
+        "TEXT": decode_text,
+        "INT": decode_int,
+        "FLOAT": decode_float,
+        "BLOB": decode_blob}
+
+    def __init__(
+            self,
+            columns: dict,
+            date_columns: list[str] = (),
+            categorical_columns: list[str] = (),
+            row_name: str = "Row") -> None:
+        """
+        :param columns: A dict in the form of {column name: SQLite type name} (e.g. "TEXT PRIMARY KEY")
+        :param date_columns: Columns with date strings. Decoded to days since 1970-01-01 (int).
+        :param categorical_columns: Text columns with few distinct values. Decoded to interned strings.
+        :param row_name: Name of the row class
+        """
+        self.columns = list(columns)
+        fields = list()
+        # Decoding function of every column, in column order
+        self.column_decoders = list()
+        for column, type_name in columns.items():
+            type_name = type_name.split(" ")[0]
+            if column in date_columns:
+                fields += [(column, int | None)]
+                self.column_decoders += [decode_date]
+            elif column in categorical_columns:
+                fields += [(column, str | None)]
+                self.column_decoders += [decode_category]
+            else:
+                fields += [(column, column_types[type_name] | None)]
+                self.column_decoders += [self.decoders[type_name]]
+        self.row_class = dataclasses.make_dataclass(row_name, fields, slots=True)
+
+    @classmethod
+    def from_settings(cls, settings: dict, table: str = "publication", row_name: str = "Publication") -> 'RecordDecoder':
+        """
+        Get decoder for the columns of a table in settings.json.
+        Uses keys {table}_columns, {table}_date_columns and {table}_categorical_columns.
+        """
+        return cls(
+            columns=settings[f"{table}_columns"],
+            date_columns=settings.get(f"{table}_date_columns", ()),
+            categorical_columns=settings.get(f"{table}_categorical_columns", ()),
+            row_name=row_name)
+
+    def decode(self, record: dict):
+        return self.row_class(*[
+            decode(record.get(column))
+            for column, decode in zip(self.columns, self.column_decoders)])
+
+    def to_dict(self, row) -> dict:
+        """Get row as a dict of column name: value (values are not copied)."""
+        return {column: getattr(row, column) for column in self.columns}
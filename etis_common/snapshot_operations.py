@@ -0,0 +1,626 @@
+# standard
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import zlib
+# external
+import pyarrow
+import pyarrow.compute
+import pyarrow.dataset
+import pyarrow.parquet
+
+
+def field(path: str) -> pyarrow.compute.Expression:
+    """
+    Get a filter expression reference to a (nested) column.
+    E.g. field("DATA.ClassificationCode") == "1.1."
+    """
+    return pyarrow.compute.field(*path.split("."))
+
+
+def get_nested_value(record: dict, path: str):
+    for key in path.split("."):
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return record
+
+
+def get_filter_expression(filters: dict, partition_by: dict = None) -> pyarrow.compute.Expression | None:
+    """
+    Get a read filter expression of value filters.
+    Fields that are partition fields of the snapshot are filtered by their partition columns,
+    so that reads open only the matching partitions.
+    :param filters: Filters in the form of {(nested) field path: [allowed value, ...]}
+    :param partition_by: Partition columns of the snapshot in the form of {partition column: (nested) field path}
+    :return: Filter expression. None if there are no filters.
+    """
+    partition_columns = {field_path: column for column, field_path in (partition_by or {}).items()}
+    expression = None
+    for field_path, values in filters.items():
+        condition = field(partition_columns.get(field_path, field_path)).isin(list(values))
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def matches_filters(record: dict, filters: dict) -> bool:
+    """Check if a record passes value filters in the form of {(nested) field path: [allowed value, ...]}."""
+    return all(get_nested_value(record, field_path) in values for field_path, values in filters.items())
+
+
+def project_record(record: dict, columns: list[str]) -> dict:
+    """
+    Select (nested) columns of a record, the same way as read_snapshot does.
+    Missing and empty dict values are None. Nested columns are returned nested.
+    """
+    projected_record = dict()
+    for column in columns:
+        value = get_nested_value(record, column)
+        *parent_keys, key = column.split(".")
+        parent = projected_record
+        for parent_key in parent_keys:
+            parent = parent.setdefault(parent_key, dict())
+        parent[key] = None if value == {} else value
+    return projected_record
+
+
+def write_snapshot(
+        records: list[dict],
+        path: str,
+        sort_by: str = None,
+        partition_by: dict = None,
+        row_group_size: int = 10000) -> None:
+    """
+    Save records as a columnar (Parquet) snapshot.
+    Nested lists and dicts (e.g. Publications, Institutions, FinancingInstitutions) are stored as list/struct columns.
+    Empty dicts are stored as nulls.
+    :param records: List of records (dicts)
+    :param path: Save path
+    :param sort_by: (Nested) column to sort records by, so that row groups have narrow value ranges to skip on read
+    :param partition_by: Partition columns in the form of {partition column: (nested) field path}.
+    If given, the snapshot is saved as a directory with a subdirectory for every partition value
+    (e.g. ClassificationCode=1.1./PublishingYear=2021/part-0.parquet). Reads that filter by partition columns
+    open only the matching partitions. Partition column names can't be record fields.
+    :param row_group_size: Number of records per row group (unit of skipping on read)
+    """
+    partition_by = partition_by or dict()
+    if any(column in record for record in records for column in partition_by):
+        raise ValueError(f'Partition columns {list(partition_by)} overlap with record fields')
+    records = [
+        {key: None if value == {} else value for key, value in record.items()}
+        | {column: get_nested_value(record, field_path) for column, field_path in partition_by.items()}
+        for record in records]
+    if sort_by:
+        # Nulls last
+        records = sorted(records, key=lambda record: (
+            get_nested_value(record, sort_by) is None,
+            get_nested_value(record, sort_by) or ""))
+    table = pyarrow.Table.from_pylist(records)
+    if not partition_by:
+        pyarrow.parquet.write_table(table, path, row_group_size=row_group_size, compression="zstd")
+        return
+    if not records:
+        os.makedirs(path)
+        return
+    partitioning = pyarrow.dataset.partitioning(
+        pyarrow.schema([table.schema.field(column) for column in partition_by]),
+        flavor="hive")
+    pyarrow.dataset.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=partitioning,
+        basename_template="part-{i}.parquet",
+        file_options=pyarrow.dataset.ParquetFileFormat().make_write_options(compression="zstd"),
+        max_rows_per_group=row_group_size,
+        preserve_order=True)
+
+
+def has_column(schema: pyarrow.Schema, column: str) -> bool:
+    """Check if a schema has a (nested) column, given as a dot separated path."""
+    column_type = pyarrow.struct(list(schema))
+    for key in column.split("."):
+        if not pyarrow.types.is_struct(column_type) or column_type.get_field_index(key) == -1:
+            return False
+        column_type = column_type.field(key).type
+    return True
+
+
+def read_snapshot(path: str, columns: list[str] = None, filters: pyarrow.compute.Expression = None) -> list[dict]:
+    """
+    Read records from a columnar snapshot.
+    Only the given columns are read. Partitions and row groups that don't match the filters are skipped.
+    :param path: Snapshot path (file or partitioned directory)
+    :param columns: Columns to read. Nested columns are given as dot separated paths (e.g. "DATA.DateCreated").
+    Columns that the snapshot doesn't have are None, the same way as in project_record.
+    :param filters: Row filter expression. E.g. field("DATA.ClassificationCode").isin(["1.1.", "1.2."])
+    :return: List of records (dicts). Nested columns are returned nested.
+    """
+    dataset = pyarrow.dataset.dataset(path, format="parquet", partitioning="hive")
+    if not dataset.schema.names:
+        return list()
+    if columns is None:
+        # Partition columns are not part of the saved records. Single file snapshots have no partition columns,
+        # but their hive partitioning schema still lists all columns.
+        partition_columns = dataset.partitioning.schema.names if os.path.isdir(path) else list()
+        projection = [column for column in dataset.schema.names if column not in partition_columns]
+    else:
+        projection = {column: field(column) for column in columns if has_column(dataset.schema, column)}
+    table = dataset.to_table(columns=projection, filter=filters)
+    records = table.to_pylist()
+    # Nested columns and columns that the snapshot doesn't have
+    added_columns = [column for column in (columns or []) if column not in projection or "." in column]
+    if not added_columns:
+        return records
+    for record in records:
+        for column in added_columns:
+            value = record.pop(column, None)
+            *parent_keys, key = column.split(".")
+            parent = record
+            for parent_key in parent_keys:
+                parent = parent.setdefault(parent_key, dict())
+            parent[key] = value
+    return records
+
+
+def get_content_hash(path: str, chunk_size: int = 2**20) -> str:
+    """Get sha256 hash of file contents. For directories, hash of the relative paths and contents of all files."""
+    file_paths = [path]
+    if os.path.isdir(path):
+        file_paths = sorted(
+            os.path.join(dir_path, filename)
+            for dir_path, _, filenames in os.walk(path)
+            for filename in filenames)
+    content_hash = hashlib.sha256()
+    for file_path in file_paths:
+        content_hash.update(os.path.relpath(file_path, path).encode("utf8"))
+        with open(file_path, "rb") as read_file:
+            while chunk := read_file.read(chunk_size):
+                content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def remove_snapshot_files(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def serialize_record(record: dict) -> tuple[bytes, bytes]:
+    """
+    Serialize record as canonical json (sorted keys), so that equal records give equal bytes.
+    :return: Record hash and serialized record
+    """
+    serialized_record = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf8")
+    return hashlib.blake2b(serialized_record, digest_size=16).digest(), serialized_record
+
+
+def get_changed_fields(old_record: dict, new_record: dict, prefix: str = "") -> list[str]:
+    """
+    Get names of fields that differ between two records. Fields of nested dicts are given as dot separated paths.
+    E.g. ["FinancingInPeriodsTotal", "DATA.PublicationStatusEng"]
+    """
+    changed_fields = list()
+    for key in sorted(old_record.keys() | new_record.keys()):
+        old_value = old_record.get(key)
+        new_value = new_record.get(key)
+        if old_value == new_value and (key in old_record) == (key in new_record):
+            continue
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            changed_fields += get_changed_fields(old_value, new_value, f'{prefix}{key}.')
+        else:
+            changed_fields += [f'{prefix}{key}']
+    return changed_fields
+
+
+class RecordStore:
+    """
+    Content-addressed store of snapshot records in a SQLite database.
+    Every distinct record is stored once, keyed by the hash of its contents.
+    Snapshots are stored as manifests: ordered lists of record hashes.
+    Records that are unchanged between repeated dumps take no additional space.
+    """
+    HASH_SIZE = 16
+    # Max number of SQL variables in a query
+    BATCH_SIZE = 500
+    # Max size of zlib preset dictionary
+    DICTIONARY_SIZE = 2**15
+
+    def __init__(self, path: str) -> None:
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS Record (Hash BLOB PRIMARY KEY, Data BLOB) WITHOUT ROWID")
+            # Hashes: concatenated record hashes. Keys: compressed json list of record keys.
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS Snapshot (Name TEXT PRIMARY KEY, Hashes BLOB, Keys BLOB)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS Setting (Key TEXT PRIMARY KEY, Value BLOB)")
+        # Records are small, so they are compressed with a preset dictionary of typical record contents.
+        # The dictionary is taken from the first added records and never changes.
+        dictionary = self.connection.execute("SELECT Value FROM Setting WHERE Key = 'dictionary'").fetchone()
+        self.set_dictionary(dictionary[0] if dictionary else None)
+
+    def set_dictionary(self, dictionary: bytes | None) -> None:
+        self.dictionary = dictionary
+        # Copying a primed (de)compressor is much faster than priming a new one for every record
+        self.compressor = zlib.compressobj(zdict=dictionary) if dictionary else zlib.compressobj()
+        self.decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        compressor = self.compressor.copy()
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes) -> bytes:
+        decompressor = self.decompressor.copy()
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def get_data(self, record_hashes: list[bytes]) -> dict:
+        """Get compressed records in the form of {record hash: data} for the given hashes that are in the store."""
+        data = dict()
+        for i in range(0, len(record_hashes), self.BATCH_SIZE):
+            batch = record_hashes[i:i + self.BATCH_SIZE]
+            data.update(self.connection.execute(
+                f"SELECT Hash, Data FROM Record WHERE Hash IN ({','.join('?' * len(batch))})", batch))
+        return data
+
+    def get_manifest(self, snapshot: str) -> tuple[list[bytes], list]:
+        """
+        Get record hashes and record keys of a snapshot in their original order.
+        :raises KeyError: if the snapshot is not in the store
+        """
+        manifest = self.connection.execute(
+            "SELECT Hashes, Keys FROM Snapshot WHERE Name = ?", (snapshot,)).fetchone()
+        if manifest is None:
+            raise KeyError(snapshot)
+        hashes, keys = manifest
+        record_hashes = [hashes[i:i + self.HASH_SIZE] for i in range(0, len(hashes), self.HASH_SIZE)]
+        return record_hashes, json.loads(zlib.decompress(keys))
+
+    def add_snapshot(self, snapshot: str, records: list[dict], key_field: str = None) -> int:
+        """
+        Add snapshot records to the store. Replaces previously added records of the same snapshot.
+        :param snapshot: Snapshot name
+        :param records: List of records (dicts)
+        :param key_field: (Nested) field that identifies a record between snapshots (e.g. "Guid")
+        :return: Number of records that weren't in the store before
+        """
+        # Structure: {record hash: serialized record}
+        serialized_records = dict()
+        record_hashes = list()
+        keys = list()
+        for record in records:
+            record_hash, serialized_record = serialize_record(record)
+            serialized_records[record_hash] = serialized_record
+            record_hashes += [record_hash]
+            keys += [get_nested_value(record, key_field) if key_field else None]
+
+        with self.connection:
+            if self.dictionary is None and serialized_records:
+                self.set_dictionary(b"".join(serialized_records.values())[-self.DICTIONARY_SIZE:])
+                self.connection.execute("INSERT INTO Setting (Key, Value) VALUES ('dictionary', ?)", (self.dictionary,))
+            new_hashes = serialized_records.keys() - self.get_data(list(serialized_records)).keys()
+            self.connection.executemany(
+                "INSERT INTO Record (Hash, Data) VALUES (?, ?)",
+                ((record_hash, self.compress(serialized_records[record_hash])) for record_hash in new_hashes))
+            self.connection.execute(
+                "INSERT OR REPLACE INTO Snapshot (Name, Hashes, Keys) VALUES (?, ?, ?)",
+                (snapshot, b"".join(record_hashes), zlib.compress(json.dumps(keys).encode("utf8"))))
+        return len(new_hashes)
+
+    def get_content_hash(self, snapshot: str) -> str:
+        """
+        Get sha256 hash of the record hashes of a snapshot. Doesn't depend on whether the snapshot is on disk.
+        :raises KeyError: if the snapshot is not in the store
+        """
+        record_hashes, _ = self.get_manifest(snapshot)
+        return hashlib.sha256(b"".join(record_hashes)).hexdigest()
+
+    def get_records(self, snapshot: str) -> list[dict]:
+        """Get records of a snapshot in their original order."""
+        record_hashes, _ = self.get_manifest(snapshot)
+        data = self.get_data(list(set(record_hashes)))
+        return [json.loads(self.decompress(data[record_hash])) for record_hash in record_hashes]
+
+    def diff(self, old_snapshot: str, new_snapshot: str, batch_size: int = 10000):
+        """
+        Compare two snapshots by record key.
+        Unchanged records are found by comparing record hashes, without loading the records.
+        Records without key are not compared.
+        :param old_snapshot: Snapshot name
+        :param new_snapshot: Snapshot name
+        :param batch_size: Number of changed records to load from the store at a time
+        :return: Generator of changes in the form of
+        {"change": "added" / "removed" / "modified", "key": ..., "record": ..., "changed_fields": [...]}.
+        Record is the new record, or the old record for removed records.
+        """
+        # Structure: {key: record hash}
+        old_hashes = {key: record_hash for record_hash, key in zip(*self.get_manifest(old_snapshot)) if key is not None}
+        new_hashes = {key: record_hash for record_hash, key in zip(*self.get_manifest(new_snapshot)) if key is not None}
+
+        # Structure: [(change, key, old record hash, new record hash), ...]
+        changes = list()
+        for key, new_hash in new_hashes.items():
+            old_hash = old_hashes.get(key)
+            if old_hash is None:
+                changes += [("added", key, None, new_hash)]
+            elif old_hash != new_hash:
+                changes += [("modified", key, old_hash, new_hash)]
+        changes += [("removed", key, old_hash, None) for key, old_hash in old_hashes.items() if key not in new_hashes]
+
+        for i in range(0, len(changes), batch_size):
+            batch = changes[i:i + batch_size]
+            data = self.get_data(list({
+                record_hash for _, _, old_hash, new_hash in batch
+                for record_hash in (old_hash, new_hash) if record_hash is not None}))
+            for change, key, old_hash, new_hash in batch:
+                old_record = json.loads(self.decompress(data[old_hash])) if old_hash else None
+                new_record = json.loads(self.decompress(data[new_hash])) if new_hash else None
+                yield {
+                    "change": change,
+                    "key": key,
+                    "record": new_record if new_record is not None else old_record,
+                    "changed_fields": get_changed_fields(old_record, new_record) if change == "modified" else list()}
+
+    def remove_snapshot(self, snapshot: str) -> None:
+        """Remove snapshot manifest. Records are removed by prune, if no other snapshot refers to them."""
+        with self.connection:
+            self.connection.execute("DELETE FROM Snapshot WHERE Name = ?", (snapshot,))
+
+    def prune(self) -> int:
+        """
+        Remove records that no snapshot refers to.
+        :return: Number of removed records
+        """
+        referenced_hashes = set()
+        for snapshot, in self.connection.execute("SELECT Name FROM Snapshot").fetchall():
+            referenced_hashes.update(self.get_manifest(snapshot)[0])
+        unreferenced_hashes = [
+            (record_hash,) for record_hash, in self.connection.execute("SELECT Hash FROM Record")
+            if record_hash not in referenced_hashes]
+        if not unreferenced_hashes:
+            return 0
+        with self.connection:
+            self.connection.executemany("DELETE FROM Record WHERE Hash = ?", unreferenced_hashes)
+        # Return freed space to the file system
+        self.connection.execute("VACUUM")
+        return len(unreferenced_hashes)
+
+
+class SnapshotCatalog:
+    """
+    Catalog of snapshots in a directory, saved as a json manifest next to the snapshots.
+    Records path, timestamp, row count, schema and content hash of every snapshot,
+    so that the latest snapshot of a stage is looked up without scanning the directory.
+    Snapshots are never modified after saving, so loaded snapshots are memoised in-process.
+    Snapshot records are kept in a RecordStore. Only the n_materialised latest snapshots of every stage
+    are also kept on disk as Parquet files: older snapshots are removed from disk (apply_retention)
+    and are read from the record store or materialised again on demand.
+    """
+    MANIFEST_FILENAME = "snapshot_catalog.json"
+    RECORD_STORE_FILENAME = "record_store.sql"
+
+    def __init__(self, dir_path: str, n_materialised: int = None) -> None:
+        """
+        :param dir_path: Catalog directory
+        :param n_materialised: Number of latest snapshots of every file_handle to keep on disk.
+        Older snapshots are kept only in the record store. 0 - snapshots are saved only in the record store.
+        None - keep all on disk.
+        """
+        self.dir_path = dir_path.rstrip("/")
+        self.n_materialised = n_materialised
+        self.manifest_path = f'{self.dir_path}/{self.MANIFEST_FILENAME}'
+        # Structure: {"snapshots": {filename: {"handle": ..., "timestamp": ..., "n_rows": ...,
+        #   "schema": {column: type} (None if never materialised), "content_hash": ..., "sort_by": ..., "n_new_records": ...,
+        #   "stored": bool, "materialised": bool}}, "latest": {handle: filename}}
+        self.manifest = {"snapshots": dict(), "latest": dict()}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf8") as read_file:
+                self.manifest = json.loads(read_file.read())
+        self.record_store = RecordStore(f'{self.dir_path}/{self.RECORD_STORE_FILENAME}')
+        # Structure: {(content hash, read from disk, columns, filters): records}
+        self.loaded = dict()
+
+    def save_manifest(self) -> None:
+        # Write to a temporary file first, so that an interrupted write doesn't corrupt the catalog
+        temporary_path = f'{self.manifest_path}.tmp'
+        with open(temporary_path, "w", encoding="utf8") as save_file:
+            save_file.write(json.dumps(self.manifest, indent=2, ensure_ascii=False))
+        os.replace(temporary_path, self.manifest_path)
+
+    def add(self, path: str, file_handle: str, timestamp: str, details: dict = None) -> dict:
+        """
+        Add a saved snapshot to the catalog.
+        :param path: Snapshot path (in the catalog directory)
+        :param file_handle: Name of the stage output (e.g. "relevant_projects")
+        :param timestamp: Timestamp string of the snapshot. Latest is decided by comparing timestamp strings.
+        :param details: Additional fields of the catalog entry
+        :return: Catalog entry of the snapshot
+        """
+        dataset = pyarrow.dataset.dataset(path, format="parquet", partitioning="hive")
+        entry = {
+            "handle": file_handle,
+            "timestamp": timestamp,
+            "n_rows": dataset.count_rows(),
+            "schema": {column.name: str(column.type) for column in dataset.schema},
+            "content_hash": get_content_hash(path),
+            **(details or {})}
+        return self.add_entry(os.path.basename(path), entry)
+
+    def add_entry(self, filename: str, entry: dict) -> dict:
+        """Add a catalog entry (see add) and update the latest snapshot of its file_handle."""
+        file_handle = entry["handle"]
+        timestamp = entry["timestamp"]
+        self.manifest["snapshots"][filename] = entry
+        latest_filename = self.manifest["latest"].get(file_handle)
+        if latest_filename is None or self.manifest["snapshots"][latest_filename]["timestamp"] <= timestamp:
+            self.manifest["latest"][file_handle] = filename
+        self.save_manifest()
+        return entry
+
+    def get_path(self, filename: str) -> str:
+        """Get path of a cataloged snapshot. Materialises the snapshot from the record store if it's not on disk."""
+        entry = self.manifest["snapshots"][filename]
+        path = f'{self.dir_path}/{filename}'
+        if not entry.get("materialised", True):
+            write_snapshot(self.record_store.get_records(filename), path, entry["sort_by"], entry.get("partition_by"))
+            entry["materialised"] = True
+            if entry["schema"] is None:
+                dataset = pyarrow.dataset.dataset(path, format="parquet", partitioning="hive")
+                entry["schema"] = {column.name: str(column.type) for column in dataset.schema}
+            self.save_manifest()
+        return path
+
+    def get_latest(self, file_handle: str) -> tuple[str, dict]:
+        """
+        Get path and catalog entry of the latest snapshot of the given file_handle.
+        :raises KeyError: if there are no snapshots of the file_handle in the catalog
+        """
+        filename = self.manifest["latest"][file_handle]
+        return self.get_path(filename), self.manifest["snapshots"][filename]
+
+    def get_previous(self, file_handle: str) -> str | None:
+        """Get filename of the snapshot before the latest snapshot of the given file_handle (None if there isn't one)."""
+        snapshots = self.manifest["snapshots"]
+        filenames = sorted(
+            (filename for filename, entry in snapshots.items() if entry["handle"] == file_handle),
+            key=lambda filename: snapshots[filename]["timestamp"])
+        return filenames[-2] if len(filenames) > 1 else None
+
+    def diff(self, old_filename: str, new_filename: str):
+        """
+        Compare two cataloged snapshots by record key. See RecordStore.diff.
+        :raises KeyError: if a snapshot was saved before the record store and can't be compared
+        """
+        return self.record_store.diff(old_filename, new_filename)
+
+    def count_changes(self, file_handle: str) -> dict | None:
+        """
+        Count added, removed and modified records of the latest snapshot of the file_handle compared to the previous one.
+        :return: Counts in the form of {"added": n, "removed": n, "modified": n}. None if there is nothing to compare to.
+        """
+        previous_filename = self.get_previous(file_handle)
+        if previous_filename is None or not self.manifest["snapshots"][previous_filename].get("stored"):
+            return None
+        n_changes = {"added": 0, "removed": 0, "modified": 0}
+        for change in self.diff(previous_filename, self.manifest["latest"][file_handle]):
+            n_changes[change["change"]] += 1
+        return n_changes
+
+    def save_snapshot(
+            self,
+            records: list[dict],
+            file_handle: str,
+            timestamp: str,
+            sort_by: str = None,
+            key_field: str = "Guid",
+            partition_by: dict = None) -> str:
+        """
+        Save records as a snapshot named by file_handle and timestamp to the record store and add it to the catalog.
+        Only records that aren't in the store yet are written. The snapshot is also written to disk
+        if the catalog keeps snapshots on disk (n_materialised), otherwise it's materialised on demand.
+        See write_snapshot for sort_by and partition_by. Partitioned snapshots are saved as directories.
+        :param key_field: (Nested) field that identifies a record between snapshots
+        :return: Snapshot path
+        """
+        filename = f'{file_handle}_{timestamp}' if partition_by else f'{file_handle}_{timestamp}.parquet'
+        path = f'{self.dir_path}/{filename}'
+        n_new_records = self.record_store.add_snapshot(filename, records, key_field)
+        materialised = self.n_materialised is None or self.n_materialised > 0
+        schema = None
+        if materialised:
+            write_snapshot(records, path, sort_by, partition_by)
+            dataset = pyarrow.dataset.dataset(path, format="parquet", partitioning="hive")
+            schema = {column.name: str(column.type) for column in dataset.schema}
+        self.add_entry(filename, {
+            "handle": file_handle,
+            "timestamp": timestamp,
+            "n_rows": len(records),
+            "schema": schema,
+            # Hash of the record hashes stays the same when the snapshot is removed from disk and materialised again
+            "content_hash": self.record_store.get_content_hash(filename),
+            "sort_by": sort_by,
+            "partition_by": partition_by,
+            "key_field": key_field,
+            "n_new_records": n_new_records,
+            "stored": True,
+            "materialised": materialised})
+        return path
+
+    def read(
+            self,
+            filename: str,
+            columns: list[str] = None,
+            filters: pyarrow.compute.Expression = None) -> list[dict]:
+        """
+        Read a cataloged snapshot. See read_snapshot for columns and filters.
+        Snapshots that are not on disk are read from the record store, unless rows are filtered:
+        then the snapshot is materialised first. Without columns, records are returned as they were saved.
+        Returned records are shared between calls with the same arguments: copy them before modifying.
+        """
+        entry = self.manifest["snapshots"][filename]
+        from_disk = entry.get("materialised", True) or filters is not None
+        key = (
+            entry["content_hash"],
+            from_disk,
+            None if columns is None else tuple(columns),
+            None if filters is None else str(filters))
+        if key in self.loaded:
+            return self.loaded[key]
+        if from_disk:
+            self.loaded[key] = read_snapshot(self.get_path(filename), columns, filters)
+        else:
+            records = self.record_store.get_records(filename)
+            self.loaded[key] = records if columns is None else [project_record(record, columns) for record in records]
+        return self.loaded[key]
+
+    def read_latest_snapshot(
+            self,
+            file_handle: str,
+            columns: list[str] = None,
+            filters: pyarrow.compute.Expression = None) -> list[dict]:
+        """Read the latest snapshot of the given file_handle. See read."""
+        return self.read(self.manifest["latest"][file_handle], columns, filters)
+
+    def apply_retention(self, max_age_days: int = None) -> tuple[int, int]:
+        """
+        Apply snapshot retention policy. Removes snapshots beyond the catalog's n_materialised latest from disk.
+        The latest snapshot of every file_handle is never removed completely.
+        :param max_age_days: Snapshots older than this are removed completely. None - keep all.
+        :return: Number of removed snapshots and number of snapshots removed from disk only
+        """
+        # Timestamp strings start with %Y%m%d%H%M%S, so they can be compared as strings
+        cutoff_timestamp = None
+        if max_age_days is not None:
+            cutoff_time = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=max_age_days)
+            cutoff_timestamp = cutoff_time.strftime("%Y%m%d%H%M%S")
+
+        n_removed = 0
+        n_dematerialised = 0
+        snapshots = self.manifest["snapshots"]
+        for file_handle in self.manifest["latest"]:
+            filenames = sorted(
+                (filename for filename, entry in snapshots.items() if entry["handle"] == file_handle),
+                key=lambda filename: snapshots[filename]["timestamp"],
+                reverse=True)
+            for i, filename in enumerate(filenames):
+                entry = snapshots[filename]
+                path = f'{self.dir_path}/{filename}'
+                if i > 0 and cutoff_timestamp and entry["timestamp"][:14] < cutoff_timestamp:
+                    remove_snapshot_files(path)
+                    self.record_store.remove_snapshot(filename)
+                    del snapshots[filename]
+                    n_removed += 1
+                elif self.n_materialised is not None and i >= self.n_materialised \
+                        and entry.get("stored") and entry.get("materialised"):
+                    # Snapshots saved before the record store can't be materialised again, so they are kept on disk
+                    remove_snapshot_files(path)
+                    entry["materialised"] = False
+                    n_dematerialised += 1
+        self.record_store.prune()
+        self.save_manifest()
+        return n_removed, n_dematerialised
@@ -0,0 +1,80 @@
+import os
+from snapshot_operations import SnapshotCatalog, field, read_snapshot, write_snapshot
+
+def add_snapshot(snapshot_catalog, records, file_handle, timestamp):
+    path = f'{snapshot_catalog.dir_path}/{file_handle}_{timestamp}.parquet'
+    write_snapshot(records, path)
+    return snapshot_catalog.add(path, file_handle, timestamp)
+
+def test_latest_snapshot(tmp_path):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path))
+    add_snapshot(snapshot_catalog, [{"Guid": "p1"}], "projects", "20240102000000")
+    entry = add_snapshot(snapshot_catalog, [{"Guid": "p1"}, {"Guid": "p2"}], "projects", "20240103000000")
+    # Snapshot added later with an older timestamp isn't the latest
+    add_snapshot(snapshot_catalog, [{"Guid": "p3"}], "projects", "20240101000000")
+    add_snapshot(snapshot_catalog, [{"Guid": "r1"}], "relevant_projects", "20240101000000")
+
+    path, latest_entry = snapshot_catalog.get_latest("projects")
+    assert path == f'{tmp_path}/projects_20240103000000.parquet'
+    assert latest_entry == entry
+    assert entry["n_rows"] == 2
+    assert entry["schema"] == {"Guid": "string"}
+    assert snapshot_catalog.get_previous("projects") == "projects_20240102000000.parquet"
+    assert snapshot_catalog.get_previous("relevant_projects") is None
+    assert snapshot_catalog.read_latest_snapshot("projects", columns=["Guid"]) == [{"Guid": "p1"}, {"Guid": "p2"}]
+
+    # Catalog is loaded from the manifest, without scanning the directory
+    loaded_catalog = SnapshotCatalog(str(tmp_path))
+    assert loaded_catalog.manifest == snapshot_catalog.manifest
+    assert loaded_catalog.get_latest("relevant_projects")[0] == f'{tmp_path}/relevant_projects_20240101000000.parquet'
+
+def test_read_is_memoised(tmp_path):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path))
+    add_snapshot(snapshot_catalog, [{"Guid": "p1"}], "projects", "20240101000000")
+    records = snapshot_catalog.read_latest_snapshot("projects", columns=["Guid"])
+    assert snapshot_catalog.read_latest_snapshot("projects", columns=["Guid"]) is records
+
+def test_retention(tmp_path):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path), n_materialised=1)
+    snapshot_catalog.save_snapshot([{"Guid": "p1", "Title": "Bogs"}], "projects", "20000101000000")
+    snapshot_catalog.save_snapshot([{"Guid": "p1", "Title": "Bogs"}], "projects", "20240101000000")
+    latest_path = snapshot_catalog.save_snapshot([{"Guid": "p1", "Title": "Mires"}], "projects", "20240102000000")
+    assert snapshot_catalog.apply_retention(max_age_days=3650) == (1, 1)
+
+    snapshots = snapshot_catalog.manifest["snapshots"]
+    assert list(snapshots) == ["projects_20240101000000.parquet", "projects_20240102000000.parquet"]
+    assert not snapshots["projects_20240101000000.parquet"]["materialised"]
+    assert sorted(os.listdir(tmp_path)) == ["projects_20240102000000.parquet", "record_store.sql", "snapshot_catalog.json"]
+    assert snapshot_catalog.get_latest("projects")[0] == latest_path
+    # Snapshots removed from disk are read from the record store
+    assert snapshot_catalog.read("projects_20240101000000.parquet", columns=["Title"]) == [{"Title": "Bogs"}]
+    content_hash = snapshots["projects_20240101000000.parquet"]["content_hash"]
+    path = snapshot_catalog.get_path("projects_20240101000000.parquet")
+    assert read_snapshot(path, columns=["Guid", "Title"]) == [{"Guid": "p1", "Title": "Bogs"}]
+    assert snapshots["projects_20240101000000.parquet"]["content_hash"] == content_hash
+
+def test_snapshots_in_record_store_only(tmp_path):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path), n_materialised=0)
+    snapshot_catalog.save_snapshot([{"Guid": "p1", "DATA": {"Code": "1.1."}}], "projects", "20240101000000")
+    snapshot_catalog.save_snapshot([{"Guid": "p1", "DATA": {"Code": "1.2."}}], "projects", "20240102000000")
+    assert sorted(os.listdir(tmp_path)) == ["record_store.sql", "snapshot_catalog.json"]
+    entry = snapshot_catalog.manifest["snapshots"]["projects_20240102000000.parquet"]
+    assert (entry["n_rows"], entry["n_new_records"], entry["schema"]) == (1, 1, None)
+    assert snapshot_catalog.read_latest_snapshot("projects", columns=["DATA.Code"]) == [{"DATA": {"Code": "1.2."}}]
+    assert not entry["materialised"]
+    # Filtered reads materialise the snapshot
+    assert snapshot_catalog.read_latest_snapshot("projects", columns=["Guid"], filters=field("DATA.Code") == "1.1.") == []
+    assert entry["materialised"]
+    assert entry["schema"] == {"Guid": "string", "DATA": "struct<Code: string>"}
+    assert snapshot_catalog.apply_retention() == (0, 1)
+
+def test_count_changes(tmp_path):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path))
+    snapshot_catalog.save_snapshot([{"Guid": "p1", "Title": "Bogs"}, {"Guid": "p2"}], "projects", "20240101000000")
+    assert snapshot_catalog.count_changes("projects") is None
+    snapshot_catalog.save_snapshot([{"Guid": "p1", "Title": "Mires"}, {"Guid": "p3"}], "projects", "20240102000000")
+    assert snapshot_catalog.count_changes("projects") == {"added": 1, "removed": 1, "modified": 1}
+    # Snapshots saved before the record store can't be compared
+    add_snapshot(snapshot_catalog, [{"Guid": "p1"}], "publications", "20240101000000")
+    snapshot_catalog.save_snapshot([{"Guid": "p1"}], "publications", "20240102000000")
+    assert snapshot_catalog.count_changes("publications") is None
@@ -0,0 +1,102 @@
+import sqlite3
+from query_operations import EtisDatabase
+from snapshot_operations import SnapshotCatalog
+
+def get_projects():
+    return [
+        {"Guid": "p1", "Title": "Bogs", "StatusNameEng": "Ongoing", "ProjectStartDate": "01.03.2021",
+         "ProjectEndDate": "31.12.2024", "FinancingInPeriodsTotal": 250.0,
+         "FinancingInstitutions": [{"Guid": "f1", "Name": "Ministry"}, {"Guid": "f2", "Name": "Fund"}],
+         "Institutions": [{"Guid": "i1", "HeadInstitutionNameEng": " University "}],
+         "Publications": [{"Guid": "a1"}]},
+        {"Guid": "p2", "Title": "Forests", "StatusNameEng": "Finished", "ProjectStartDate": None,
+         "FinancingInPeriodsTotal": None, "FinancingInstitutions": [{"Guid": "f2", "Name": "Fund"}]}]
+
+def get_publications():
+    return [{"GUID": "a1", "DATA": {"Title": "Peat", "ClassificationCode": "1.1.", "PublishingYear": "2022"}}]
+
+def test_build_and_query(tmp_path):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path))
+    snapshot_catalog.save_snapshot(get_projects(), "projects", "20240101000000")
+    snapshot_catalog.save_snapshot(get_publications(), "publications", "20240101000000", key_field="GUID")
+    etis_database = EtisDatabase(str(tmp_path / "etis.sql"), snapshot_catalog)
+
+    assert etis_database.get_projects(guids=["p1"]) == [{
+        "Guid": "p1", "Title": "Bogs", "StatusNameEng": "Ongoing", "StartDate": "2021-03-01",
+        "EndDate": "2024-12-31", "StartYear": 2021, "FinancingInPeriodsTotal": 250.0}]
+    assert [project["Guid"] for project in etis_database.get_projects(financier_guids=["f1", "f2"])] == ["p1", "p2"]
+    assert [project["Guid"] for project in etis_database.get_projects(financier_guids=["f2"], institution_guids=["i1"])] == ["p1"]
+    assert etis_database.get_projects(financier_guids=["f3"]) == []
+    assert etis_database.query(
+        "SELECT InstitutionName FROM ProjectInstitution WHERE ProjectGuid = ?", ["p1"]) == [{"InstitutionName": "University"}]
+    assert etis_database.get_publications(["a1"]) == [{
+        "Guid": "a1", "Title": "Peat", "ClassificationCode": "1.1.", "PublicationStatusEng": None,
+        "PublishingYear": 2022, "DateCreated": None}]
+
+def test_rebuild_on_snapshot_change(tmp_path):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path))
+    snapshot_catalog.save_snapshot(get_projects(), "projects", "20240101000000")
+    path = str(tmp_path / "etis.sql")
+    EtisDatabase(path, snapshot_catalog)
+    # Unchanged snapshots are not loaded again
+    sqlite3.connect(path).execute("DELETE FROM Project WHERE Guid = 'p2'").connection.commit()
+    assert len(EtisDatabase(path, snapshot_catalog).get_projects()) == 1
+
+    snapshot_catalog.save_snapshot(get_projects()[:1], "projects", "20240102000000")
+    snapshot_catalog.save_snapshot(get_publications(), "publications", "20240102000000", key_field="GUID")
+    etis_database = EtisDatabase(path, snapshot_catalog)
+    assert [project["Guid"] for project in etis_database.get_projects()] == ["p1"]
+    assert len(etis_database.get_publications(["a1"])) == 1
+
+def test_tables_of_loaded_snapshots(tmp_path):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path))
+    snapshot_catalog.save_snapshot(get_projects(), "projects", "20240101000000")
+    snapshot_catalog.save_snapshot(get_publications(), "publications", "20240101000000", key_field="GUID")
+    path = str(tmp_path / "etis.sql")
+    EtisDatabase(path, snapshot_catalog)
+    etis_database = EtisDatabase(path, snapshot_catalog, file_handles=["publications"])
+    table_names = {row["name"] for row in etis_database.query("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")}
+    assert table_names == {"Publication", "Setting"}
+
+def test_incremental_update_matches_load(tmp_path):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path))
+    snapshot_catalog.save_snapshot(get_projects(), "projects", "20240101000000")
+    path = str(tmp_path / "etis.sql")
+    EtisDatabase(path, snapshot_catalog)
+    modified_project = get_projects()[0] | {"Title": "Mires", "FinancingInstitutions": [{"Guid": "f3", "Name": "Council"}]}
+    projects = [modified_project, {"Guid": "p3", "Title": "Lakes", "ProjectStartDate": "01.01.2023"}]
+    snapshot_catalog.save_snapshot(projects, "projects", "20240102000000")
+    n_loaded = len(snapshot_catalog.loaded)
+    updated_database = EtisDatabase(path, snapshot_catalog)
+    # Changes are applied from the snapshot diff, the new snapshot is not read
+    assert len(snapshot_catalog.loaded) == n_loaded
+
+    loaded_database = EtisDatabase(str(tmp_path / "loaded.sql"), snapshot_catalog)
+    for table in ["Project", "ProjectFinancier", "ProjectInstitution", "ProjectPublication"]:
+        sql = f"SELECT * FROM {table} ORDER BY 1, 2"
+        assert updated_database.query(sql) == loaded_database.query(sql)
+    assert [project["Guid"] for project in updated_database.get_projects(financier_guids=["f3"])] == ["p1"]
+    assert updated_database.get_projects(guids=["p2"]) == []
+
+def test_columns_and_filters(tmp_path):
+    snapshot_catalog = SnapshotCatalog(str(tmp_path))
+    publications = get_publications() + [
+        {"GUID": "a2", "DATA": {"Title": "Moss", "ClassificationCode": "3.1.", "Abstract": "Long text"}}]
+    partition_by = {"ClassificationCode": "DATA.ClassificationCode"}
+    snapshot_catalog.save_snapshot(publications, "publications", "20240101000000", key_field="GUID", partition_by=partition_by)
+    path = str(tmp_path / "etis.sql")
+    filters = {"publications": {"DATA.ClassificationCode": ["1.1.", "1.2."]}}
+    etis_database = EtisDatabase(path, snapshot_catalog, file_handles=["publications"], filters=filters)
+    assert [publication["Guid"] for publication in etis_database.query("SELECT Guid FROM Publication")] == ["a1"]
+    # Only the columns that the tables need are read
+    ((_, _, columns, _),) = snapshot_catalog.loaded
+    assert "DATA.Abstract" not in columns
+
+    # Changed records are filtered the same way
+    publications[1]["DATA"]["ClassificationCode"] = "1.2."
+    snapshot_catalog.save_snapshot(publications, "publications", "20240102000000", key_field="GUID", partition_by=partition_by)
+    etis_database = EtisDatabase(path, snapshot_catalog, file_handles=["publications"], filters=filters)
+    assert [publication["Guid"] for publication in etis_database.query("SELECT Guid FROM Publication ORDER BY Guid")] == ["a1", "a2"]
+    # Changing the filters loads the snapshot again
+    etis_database = EtisDatabase(path, snapshot_catalog, file_handles=["publications"])
+    assert len(etis_database.query("SELECT Guid FROM Publication")) == 2
@@ -0,0 +1,41 @@
+import datetime
+import sys
+from record_operations import RecordDecoder, get_date, get_epoch_day
+
+def test_record_decoder():
+    decoder = RecordDecoder(
+        columns={
+            "Guid": "TEXT PRIMARY KEY",
+            "Authors": "BLOB",
+            "PublishingYear": "FLOAT",
+            "IsPublic": "INT",
+            "ClassificationCode": "TEXT",
+            "DateCreated": "FLOAT"},
+        date_columns=["DateCreated"],
+        categorical_columns=["ClassificationCode"])
+    row = decoder.decode({
+        "Guid": "pub1",
+        "Authors": [{"Guid": "a1", "Name": "John Smith"}],
+        "PublishingYear": "2021",
+        "IsPublic": True,
+        "ClassificationCode": "".join(["1.", "1."]),
+        "DateCreated": "2021-03-04T12:30:00",
+        "Unknown": "x"})
+    assert row.Guid == "pub1"
+    assert row.Authors == [{"Guid": "a1", "Name": "John Smith"}]
+    assert row.PublishingYear == 2021.0
+    assert row.IsPublic == 1
+    assert row.ClassificationCode is sys.intern("1.1.")
+    assert get_date(row.DateCreated) == datetime.date(2021, 3, 4)
+    assert not hasattr(row, "__dict__")
+
+    empty_row = decoder.decode({"Guid": "pub2", "PublishingYear": "", "DateCreated": None})
+    assert empty_row.PublishingYear is None
+    assert empty_row.DateCreated is None
+    assert decoder.to_dict(empty_row)["Authors"] is None
+    assert decoder.decode({"DateCreated": "04.03.2021"}).DateCreated == row.DateCreated
+
+def test_epoch_day():
+    assert get_epoch_day("1970-01-02") == 1
+    assert get_epoch_day("31.01.2023") == get_epoch_day("2023-01-31")
+    assert get_date(get_epoch_day("31.01.2023")) == datetime.date(2023, 1, 31)
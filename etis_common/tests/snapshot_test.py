@@ -0,0 +1,46 @@
+import os
+import pytest
+from snapshot_operations import field, read_snapshot, write_snapshot
+
+def get_projects():
+    return [
+        {"Guid": "p2", "Title": "Forests", "StatusNameEng": "Finished", "FinancingInPeriodsTotal": 1000.5,
+         "FinancingInstitutions": [{"Guid": "f1", "Name": "Ministry"}], "DATA": {"Code": "1.2."}},
+        {"Guid": "p1", "Title": "Bogs", "StatusNameEng": "Ongoing", "FinancingInPeriodsTotal": 250.0,
+         "FinancingInstitutions": [], "DATA": {"Code": "1.1."}}]
+
+def test_read_columns_and_filters(tmp_path):
+    path = str(tmp_path / "projects.parquet")
+    write_snapshot(get_projects(), path, sort_by="DATA.Code")
+    # Records are sorted by the sort column
+    assert [record["Guid"] for record in read_snapshot(path, columns=["Guid"])] == ["p1", "p2"]
+    # Nested columns are returned nested
+    assert read_snapshot(path, columns=["Guid", "DATA.Code"], filters=field("DATA.Code") == "1.2.") == [
+        {"Guid": "p2", "DATA": {"Code": "1.2."}}]
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "projects.parquet")
+    write_snapshot(get_projects(), path)
+    assert read_snapshot(path) == get_projects()
+
+def test_partitioned_snapshot(tmp_path):
+    path = str(tmp_path / "projects")
+    partition_by = {"Status": "StatusNameEng", "Code": "DATA.Code"}
+    write_snapshot(get_projects(), path, partition_by=partition_by)
+    assert sorted(os.listdir(path)) == ["Status=Finished", "Status=Ongoing"]
+    assert os.listdir(f'{path}/Status=Ongoing') == ["Code=1.1."]
+    # Partition columns are not returned with records
+    assert sorted(read_snapshot(path), key=lambda record: record["Guid"]) == get_projects()[::-1]
+    # Filters on partition columns open only the matching partitions
+    assert read_snapshot(path, columns=["Guid"], filters=field("Status") == "Ongoing") == [{"Guid": "p1"}]
+    assert read_snapshot(path, columns=["Title"], filters=(field("Code") == "1.2.") & (field("FinancingInPeriodsTotal") > 500)) == [
+        {"Title": "Forests"}]
+
+def test_partition_columns_overlap_record_fields(tmp_path):
+    with pytest.raises(ValueError):
+        write_snapshot(get_projects(), str(tmp_path / "projects"), partition_by={"Title": "DATA.Code"})
+
+def test_empty_partitioned_snapshot(tmp_path):
+    path = str(tmp_path / "projects")
+    write_snapshot([], path, partition_by={"Status": "StatusNameEng"})
+    assert read_snapshot(path) == []
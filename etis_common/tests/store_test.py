@@ -0,0 +1,45 @@
+from snapshot_operations import RecordStore
+
+def test_record_store_round_trip(tmp_path):
+    record_store = RecordStore(str(tmp_path / "record_store.sql"))
+    records = [
+        {"Guid": "p1", "Title": "Bogs", "DATA": {"Code": "1.1."}},
+        {"Guid": "p2", "Title": "Forests", "FinancingInstitutions": [{"Guid": "f1"}]}]
+    assert record_store.add_snapshot("projects_1", records, key_field="Guid") == 2
+    # Unchanged records are stored once
+    changed_records = [records[1], {"Guid": "p1", "Title": "Bogs and mires", "DATA": {"Code": "1.1."}}]
+    assert record_store.add_snapshot("projects_2", changed_records, key_field="Guid") == 1
+    assert record_store.connection.execute("SELECT COUNT(*) FROM Record").fetchone()[0] == 3
+
+    # Records are returned in their original order, also after reopening the store
+    record_store = RecordStore(str(tmp_path / "record_store.sql"))
+    assert record_store.get_records("projects_1") == records
+    assert record_store.get_records("projects_2") == changed_records
+    assert record_store.get_manifest("projects_2")[1] == ["p2", "p1"]
+    assert record_store.get_content_hash("projects_1") != record_store.get_content_hash("projects_2")
+
+    # Records of removed snapshots are pruned, if no other snapshot refers to them
+    record_store.remove_snapshot("projects_1")
+    assert record_store.prune() == 1
+    assert record_store.get_records("projects_2") == changed_records
+
+def test_record_store_diff(tmp_path):
+    record_store = RecordStore(str(tmp_path / "record_store.sql"))
+    record_store.add_snapshot("projects_1", [
+        {"Guid": "p1", "Title": "Bogs", "DATA": {"Code": "1.1.", "Year": 2020}},
+        {"Guid": "p2", "Title": "Forests"},
+        {"Guid": "p3", "Title": "Lakes"},
+        {"Title": "No key"}], key_field="Guid")
+    record_store.add_snapshot("projects_2", [
+        {"Guid": "p4", "Title": "Rivers"},
+        {"Guid": "p3", "Title": "Lakes"},
+        {"Guid": "p1", "Title": "Bogs", "DATA": {"Code": "1.2.", "Year": 2020}, "Status": "Ongoing"},
+        {"Title": "No key either"}], key_field="Guid")
+    changes = sorted(record_store.diff("projects_1", "projects_2", batch_size=1), key=lambda change: change["key"])
+    assert changes == [
+        {"change": "modified", "key": "p1",
+         "record": {"Guid": "p1", "Title": "Bogs", "DATA": {"Code": "1.2.", "Year": 2020}, "Status": "Ongoing"},
+         "changed_fields": ["DATA.Code", "Status"]},
+        {"change": "removed", "key": "p2", "record": {"Guid": "p2", "Title": "Forests"}, "changed_fields": []},
+        {"change": "added", "key": "p4", "record": {"Guid": "p4", "Title": "Rivers"}, "changed_fields": []}]
+    assert list(record_store.diff("projects_2", "projects_2")) == []
@@ -0,0 +1,64 @@
+# Patterns for cleaning, parsing and standardizing ETIS AuthorsText author strings
+
+unwanted_substrings = [
+    r"\s*appendix\s*",
+    r",*\s*и\s+др",
+    r"\s*\bteksti\sautor\b\s*",
+    r"\s*\bautor\b\s*",
+    r",*\s*juhendaja",
+    r",*\s*koostaja\s*",
+    r",*\s*koostanud\s*",
+    r",*\s*toimet(\.|aja|anud)\s*",
+    r",*\s+et\s+al\.?",
+    r"\s*DIRECT\s*",
+    r"\s*Programme\s*",
+    r"\s*Study\s*",
+    r"\s*Group\s*",
+    r"\s*\bküsitl\.?\s*",
+    r"\s*tõlkija\s*",
+    r"\s*tõlge\s.+?\skeelest\s*",
+    r"\s*\bkoost\.\s*",
+    r"\s*surname\s*",
+    r"\s*firstname\s*",
+    r"\s*\bjne\b\.?",
+    r"\s*\bjt\b\.?"]
+
+# Parsing patterns
+prefix = r"|".join([
+"[Vv]an\s[Dd]er",
+"[Vv]an",
+"[Vv]on",
+"[Ll]a",
+"[Dd]e"])
+name = r"\p{Lu}[\p{L}'’\-\—]+"
+initial = r"(\p{Lu}\.*\-*\—*){1,2}(?!\p{Ll})"
+
+# Name, initial (e.g. Dickus, B.)
+name_initial = rf"({prefix})?\s?{name}[,\s]\s*{initial}"
+# Initial, name (e.g. F.G. Superman)
+initial_name = rf"{initial}[,\s]*\s*({prefix})?\s?{name}"
+# Full name (e.g. David Thomas Shore)
+full_name = rf"{name}\s+({prefix})?\s?{name}(\s+{name})?"
+# Last name, first name (e.g. Shore, David Thomas)
+last_first = rf"({prefix})?\s?{name},\s*{name}(\s*{name})?"
+# Single last name, first name (e.g. Lewis, Fiona)
+last_first_single = rf"({prefix})?\s?{name},\s*{name}"
+
+patterns_extract = [
+    name_initial,
+    initial_name,
+    full_name,
+    last_first]
+
+# tuple: (detect_pattern, corresponding extract pattern)
+patterns_detect = [
+    (name_initial, name_initial),
+    (initial_name, initial_name),
+    (full_name, full_name),
+    (last_first_single, last_first)]
+
+# Same patterns with named groups of first and last name
+name_initial_groups = rf"(?P<last>({prefix})?\s?{name})[,\s]\s*(?P<first>{initial})"
+initial_name_groups = rf"(?P<first>{initial})[,\s]*\s*(?P<last>({prefix})?\s?{name})"
+last_first_groups = rf"(?P<last>({prefix})?\s?{name}),\s*(?P<first>{name}(\s*{name})?)"
+patterns_standardize = [name_initial_groups, initial_name_groups, last_first_groups]
@@ -0,0 +1,127 @@
+# local
+import synthetic_data
+# standard
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import runpy
+import sys
+import tempfile
+import time
+from unittest import mock
+# external
+import neo4j
+
+
+####################################################
+# Benchmark clean_data.py stages on synthetic data #
+####################################################
+
+# Usage: python benchmark.py [number of publications ...]
+# Every stage of clean_data.py is timed on a synthetic corpus of each size. Results are saved as json.
+# Neo4j is replaced by an in-memory driver: the export stage measures the client side only.
+
+benchmark_sizes = [int(size) for size in sys.argv[1:]] or [10000, 100000, 1000000]
+results_directory = os.path.abspath("./benchmark_results")
+clean_data_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "clean_data.py"))
+
+corpus_settings = {
+    "seed": 0,
+    "people_per_publication": 0.5,
+    "max_authors": 8,
+    "group_size": 10,
+    "clustering": 0.8,
+    "processed_share": 0.6,
+    "cyrillic_share": 0.05,
+    "initials_share": 0.6,
+    "typo_rate": 0.03}
+
+logger = logging.getLogger("benchmark")
+logger.addHandler(logging.StreamHandler(sys.stdout))
+logger.setLevel(logging.getLevelName("INFO"))
+
+
+class InMemorySession:
+    """Neo4j session that serves synthetic publications and counts writes."""
+    def __init__(self, driver: 'InMemoryDriver') -> None:
+        self.driver = driver
+
+    def __enter__(self) -> 'InMemorySession':
+        return self
+
+    def __exit__(self, *args) -> None:
+        return
+
+    def execute_read(self, transaction_function, *args, **kwargs) -> list:
+        return self.driver.publications
+
+    def execute_write(self, transaction_function, *args, **kwargs) -> None:
+        self.driver.n_writes += 1
+
+
+class InMemoryDriver:
+    def __init__(self, publications: list) -> None:
+        self.publications = publications
+        self.n_writes = 0
+
+    def verify_connectivity(self) -> None:
+        return
+
+    def session(self) -> InMemorySession:
+        return InMemorySession(self)
+
+
+results = list()
+for n_publications in benchmark_sizes:
+    start_time = time.time()
+    publications = synthetic_data.generate_publications(n_publications, **corpus_settings)
+    generate_time = time.time() - start_time
+    logger.info(f"\nGenerated {n_publications} synthetic publications in {round(generate_time, 2)} s.")
+
+    driver = InMemoryDriver(publications)
+    working_directory = os.getcwd()
+    # Author resolution state is saved to a temporary directory, so that every run resolves all publications
+    with tempfile.TemporaryDirectory() as temporary_directory, \
+            mock.patch.object(neo4j.GraphDatabase, "driver", lambda *args, **kwargs: driver):
+        os.chdir(temporary_directory)
+        try:
+            start_time = time.time()
+            clean_data_globals = runpy.run_path(clean_data_path)
+            total_time = time.time() - start_time
+        finally:
+            os.chdir(working_directory)
+            # clean_data.py adds its log handler on every run
+            logging.getLogger("etis").handlers.clear()
+
+    results += [{
+        "n_publications": n_publications,
+        "n_aliases_initial": clean_data_globals["n_aliases_initial"],
+        "n_authors": len(clean_data_globals["all_authors"]),
+        "n_neo4j_writes": driver.n_writes,
+        "generate_time": generate_time,
+        "total_time": total_time,
+        "stage_times": clean_data_globals["stage_times"]}]
+    del clean_data_globals, publications, driver
+    gc.collect()
+
+
+################
+# Save results #
+################
+
+benchmark_result = {
+    "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+    "python": platform.python_version(),
+    "platform": platform.platform(),
+    "cpu_count": os.cpu_count(),
+    "corpus_settings": corpus_settings,
+    "results": results}
+
+os.makedirs(results_directory, exist_ok=True)
+results_path = os.path.join(results_directory, f"benchmark_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+with open(results_path, "w") as results_file:
+    json.dump(benchmark_result, results_file, indent=2)
+logger.info(f"\nBenchmark results saved to {results_path}")
@@ -1,18 +1,21 @@
 # local
+import author_patterns
 import data_operations
 import log
+import match_operations
+import merge_operations
 import neo4j_operations
 import sql_operations
+import state_operations
 # standard
 import json
 import logging
+import os
 import sys
 import time
 # external
 from neo4j import GraphDatabase
-import networkx
 import tqdm
-import uuid
 
 #################
 # Setup logging #
@@ -22,6 +25,11 @@ logger = logging.getLogger("etis")
 logger.addHandler(logging.StreamHandler(sys.stdout))
 logger.setLevel(logging.getLevelName("INFO"))
 
+# Duration of every stage of the script
+# Structure: {stage name: seconds}
+stage_times = dict()
+stage_start_time = time.time()
+
 
 ########################
 # Pull data from neo4j #
@@ -55,7 +63,43 @@ for pub in publications_raw:
     publications += [{
         "id": id,
         "authors_processed": authors_data_cleaned,
-        "authors_text": authors_text}]
+        "authors_text": authors_text,
+        "authors_hash": state_operations.get_publication_hash(authors_data, authors_text)}]
+
+stage_times["pull"] = time.time() - stage_start_time
+stage_start_time = time.time()
+
+
+################################
+# Load author resolution state #
+################################
+
+# "incremental": resolve only publications that are new or modified since the saved state against saved authors
+# "rebuild": resolve all publications from scratch
+author_state_path = "./data/author_state.sql"
+author_state_mode = "incremental"
+
+# Authors that lost publications (author data of the publication was modified)
+stale_author_ids = set()
+incremental_run = author_state_mode == "incremental" and state_operations.state_exists(author_state_path)
+if incremental_run:
+    author_guids, author_ids, all_authors, authors_by_publication, publication_hashes = state_operations.load_state(author_state_path)
+    n_saved_publications = len(authors_by_publication)
+    # Modified publications are removed from their saved authors and resolved again as new ones
+    modified_publication_ids = {
+        pub["id"] for pub in publications
+        if pub["id"] in authors_by_publication and publication_hashes.get(pub["id"]) != pub["authors_hash"]}
+    stale_author_ids = merge_operations.remove_publications(all_authors, author_ids, authors_by_publication, modified_publication_ids)
+    publications = [pub for pub in publications if pub["id"] not in authors_by_publication]
+    log.author_state_loaded(
+        author_state_path,
+        n_saved_publications,
+        len(publications),
+        len(all_authors),
+        logging.getLogger("etis"))
+
+stage_times["load_state"] = time.time() - stage_start_time
+stage_start_time = time.time()
 
 
 ######################
@@ -88,78 +132,16 @@ for pub in publications_raw:
 # Parse authors from authors string #
 #####################################
 
-unwanted_substrings = [
-    r"\s*appendix\s*",
-    r",*\s*и\s+др",
-    r"\s*\bteksti\sautor\b\s*",
-    r"\s*\bautor\b\s*",
-    r",*\s*juhendaja",
-    r",*\s*koostaja\s*",
-    r",*\s*koostanud\s*",
-    r",*\s*toimet(\.|aja|anud)\s*",
-    r",*\s+et\s+al\.?",
-    r"\s*DIRECT\s*",
-    r"\s*Programme\s*",
-    r"\s*Study\s*",
-    r"\s*Group\s*",
-    r"\s*\bküsitl\.?\s*",
-    r"\s*tõlkija\s*",
-    r"\s*tõlge\s.+?\skeelest\s*",
-    r"\s*\bkoost\.\s*",
-    r"\s*surname\s*",
-    r"\s*firstname\s*",
-    r"\s*\bjne\b\.?",
-    r"\s*\bjt\b\.?"]
-
-# Parsing patterns
-prefix = r"|".join([
-"[Vv]an\s[Dd]er",
-"[Vv]an",
-"[Vv]on",
-"[Ll]a",
-"[Dd]e"])
-name = r"\p{Lu}[\p{L}'’\-\—]+"
-initial = r"(\p{Lu}\.*\-*\—*){1,2}(?!\p{Ll})"
-
-# Name, initial (e.g. Dickus, B.)
-name_initial = rf"({prefix})?\s?{name}[,\s]\s*{initial}"
-# Initial, name (e.g. F.G. Superman)
-initial_name = rf"{initial}[,\s]*\s*({prefix})?\s?{name}"
-# Full name (e.g. David Thomas Shore)
-full_name = rf"{name}\s+({prefix})?\s?{name}(\s+{name})?"
-# Last name, first name (e.g. Shore, David Thomas)
-last_first = rf"({prefix})?\s?{name},\s*{name}(\s*{name})?"
-# Single last name, first name (e.g. Lewis, Fiona)
-last_first_single = rf"({prefix})?\s?{name},\s*{name}"
-
-patterns_extract = [
-    name_initial,
-    initial_name,
-    full_name,
-    last_first]
-
-# tuple: (detect_pattern, corresponding extract pattern)
-patterns_detect = [
-    (name_initial, name_initial),
-    (initial_name, initial_name),
-    (full_name, full_name),
-    (last_first_single, last_first)]
-
 author_cleaner = data_operations.AuthorStringCleaner(
     delimiter=";",
-    unwanted_substrings=unwanted_substrings)
+    unwanted_substrings=author_patterns.unwanted_substrings)
 
 author_parser = data_operations.AuthorStringParser(
-    patterns_extract=patterns_extract,
-    patterns_detect=patterns_detect,
+    patterns_extract=author_patterns.patterns_extract,
+    patterns_detect=author_patterns.patterns_detect,
     secondary_delimiters=[r"\s", ","])
 
-name_initial_groups = rf"(?P<last>({prefix})?\s?{name})[,\s]\s*(?P<first>{initial})"
-initial_name_groups = rf"(?P<first>{initial})[,\s]*\s*(?P<last>({prefix})?\s?{name})"
-last_first_groups = rf"(?P<last>({prefix})?\s?{name}),\s*(?P<first>{name}(\s*{name})?)"
-patterns_standardize = [name_initial_groups, initial_name_groups, last_first_groups]
-
-author_standardizer = data_operations.AuthorStringStandardizer(patterns_standardize, initial)
+author_standardizer = data_operations.AuthorStringStandardizer(author_patterns.patterns_standardize, author_patterns.initial)
 
 globals()["log_latinized"] = list()
 globals()["log_parse_fail"] = list()
@@ -201,35 +183,48 @@ log.latinized(globals().get("log_latinized"), logging.getLogger("etis"))
 total_entries = len(publications)
 log.parse_fail(total_entries, globals().get("log_parse_fail"), logging.getLogger("etis"))
 
+stage_times["parse"] = time.time() - stage_start_time
+stage_start_time = time.time()
+
 
 #############################################################
 # Match parsed aliases to authors given in publication data #
 #############################################################
 
-def generate_id(handle: str = str()) -> str:
-    return handle + str(uuid.uuid4())[len(handle):]
-
-# Identificator to distinguish auto generated id-s
-# Assures that actual id-s are alphabetically preferred (relevant in later code)
-generated_id_handle = "ffffffff"
-
-# Structure: {author id: Author object}
-all_authors = dict()
-# Structure: {pub id: {"processed": {author1 id, author2 id, ...}, "raw": {author3 id, author4 id, ...}}}
-authors_by_publication = dict()
+if not incremental_run:
+    # Authors are referred to by dense integer ids, ETIS Guids are kept in a side table
+    # Authors parsed from authors text get generated ids that come after ETIS Guids
+    author_guids = data_operations.GuidTable(
+        guids=[processed_author["id"] for pub in publications for processed_author in pub["authors_processed"]],
+        generated_id_handle="ffffffff")
+    # Structure: {canonical id: Author object}
+    all_authors = dict()
+    # Structure: {pub id: {"processed": {author1 id, author2 id, ...}, "raw": {author3 id, author4 id, ...}}}
+    # Holds original author ids, merged authors are resolved through author_ids
+    authors_by_publication = dict()
+    # Keeps track of which authors are merged together
+    # Structure: disjoint set of author ids, canonical id of each set is the key of the merged author in all_authors
+    author_ids = merge_operations.DisjointSet(key=author_guids.get_sort_key)
+    # Structure: {pub id: hash of author data}
+    publication_hashes = dict()
 
 # Create a source dict of all authors
 # Re-create publications so that authors would be references to all_authors dict
 for pub in publications:
     authors_by_publication[pub["id"]] = {"processed": set(), "raw": set()}
+    publication_hashes[pub["id"]] = pub["authors_hash"]
     for processed_author in pub["authors_processed"]:
-        id = processed_author["id"]
-        if id not in all_authors:
-            all_authors[id] = data_operations.Author(**processed_author)
-        all_authors[id].publications.update({pub["id"]})
+        id = author_guids.get_id(processed_author["id"])
+        if id not in author_ids:
+            author_ids.add(id)
+        if author_ids.find(id) not in all_authors:
+            # New author or an author that was left without publications by modified publications
+            all_authors[author_ids.find(id)] = data_operations.Author(**{**processed_author, "id": id})
+        all_authors[author_ids.find(id)].publications.update({pub["id"]})
         authors_by_publication[pub["id"]]["processed"].update({id})
     for raw_author in pub["authors_raw"]:
-        id = generate_id(generated_id_handle)
+        id = author_guids.generate_id()
+        author_ids.add(id)
         all_authors[id] = data_operations.Author(id=id, alias=raw_author)
         all_authors[id].publications.update({pub["id"]})
         authors_by_publication[pub["id"]]["raw"].update({id})
@@ -239,149 +234,132 @@ n_aliases_initial = len(all_authors)
 n_aliases_merged_within_publication = 0
 
 # Match parsed aliases to authors given in data
-match_pairs = set()
 similarity_threshold_within_publication = 0.6
-for pub_id, authors in authors_by_publication.items():
-    for processed_author in authors["processed"]:
-        # Merge best match if it's above similarity threshold
-        best_match = (None, 0)
-        for raw_author in authors["raw"]:
-            if raw_author not in all_authors:
-                continue
-            similarity_ratio = all_authors[processed_author].similarity_ratio(all_authors[raw_author])
-            if similarity_ratio > best_match[1]:
-                best_match = (raw_author, similarity_ratio)
-        if best_match[1] > similarity_threshold_within_publication:
-            match_pairs.add((processed_author, best_match[0]))
-
-# Use matched pairs as network graph edges
-# Then connected component fragments are aliases
-aliases_graph = networkx.Graph()
-aliases_graph.add_edges_from(match_pairs)
-equivalent_alias_ids = list(networkx.connected_components(aliases_graph))
-
-for merge_group in equivalent_alias_ids:
-    # Number of authors in each group minus the one they're merged into
-    n_aliases_merged_within_publication += len(merge_group) - 1
-
-# Keep a record of what was merged
-merged_alias_ids = dict()
-for alias_ids in equivalent_alias_ids:
-    # Uses the fact that the Author.merge method keeps min id
-    merged_id = min(alias_ids)
-    for alias_id in alias_ids:
-        # Bypass alias that others will be merged to
-        if alias_id == merged_id:
-            continue
-        all_authors[merged_id].merge(all_authors[alias_id])
-        del all_authors[alias_id]
-        merged_alias_ids[alias_id] = merged_id
-
-# Update 'authors by publication' with merged aliases
-authors_by_publication_old = authors_by_publication
-authors_by_publication = dict()
-for pub_id, authors in authors_by_publication_old.items():
-    values = dict(
-        # Get merged id if available, otherwise use original id
-        processed = {merged_alias_ids.get(author_id, author_id) for author_id in authors["processed"]},
-        raw = {merged_alias_ids.get(author_id, author_id) for author_id in authors["raw"]})
-    authors_by_publication[pub_id] = values
+# Publications with more parsed aliases than this only compare the ones retrieved from an approximate (MinHash) index
+# None compares all pairs
+approximate_matching_min_aliases_within_publication = None
+# Structure: [([processed author id, ...], [raw author id, ...]), ...]
+# Every processed author is matched to the best of the raw authors in its group
+match_groups = list()
+for pub in publications:
+    authors = authors_by_publication[pub["id"]]
+    raw_authors = [raw_author for raw_author in authors["raw"] if raw_author in all_authors]
+    # Author given in data may have been merged in a previous run
+    processed_authors = [author_ids.find(processed_author) for processed_author in authors["processed"]]
+    if approximate_matching_min_aliases_within_publication is None \
+            or len(raw_authors) <= approximate_matching_min_aliases_within_publication:
+        match_groups += [(processed_authors, raw_authors)]
+        continue
+    approximate_index = match_operations.MinHashIndex(match_firstletter=False)
+    for raw_author in raw_authors:
+        approximate_index.add(raw_author, all_authors[raw_author].aliases)
+    for processed_author in processed_authors:
+        retrieved_authors = set().union(*[
+            approximate_index.query(alias) for alias in all_authors[processed_author].aliases])
+        # Keep the order of raw authors, so that ties are resolved the same way as without the index
+        match_groups += [([processed_author], [raw_author for raw_author in raw_authors if raw_author in retrieved_authors])]
+
+# Similarity matrices of many publications are scored in packed batches
+# Merge best match if it's above similarity threshold
+match_pairs = set(match_operations.best_matches(all_authors, match_groups, similarity_threshold_within_publication))
+
+# Merge every set of matched aliases into the one with the canonical id
+merged_alias_ids = merge_operations.merge_pairs(all_authors, author_ids, match_pairs)
+n_aliases_merged_within_publication += len(merged_alias_ids)
 
 log.within_publication_merge_result(n_aliases_initial, n_aliases_merged_within_publication, logger)
 
+stage_times["within_publication_merge"] = time.time() - stage_start_time
+stage_start_time = time.time()
+
 
 ######################################
 # Match authors between publications #
 ######################################
 
-n_aliases_initial_between_publication = len(all_authors)
-n_aliases_merged_between_publication = 0
+levenshtein_threshold_alias_vs_alias = 0.8
+
+# Only authors that share a blocking key are compared with each other
+# "blocking": exact name, trigram and initials keys, "minhash": approximate n-gram index (tune recall with bands and rows)
+candidate_index_type = "blocking"
+if candidate_index_type == "minhash":
+    blocking_index = match_operations.MinHashIndex(bands=30, rows=2, match_firstletter=True)
+else:
+    blocking_index = match_operations.BlockingIndex(max_block_size=2000)
+# Scores aliases of an author against all its candidates at once
+alias_scorer = match_operations.AliasScorer(
+    threshold=levenshtein_threshold_alias_vs_alias,
+    match_firstletter=True)
+for author_id, author in all_authors.items():
+    blocking_index.add(author_id, author.aliases)
+    alias_scorer.add(author_id, author.aliases)
+
+# Report how many brute force matches blocking would find in a sample of authors (0: don't check)
+# Brute force compares every sampled author with all authors: use for tuning the index, not in regular runs
+blocking_recall_sample_size = 0
+if blocking_recall_sample_size:
+    n_found_by_blocking, n_brute_force_matches = match_operations.blocking_recall(
+        blocking_index=blocking_index,
+        authors=all_authors,
+        threshold=levenshtein_threshold_alias_vs_alias,
+        sample_size=blocking_recall_sample_size)
+    log.blocking_recall(
+        n_found_by_blocking,
+        n_brute_force_matches,
+        min(blocking_recall_sample_size, len(all_authors)),
+        blocking_index.count_candidate_pairs(),
+        logging.getLogger("etis"))
 
 # Cycle until no more authors are merged
-while(True):
-    # Create a reference for coauthors
-    # Structure: {author id: set()}
-    coauthors = dict()
-    for authors in authors_by_publication.values():
-        all_publication_authors = authors["processed"].union(authors["raw"])
-        for author in all_publication_authors:
-            if author not in coauthors:
-                coauthors[author] = set()
-            coauthors[author] = coauthors[author].union({coauthor for coauthor in all_publication_authors if coauthor != author})
-
-    # Counters for logging
-    n_total_aliases_initial = len(all_authors)
-    n_initial_merged = n_aliases_merged_between_publication
-    start_time = time.time()
-
-    match_pairs = set()
-    coauthors_helper = dict()
-    levenshtein_threshold_alias_vs_alias = 0.8
-    for author_id1, coauthor_ids1 in tqdm.tqdm(coauthors.items()):
-        coauthors_helper[author_id1] = coauthor_ids1
-        for author_id2, coauthor_ids2 in coauthors_helper.items():
-            if author_id1 == author_id2:
-                continue
-            if all_authors[author_id1].similarity_ratio(all_authors[author_id2], match_firstletter = True) < levenshtein_threshold_alias_vs_alias:
-                continue
-            match_found = False
-            for coauthor_id1 in coauthor_ids1:
-                for coauthor_id2 in coauthor_ids2:
-                    coauthor_similarity_ratio = all_authors[coauthor_id1].similarity_ratio(
-                        other=all_authors[coauthor_id2],
-                        match_firstletter=True)
-                    if coauthor_similarity_ratio > levenshtein_threshold_alias_vs_alias:
-                        match_pairs.add((author_id1, author_id2))
-                        match_found = True
-                        break
-                if match_found:
-                    break
-
-    # Use matched pairs as network graph edges
-    # Then connected component fragments are aliases
-    aliases_graph = networkx.Graph()
-    aliases_graph.add_edges_from(match_pairs)
-    equivalent_alias_ids = list(networkx.connected_components(aliases_graph))
-
-    for merge_group in equivalent_alias_ids:
-        # Number of authors in each group minus the one they're merged into
-        n_aliases_merged_between_publication += len(merge_group) - 1
-
-    # Keep a record of what was merged
-    merged_alias_ids = dict()
-    for alias_ids in equivalent_alias_ids:
-        # Uses the fact that the Author.merge method keeps min id
-        merged_id = min(alias_ids)
-        for alias_id in alias_ids:
-            if alias_id == merged_id:
-                continue
-            all_authors[merged_id].merge(all_authors[alias_id])
-            del all_authors[alias_id]
-            merged_alias_ids[alias_id] = merged_id
-
-    # Update 'authors by publication' with merged aliases
-    authors_by_publication_old = authors_by_publication
-    authors_by_publication = dict()
-    for pub_id, authors in authors_by_publication_old.items():
-        values = dict(
-            # Get merged id if available, otherwise use original id
-            processed = {merged_alias_ids.get(author_id, author_id) for author_id in authors["processed"]},
-            raw = {merged_alias_ids.get(author_id, author_id) for author_id in authors["raw"]})
-        authors_by_publication[pub_id] = values
-
-    if len(match_pairs) == 0:
-        break
-    log.merge_cycle_result(
-        n_total_aliases_initial,
-        n_aliases_merged_between_publication - n_initial_merged,
-        time.time() - start_time,
-        logging.getLogger("etis"))
+# Only authors whose aliases or coauthors changed during the previous cycle are re-scored
+# Scoring is split between all cores
+author_resolver = merge_operations.AuthorResolver(
+    authors=all_authors,
+    author_ids=author_ids,
+    authors_by_publication=authors_by_publication,
+    blocking_index=blocking_index,
+    alias_scorer=alias_scorer,
+    threshold=levenshtein_threshold_alias_vs_alias,
+    n_processes=os.cpu_count(),
+    # Shared coauthors are checked exactly first, limit fuzzy coauthor comparisons per pair (None: no limit)
+    max_coauthor_comparisons=None,
+    # Incremental run only scores authors of new and modified publications and authors that lost publications
+    # against the saved authors
+    dirty_ids={
+        author_ids.find(author_id)
+        for pub in publications
+        for author_id in authors_by_publication[pub["id"]]["processed"].union(authors_by_publication[pub["id"]]["raw"])}
+    | {author_ids.find(author_id) for author_id in stale_author_ids}
+    if incremental_run else None)
+n_aliases_merged_between_publication = author_resolver.resolve(logging.getLogger("etis"))
 
 log.merge_total_result(
     n_aliases_initial,
     n_aliases_merged_between_publication + n_aliases_merged_within_publication,
     logging.getLogger("etis"))
 
+stage_times["between_publication_merge"] = time.time() - stage_start_time
+stage_start_time = time.time()
+
+
+################################
+# Save author resolution state #
+################################
+
+# Assigns Guids to generated authors, so that they keep their Guids in later runs
+# Incremental run writes only the rows of resolved publications and changed authors
+state_operations.save_state(
+    author_state_path,
+    author_guids,
+    author_ids,
+    all_authors,
+    authors_by_publication,
+    publication_hashes,
+    publication_ids={pub["id"] for pub in publications} if incremental_run else None)
+
+stage_times["save_state"] = time.time() - stage_start_time
+stage_start_time = time.time()
+
 
 #########################
 # Save authors to neo4j #
@@ -389,15 +367,19 @@ log.merge_total_result(
 
 neo4j_driver.verify_connectivity()
 
+# Nodes of earlier runs are updated by author Guid. Authors that no longer exist are deleted.
 with neo4j_driver.session() as session:
     for author in tqdm.tqdm(all_authors.values()):
         author_insert_values = {
-            "id": author.id,
+            "id": author_guids.get_guid(author.id),
             "name": author.name,
             "aliases": list(author.aliases)}
         _ = session.execute_write(
             neo4j_operations.create_author_node,
             **author_insert_values)
+    _ = session.execute_write(
+        neo4j_operations.delete_other_authors,
+        author_ids=[author_guids.get_guid(author_id) for author_id in all_authors])
 
 
 ############################################
@@ -408,12 +390,19 @@ neo4j_driver.verify_connectivity()
 
 with neo4j_driver.session() as session:
     for author in tqdm.tqdm(all_authors.values()):
+        _ = session.execute_write(
+            neo4j_operations.delete_other_author_publication_edges,
+            author_id=author_guids.get_guid(author.id),
+            publication_ids=list(author.publications))
         for publication_id in author.publications:
             _ = session.execute_write(
                 neo4j_operations.create_author_publication_edge,
-                author_id=author.id,
+                author_id=author_guids.get_guid(author.id),
                 publication_id=publication_id)
 
+stage_times["neo4j_export"] = time.time() - stage_start_time
+log.stage_times(stage_times, logging.getLogger("etis"))
+
 
 ######################################################
 # Problem
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Shared modules (e.g. record_operations) are imported from etis_common
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "etis_common"))
@@ -1,3 +1,6 @@
+# standard
+import sys
+import uuid
 # external
 import regex
 import transliterate
@@ -8,10 +11,13 @@ class AuthorStringCleaner():
     # transliterate package: https://pypi.org/project/transliterate/
     transliterate_ru = transliterate.get_translit_function("ru")
     cyrillic_pattern = regex.compile(r"\p{IsCyrillic}")
+    whitespace_pattern = regex.compile(r"(\s+)")
 
     def __init__(self, delimiter: str, unwanted_substrings: list[str]) -> None:
         self.delimiter = delimiter
         self.unwanted_substrings = unwanted_substrings
+        # Structure: {token: latinized token}
+        self.latinized_tokens = dict()
 
     def clean_delimiter(self, string: str) -> str:
         # Replace line breaks with name delimiters: "\r\n" --> ";"
@@ -58,14 +64,24 @@ class AuthorStringCleaner():
         string = regex.sub(r"^\s*[,\.]+|[,\.]+\s*$", "", string).strip()
         return string
     
-    def latinize(self, string: str) -> str:
-        if self.cyrillic_pattern.search(string):
-            string = self.transliterate_ru(string, reversed=True)
+    def latinize_token(self, token: str) -> str:
+        # Same surnames recur across records, so each distinct token is transliterated only once
+        if token not in self.latinized_tokens:
+            latinized = self.transliterate_ru(token, reversed=True)
             # Remove accent characters: "Natal'ya" --> "Natalya"
-            string = regex.sub(r"\'", "", string)
+            latinized = regex.sub(r"\'", "", latinized)
             # Preserve only first letter from two letter initials: "Systra, Ju.J" --> "Systra, J.J"
-            string = regex.sub(r"\b(\p{Lu})\p{L}\b", "\g<1>", string)
-        return string
+            latinized = regex.sub(r"\b(\p{Lu})\p{L}\b", "\g<1>", latinized)
+            self.latinized_tokens[token] = latinized
+        return self.latinized_tokens[token]
+
+    def latinize(self, string: str) -> str:
+        # Fast path: ASCII strings can't contain cyrillic characters
+        if string.isascii() or not self.cyrillic_pattern.search(string):
+            return string
+        # Transliteration is character based, so latinizing whitespace separated tokens gives the same result
+        tokens = self.whitespace_pattern.split(string)
+        return "".join([self.latinize_token(token) for token in tokens])
 
 
 class AuthorStringParser():
@@ -127,15 +143,99 @@ class AuthorStringStandardizer():
         return name
 
 
+class GuidTable:
+    """
+    Side table of dense integer author ids and ETIS Guids.
+    Ids of known Guids are assigned in alphabetical order of the Guids. Guids first seen in later (incremental) runs
+    get the next free ids, so ids alone are not in Guid order: merges compare ids by get_sort_key.
+    Generated ids of authors without Guid are taken from a separate range above all Guid ids,
+    so that a real ETIS author wins merges with generated authors.
+    """
+    # First generated id
+    generated_id_start = 2**40
+
+    def __init__(self, guids: list[str] = (), generated_id_handle: str = "ffffffff") -> None:
+        # Identificator to distinguish auto generated Guids
+        self.generated_id_handle = generated_id_handle
+        # Guid of every Guid id
+        self.guids = list()
+        # Guid of every generated id (id - generated_id_start). None for generated ids that haven't been exported yet.
+        self.generated_guids = list()
+        # Structure: {Guid: id}
+        self.ids = dict()
+        # Ids that were added or got a Guid since the table was last saved
+        self.changed_ids = set()
+        for guid in sorted(set(guids)):
+            self.get_id(guid)
+
+    def __len__(self) -> int:
+        return len(self.guids) + len(self.generated_guids)
+
+    def get_id(self, guid: str) -> int:
+        """Get id of a Guid. Unknown Guids get a new id."""
+        if guid not in self.ids:
+            self.ids[guid] = len(self.guids)
+            self.guids += [guid]
+            self.changed_ids.add(self.ids[guid])
+        return self.ids[guid]
+
+    def generate_id(self) -> int:
+        """Get a new id for an author that doesn't have a Guid."""
+        id = self.generated_id_start + len(self.generated_guids)
+        self.generated_guids += [None]
+        self.changed_ids.add(id)
+        return id
+
+    def get_sort_key(self, id: int) -> tuple:
+        """
+        Get merge precedence of an id: Guid ids in alphabetical order of their Guids, then generated ids in the order
+        they were generated. Keeps the merge result of incremental runs the same as of a run from scratch.
+        """
+        if id < self.generated_id_start:
+            return 0, self.guids[id]
+        return 1, id
+
+    def get_guid(self, id: int) -> str:
+        """Get Guid of an id. Generated ids get a random Guid that starts with the generated id handle."""
+        if id < self.generated_id_start:
+            return self.guids[id]
+        if self.generated_guids[id - self.generated_id_start] is None:
+            guid = self.generated_id_handle + str(uuid.uuid4())[len(self.generated_id_handle):]
+            self.generated_guids[id - self.generated_id_start] = guid
+            self.ids[guid] = id
+            self.changed_ids.add(id)
+        return self.generated_guids[id - self.generated_id_start]
+
+    def add(self, id: int, guid: str | None) -> None:
+        """Add a saved id - Guid pair. Ids have to be added in increasing order."""
+        if id < self.generated_id_start:
+            self.guids += [guid]
+        else:
+            self.generated_guids += [guid]
+        if guid is not None:
+            self.ids[guid] = id
+
+    def items(self):
+        """Get all id - Guid pairs."""
+        yield from enumerate(self.guids)
+        yield from enumerate(self.generated_guids, start=self.generated_id_start)
+
+
 class Author:
+    # No instance dicts: there are hundreds of thousands of authors before merging
+    __slots__ = ("id", "aliases", "alias_keys", "name", "coauthors", "publications")
+
     def __init__(self, id: str = str(), alias: str = str(), **kwargs) -> None:
         self.id = id
-        self.aliases = {alias} if alias else set()
+        # Interned, because the same aliases recur across publications
+        self.aliases = {sys.intern(alias)} if alias else set()
         self.name = kwargs["name"] if "name" in kwargs else str()
         if self.name:
+            self.name = sys.intern(self.name)
             self.aliases.update({self.name})
         self.coauthors = kwargs["coauthors"] if "coauthors" in kwargs else set()
         self.publications = kwargs["publications"] if "publications" in kwargs else set()
+        self.alias_keys = {self.get_alias_key(alias) for alias in self.aliases}
 
     def __repr__(self) -> str:
         if self.name:
@@ -151,21 +251,34 @@ class Author:
     def __hash__(self) -> int:
         return hash(self.id)
     
+    @staticmethod
+    def get_alias_key(alias: str) -> tuple[str, str, str]:
+        """
+        Get precomputed normalised forms of an alias: (first letter, alias without periods, casefolded alias without periods).
+        """
+        stripped = alias.replace(".", "")
+        return (alias[:1], sys.intern(stripped), sys.intern(stripped.casefold()))
+
     def similarity_ratio(self, other: 'Author', match_firstletter: bool = False) -> float:
         ratios = list()
-        for alias1 in self.aliases:
-            for alias2 in other.aliases:
-                if match_firstletter and alias1[0] != alias2[0]:
+        for first_letter1, stripped1, _ in self.alias_keys:
+            for first_letter2, stripped2, _ in other.alias_keys:
+                if match_firstletter and first_letter1 != first_letter2:
                     ratios += [0.0]
                     continue
-                if alias1 == alias2:
+                if stripped1 == stripped2:
                     return 1.0
-                ratios += [Levenshtein.ratio(alias1, alias2, processor=lambda x: x.replace(".", ""))]
+                ratios += [Levenshtein.ratio(stripped1, stripped2)]
         if not ratios:
             return 0.0
         return max(ratios)
     
-    def merge(self, other: 'Author') -> None:
+    def merge(self, other: 'Author', key=None) -> None:
+        """
+        Merge other author into this one.
+        :param key: Function id -> sort key that decides which id is kept (e.g. GuidTable.get_sort_key).
+        None - ids are compared directly.
+        """
         if self.name and other.name and self.name != other.name:
             # Don't merge authors with different names from given data
             return
@@ -174,9 +287,10 @@ class Author:
             self.id = other.id
             self.name = other.name
         else:
-            # Otherwise use id that's alphabetically first
-            self.id = sorted([self.id, other.id])[0]
+            # Otherwise use id that's first (alphabetically first Guid, or GuidTable id in the order of its Guid)
+            self.id = min(self.id, other.id, key=key)
         # Union aliases, publications and coauthors
         self.aliases.update(other.aliases)
+        self.alias_keys.update(other.alias_keys)
         self.publications.update(other.publications)
         self.coauthors.update(other.coauthors)
@@ -7,10 +7,15 @@ import sql_operations
 import json
 import time
 import logging
+import os
 import sys
 # external
 from neo4j import GraphDatabase
 import tqdm
+# local
+# Modules shared between the ETIS projects
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "etis_common"))
+import record_operations
 
 
 #####################
@@ -49,34 +54,49 @@ with tqdm.tqdm(total=limit/items_per_request) as progress_bar:
 log.api_result(i, start_time, logging.getLogger("etis"))
 
 
+#######################
+# Decode publications #
+#######################
+
+# Typed rows with column types from settings: dates as days since 1970-01-01, repeated categories interned.
+# Only the SQLite load uses the rows. Raw records are kept for neo4j, where publication nodes have all fields of the API record.
+settings_path = "./settings.json"
+settings = record_operations.load_settings(settings_path)
+publication_decoder = record_operations.RecordDecoder.from_settings(settings)
+publication_rows = [publication_decoder.decode(publication) for publication in publications]
+
+
 ############################
 # Save publications to SQL #
 ############################
 
 # Much faster for temporary storing downloaded data
-
-# database_path = "./data.sql"
-# settings_path = "./settings.json"
-# publications_raw_table = "PublicationRaw"
-
-# # Create Publication table
-# with open(settings_path) as settings_file:
-#     settings = json.loads("\n".join(settings_file.readlines()))
-
-# sql_connection = sql_operations.get_connection(database_path)
-# sql_operations.create_table(
-#     table=publications_raw_table,
-#     columns=settings["publication_columns"],
-#     connection=sql_connection)
-
-# succeeded_rows = 0
-# for row in publications:
-#     succeeded_rows += sql_operations.insert_row(
-#         table=publications_raw_table,
-#         connection=sql_connection,
-#         **row)
-
-# sql_connection.commit()
+# The table is dropped and created again on every download: earlier downloads are not kept.
+# Title, abstract and keyword columns are full-text indexed after loading. Search ranks matches by the column weights in settings:
+# sql_operations.search_fulltext(publications_raw_table, "climate change", sql_connection, column_weights=publication_fulltext_weights)
+
+database_path = "./data.sql"
+publications_raw_table = "PublicationRaw"
+# Structure: {column name: weight of matches in the column}
+publication_fulltext_columns = settings["publication_fulltext_columns"]
+publication_fulltext_weights = list(publication_fulltext_columns.values())
+
+sql_connection = sql_operations.get_connection(database_path)
+with sql_connection:
+    sql_connection.cursor().execute(f"DROP TABLE IF EXISTS {publications_raw_table}")
+    sql_operations.create_table(
+        table=publications_raw_table,
+        columns=settings["publication_columns"],
+        connection=sql_connection)
+    succeeded_rows = sql_operations.insert_rows(
+        table=publications_raw_table,
+        column_names=publication_decoder.columns,
+        rows=(tuple(publication_decoder.to_dict(row).values()) for row in publication_rows),
+        connection=sql_connection)
+    sql_operations.create_fulltext_index(
+        table=publications_raw_table,
+        columns=list(publication_fulltext_columns),
+        connection=sql_connection)
 
 
 ##############################
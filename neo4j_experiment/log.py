@@ -57,9 +57,11 @@ def merge_total_result(n_initial: int, n_merged: int, logger: logging.Logger) ->
                 f"Merged a total of {n_merged} out of {n_initial} initial aliases.")
 
 
-def merge_cycle_result(n_initial, n_merged, time_s, logger: logging.Logger) -> None:
+def merge_cycle_result(n_initial, n_merged, time_s, logger: logging.Logger, n_scored: int = None) -> None:
     time_string = f"{round(time_s)} seconds" if time_s < 120 else f"{round(time_s / 60, 1)} minutes"
+    scored_string = f"Re-scored {n_scored} changed aliases.\n" if n_scored is not None else ""
     logger.info(f"\nMerging author aliases cycle finished.\n"
+                f"{scored_string}"
                 f"Merged {n_merged} out of {n_initial} aliases during the cycle.\n"
                 f"Cycle time: {time_string}.")
 
@@ -71,3 +73,27 @@ def api_result(n_pulled, start_time, logger):
 def within_publication_merge_result(n_initial, n_merged, logger):
     logger.info(f"Completed merging aliases within publication.\n"
                 f"Merged a total of {n_merged} out of {n_initial} initial aliases.")
+
+
+def blocking_recall(n_found, n_total, n_sampled, n_candidate_pairs, logger):
+    recall_string = f"{round(n_found / n_total * 100, 1)} %" if n_total else "n/a"
+    logger.info(f"\nBlocking recall compared to brute force matching of {n_sampled} sampled authors: {recall_string} "
+                f"({n_found} out of {n_total} matches).\n"
+                f"Candidate pairs to score: {n_candidate_pairs}.")
+
+
+def similarity_cache_result(n_hits, n_misses, logger):
+    n_total = n_hits + n_misses
+    hit_rate_string = f"{round(n_hits / n_total * 100, 1)} %" if n_total else "n/a"
+    logger.info(f"\nSimilarity cache hit rate: {hit_rate_string} ({n_hits} out of {n_total} lookups).")
+
+
+def author_state_loaded(path, n_saved_publications, n_new_publications, n_authors, logger):
+    logger.info(f"\nLoaded author resolution state from {path}: {n_authors} authors of {n_saved_publications} publications.\n"
+                f"New and modified publications to resolve: {n_new_publications}.")
+
+
+def stage_times(times: dict, logger: logging.Logger) -> None:
+    stage_width = max([len(stage) for stage in times] + [0])
+    rows = "\n".join([f"{stage:<{stage_width}}  {round(time_s, 2)} s" for stage, time_s in times.items()])
+    logger.info(f"\nStage times:\n{rows}")
@@ -0,0 +1,503 @@
+# local
+import data_operations
+# standard
+import collections
+import itertools
+import random
+import zlib
+# external
+import numpy
+import rapidfuzz
+import regex
+
+
+class BlockingIndex:
+    """
+    Candidate generation for author matching.
+    Authors are indexed by blocking keys derived from their aliases.
+    Only authors that share at least one blocking key are considered candidates for matching.
+    """
+    non_letter_pattern = regex.compile(r"[^\p{L}]")
+    name_part_pattern = regex.compile(r"[\s\.\-]+")
+
+    def __init__(self, trigram_keys: bool = True, initials_keys: bool = True, max_block_size: int = 2000) -> None:
+        self.trigram_keys = trigram_keys
+        self.initials_keys = initials_keys
+        # Blocks above this size are too unspecific to be useful and are left out of candidate generation
+        self.max_block_size = max_block_size
+        # Structure: {blocking key: {author id, ...}}
+        self.blocks = dict()
+        # Structure: {author id: {blocking key, ...}}
+        self.author_keys = dict()
+
+    def __len__(self) -> int:
+        return len(self.author_keys)
+
+    def get_keys(self, alias: str) -> set[str]:
+        """
+        Get blocking keys of an alias in format 'I. Name' or 'First Last'.
+        All keys start with the first letter of the alias, because authors are only matched if the first letters match.
+        """
+        name_parts = [part for part in self.name_part_pattern.split(alias) if part]
+        if not name_parts:
+            return set()
+        first_letter = alias[0]
+        surname = self.non_letter_pattern.sub("", name_parts[-1]).casefold()
+        # First letter + normalised surname: "J. Smith" --> "name:Jsmith"
+        keys = {f"name:{first_letter}{surname}"}
+        if self.trigram_keys and surname:
+            # First letter + surname trigrams: "J. Smith" --> "gram:Jsmi", "gram:Jmit", "gram:Jith"
+            trigrams = {surname[i:i+3] for i in range(max(len(surname) - 2, 1))}
+            keys.update({f"gram:{first_letter}{trigram}" for trigram in trigrams})
+        if self.initials_keys:
+            # Initials signature: "John F. Smith" --> "initials:JFS"
+            initials = "".join([part[0] for part in name_parts])
+            keys.update({f"initials:{initials}"})
+        return keys
+
+    def add(self, author_id, aliases: set[str]) -> None:
+        """Index author by the blocking keys of all its aliases. Re-adding an author indexes its new aliases."""
+        keys = set().union(*[self.get_keys(alias) for alias in aliases])
+        self.author_keys.setdefault(author_id, set()).update(keys)
+        for key in keys:
+            self.blocks.setdefault(key, set()).add(author_id)
+
+    def remove(self, author_id) -> set:
+        """Remove author from index. Returns ids of authors in blocks that became small enough for candidate generation."""
+        released_ids = set()
+        for key in self.author_keys.pop(author_id, set()):
+            self.blocks[key].discard(author_id)
+            if not self.blocks[key]:
+                del self.blocks[key]
+            elif len(self.blocks[key]) == self.max_block_size:
+                released_ids.update(self.blocks[key])
+        return released_ids
+
+    def candidates(self, author_id) -> set:
+        """Get ids of all authors that share a (not oversized) block with the given author."""
+        candidates = set()
+        for key in self.author_keys.get(author_id, set()):
+            block = self.blocks[key]
+            if len(block) <= self.max_block_size:
+                candidates.update(block)
+        candidates.discard(author_id)
+        return candidates
+
+    def candidate_pairs(self) -> set[tuple]:
+        """Get all unique pairs of author ids that share a (not oversized) block."""
+        pairs = set()
+        for block in self.blocks.values():
+            if len(block) > self.max_block_size:
+                continue
+            for author_id1, author_id2 in itertools.combinations(block, 2):
+                pairs.add((author_id1, author_id2) if author_id1 < author_id2 else (author_id2, author_id1))
+        return pairs
+
+    def count_candidate_pairs(self) -> int:
+        """Count unique pairs of author ids that share a (not oversized) block, without building the pairs."""
+        return sum(len(self.candidates(author_id)) for author_id in self.author_keys) // 2
+
+
+def blocking_recall(
+        blocking_index: BlockingIndex,
+        authors: dict,
+        threshold: float,
+        sample_size: int = 200,
+        seed: int = 0) -> tuple[int, int]:
+    """
+    Compare blocking against brute force matching for a random sample of authors.
+    :param blocking_index: Index to evaluate
+    :param authors: All authors in the form of {author id: Author}
+    :param threshold: Similarity threshold used in matching (with first letter matching)
+    :param sample_size: Number of authors to compare against all other authors
+    :param seed: Random seed for selecting the sample
+    :return: Tuple of (brute force matches also found by blocking, all brute force matches)
+    """
+    sample = random.Random(seed).sample(sorted(authors), min(sample_size, len(authors)))
+    n_found = 0
+    n_total = 0
+    for author_id1 in sample:
+        candidates = blocking_index.candidates(author_id1)
+        for author_id2, author2 in authors.items():
+            if author_id2 == author_id1:
+                continue
+            if authors[author_id1].similarity_ratio(author2, match_firstletter=True) < threshold:
+                continue
+            n_total += 1
+            n_found += author_id2 in candidates
+    return n_found, n_total
+
+
+class AliasScorer:
+    """
+    Batch similarity scoring of author aliases.
+    Aliases are normalised once when an author is added and scored in batches with rapidfuzz.
+    Scores are the same as Author.similarity_ratio gives (Levenshtein ratio of aliases without periods).
+    """
+    def __init__(
+            self,
+            threshold: float,
+            match_firstletter: bool = True,
+            workers: int = -1,
+            chunk_size: int = 1024,
+            batch_size: int = 100000) -> None:
+        self.threshold = threshold
+        self.match_firstletter = match_firstletter
+        # Number of threads used by rapidfuzz (-1 uses all available cores)
+        self.workers = workers
+        # Maximum number of aliases scored at once in score (limits the size of dense intermediate matrices)
+        self.chunk_size = chunk_size
+        # Approximate maximum number of alias pairs scored at once in matching_pairs
+        self.batch_size = batch_size
+        # Structure: {author id: ((normalised alias, ...), (first letter, ...))}
+        self.aliases = dict()
+
+    def __len__(self) -> int:
+        return len(self.aliases)
+
+    def add(self, author_id, aliases: set[str]) -> None:
+        """Add author or replace the aliases of an already added author."""
+        alias_keys = sorted({data_operations.Author.get_alias_key(alias) for alias in aliases})
+        self.aliases[author_id] = (
+            tuple([stripped for _, stripped, _ in alias_keys]),
+            tuple([first_letter for first_letter, _, _ in alias_keys]))
+
+    def remove(self, author_id) -> None:
+        self.aliases.pop(author_id, None)
+
+    def flatten(self, author_ids: list) -> tuple[list[str], numpy.ndarray, numpy.ndarray]:
+        """Get aliases of given authors as a flat list with the index of the owner author and first letter of each alias."""
+        aliases = list()
+        owners = list()
+        first_letters = list()
+        for i, author_id in enumerate(author_ids):
+            author_aliases, author_first_letters = self.aliases[author_id]
+            aliases += author_aliases
+            owners += [i] * len(author_aliases)
+            first_letters += author_first_letters
+        return aliases, numpy.array(owners, dtype=numpy.int64), numpy.array(first_letters)
+
+    def score(self, author_ids1: list, author_ids2: list) -> numpy.ndarray:
+        """
+        Get similarity ratios between two lists of authors.
+        :param author_ids1: Ids of authors corresponding to matrix rows
+        :param author_ids2: Ids of authors corresponding to matrix columns
+        :return: Dense matrix of author similarity ratios (best alias pair). Ratios below threshold are 0.
+        """
+        aliases1, owners1, first_letters1 = self.flatten(author_ids1)
+        aliases2, owners2, first_letters2 = self.flatten(author_ids2)
+        author_scores = numpy.zeros((len(author_ids1), len(author_ids2)))
+        if not aliases1 or not aliases2:
+            return author_scores
+        for i in range(0, len(aliases1), self.chunk_size):
+            alias_scores = rapidfuzz.process.cdist(
+                aliases1[i:i+self.chunk_size],
+                aliases2,
+                scorer=rapidfuzz.distance.Indel.normalized_similarity,
+                # rapidfuzz cutoff can drop ratios exactly at the threshold, so filter exactly afterwards
+                score_cutoff=max(self.threshold - 1e-6, 0),
+                dtype=numpy.float64,
+                workers=self.workers)
+            alias_scores[alias_scores < self.threshold] = 0
+            if self.match_firstletter:
+                alias_scores[first_letters1[i:i+self.chunk_size, None] != first_letters2[None, :]] = 0
+            # Author similarity is the best similarity of any pair of their aliases
+            rows, columns = numpy.nonzero(alias_scores)
+            numpy.maximum.at(
+                author_scores,
+                (owners1[i:i+self.chunk_size][rows], owners2[columns]),
+                alias_scores[rows, columns])
+        return author_scores
+
+    def batch_matching_pairs(self, queries: list[tuple]) -> list[tuple]:
+        """
+        Get pairs of authors and their candidates whose similarity is at least the threshold.
+        Alias pairs of all authors are packed together with numpy indexing and scored with a single
+        rapidfuzz.process.cpdist call per batch, so that small alias sets don't pay the overhead of a call each.
+        Pairs with different first letters are not scored.
+        :param queries: Authors and their candidates in the form of [(author id, [candidate id, ...]), ...]
+        :return: Matched pairs in the form of [(author id, candidate id), ...], in query and candidate order
+        """
+        match_pairs = list()
+        batch = list()
+        n_batch_slots = 0
+        for author_id, candidate_ids in queries:
+            batch.append((author_id, candidate_ids))
+            n_batch_slots += len(candidate_ids)
+            if n_batch_slots >= self.batch_size:
+                match_pairs += self.score_batch(batch)
+                batch = list()
+                n_batch_slots = 0
+        match_pairs += self.score_batch(batch)
+        return match_pairs
+
+    def score_batch(self, queries: list[tuple]) -> list[tuple]:
+        # Every author - candidate pair is a slot
+        slot_authors = [author_id for author_id, candidate_ids in queries for _ in candidate_ids]
+        slot_candidates = [candidate_id for _, candidate_ids in queries for candidate_id in candidate_ids]
+        if not slot_authors:
+            return list()
+        author_ids = list(dict.fromkeys(slot_authors + slot_candidates))
+        positions = {author_id: i for i, author_id in enumerate(author_ids)}
+        aliases, owners, first_letters = self.flatten(author_ids)
+        alias_counts = numpy.bincount(owners, minlength=len(author_ids))
+        alias_starts = numpy.cumsum(alias_counts) - alias_counts
+
+        # Every alias pair of every slot: the k-th pair of a slot is (k // n aliases2)-th alias1 and (k % n aliases2)-th alias2
+        slot_positions1 = numpy.array([positions[author_id] for author_id in slot_authors], dtype=numpy.int64)
+        slot_positions2 = numpy.array([positions[author_id] for author_id in slot_candidates], dtype=numpy.int64)
+        slot_counts2 = alias_counts[slot_positions2]
+        slot_n_pairs = alias_counts[slot_positions1] * slot_counts2
+        pair_slots = numpy.repeat(numpy.arange(len(slot_authors)), slot_n_pairs)
+        pair_offsets = numpy.arange(len(pair_slots)) - numpy.repeat(numpy.cumsum(slot_n_pairs) - slot_n_pairs, slot_n_pairs)
+        pair_aliases1 = alias_starts[slot_positions1][pair_slots] + pair_offsets // slot_counts2[pair_slots]
+        pair_aliases2 = alias_starts[slot_positions2][pair_slots] + pair_offsets % slot_counts2[pair_slots]
+        if self.match_firstletter:
+            same_first_letter = first_letters[pair_aliases1] == first_letters[pair_aliases2]
+            pair_slots = pair_slots[same_first_letter]
+            pair_aliases1 = pair_aliases1[same_first_letter]
+            pair_aliases2 = pair_aliases2[same_first_letter]
+        if not len(pair_slots):
+            return list()
+
+        alias_array = numpy.array(aliases, dtype=object)
+        scores = rapidfuzz.process.cpdist(
+            alias_array[pair_aliases1],
+            alias_array[pair_aliases2],
+            scorer=rapidfuzz.distance.Indel.normalized_similarity,
+            dtype=numpy.float64,
+            workers=self.workers)
+        # Author similarity is the best similarity of any pair of their aliases
+        slot_scores = numpy.zeros(len(slot_authors))
+        numpy.maximum.at(slot_scores, pair_slots, scores)
+        return [(slot_authors[i], slot_candidates[i]) for i in numpy.flatnonzero(slot_scores >= self.threshold)]
+
+    def matching_pairs(self, author_id, candidate_ids: list) -> list[tuple]:
+        """Get pairs of the given author and candidates whose similarity is at least the threshold."""
+        return self.batch_matching_pairs([(author_id, candidate_ids)])
+
+
+def best_matches(authors: dict, groups: list[tuple[list, list]], threshold: float, batch_size: int = 100000) -> list[tuple]:
+    """
+    Find the best matching candidate of every query author in groups of query and candidate authors.
+    Alias pairs of many groups are packed together and scored with a single rapidfuzz.process.cpdist call.
+    Scores are the same as Author.similarity_ratio (without first letter matching) gives.
+    Ties are resolved in favour of the candidate that comes first, as a sequential scan with ">" would.
+    :param authors: Authors in the form of {author id: Author}
+    :param groups: Groups in the form of [([query id, ...], [candidate id, ...]), ...]. E.g. authors of a publication.
+    :param threshold: Best match is returned only if its similarity ratio is above (not equal to) threshold
+    :param batch_size: Approximate maximum number of alias pairs scored at once
+    :return: Matched pairs in the form of [(query id, candidate id), ...]
+    """
+    match_pairs = list()
+    # Structure: [stripped alias, ...] (query and candidate aliases of every scored pair)
+    query_aliases = list()
+    candidate_aliases = list()
+    # Index of the query - candidate slot of every alias pair
+    pair_slots = list()
+    # Query index and candidate id of every slot. Slots of a query are contiguous and in candidate order.
+    slot_queries = list()
+    slot_candidates = list()
+    queries = list()
+
+    def score_batch() -> None:
+        if not slot_queries:
+            return
+        slot_scores = numpy.zeros(len(slot_queries))
+        if pair_slots:
+            scores = rapidfuzz.process.cpdist(
+                query_aliases,
+                candidate_aliases,
+                scorer=rapidfuzz.distance.Indel.normalized_similarity,
+                dtype=numpy.float64,
+                workers=-1)
+            # Author similarity is the best similarity of any pair of their aliases
+            numpy.maximum.at(slot_scores, numpy.array(pair_slots, dtype=numpy.int64), scores)
+        slot_query_array = numpy.array(slot_queries, dtype=numpy.int64)
+        query_starts = numpy.flatnonzero(numpy.diff(slot_query_array, prepend=-1))
+        best_scores = numpy.maximum.reduceat(slot_scores, query_starts)
+        # First slot of every query that has the best score
+        best_slots = numpy.flatnonzero(slot_scores == best_scores[numpy.searchsorted(query_starts, numpy.arange(len(slot_scores)), side="right") - 1])
+        best_queries, first_best = numpy.unique(slot_query_array[best_slots], return_index=True)
+        for query, slot in zip(best_queries, best_slots[first_best]):
+            if slot_scores[slot] > threshold:
+                match_pairs.append((queries[query], slot_candidates[slot]))
+        for batch_list in (query_aliases, candidate_aliases, pair_slots, slot_queries, slot_candidates, queries):
+            batch_list.clear()
+
+    for query_ids, candidate_ids in groups:
+        if not candidate_ids:
+            continue
+        # Aliases of all candidates of the group and the position of their owner in candidate_ids
+        group_aliases = list()
+        group_owners = list()
+        for i, candidate_id in enumerate(candidate_ids):
+            candidate_stripped = [stripped for _, stripped, _ in authors[candidate_id].alias_keys]
+            group_aliases += candidate_stripped
+            group_owners += [i] * len(candidate_stripped)
+        for query_id in query_ids:
+            first_slot = len(slot_queries)
+            slot_queries += [len(queries)] * len(candidate_ids)
+            slot_candidates += candidate_ids
+            queries.append(query_id)
+            group_slots = [first_slot + i for i in group_owners]
+            for _, stripped, _ in authors[query_id].alias_keys:
+                query_aliases += [stripped] * len(group_aliases)
+                candidate_aliases += group_aliases
+                pair_slots += group_slots
+        if len(pair_slots) >= batch_size:
+            score_batch()
+    score_batch()
+    return match_pairs
+
+
+class SimilarityCache:
+    """
+    Bounded (least recently used) cache of author similarity ratios keyed by canonical author id pairs.
+    Invalidating an author makes all its cached ratios stale. Stale entries are dropped as least recently used.
+    """
+    def __init__(self, maxsize: int = 1000000) -> None:
+        self.maxsize = maxsize
+        # Structure: {(id1, version1, id2, version2, match_firstletter): similarity ratio}
+        self.ratios = collections.OrderedDict()
+        # Structure: {author id: version}
+        self.versions = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.ratios)
+
+    def invalidate(self, author_id) -> None:
+        self.versions[author_id] = self.versions.get(author_id, 0) + 1
+
+    def similarity_ratio(
+            self,
+            author_id1,
+            author1: data_operations.Author,
+            author_id2,
+            author2: data_operations.Author,
+            match_firstletter: bool = False) -> float:
+        # Similarity ratio is symmetric, so pairs are stored once
+        if author_id2 < author_id1:
+            author_id1, author1, author_id2, author2 = author_id2, author2, author_id1, author1
+        key = (author_id1, self.versions.get(author_id1, 0), author_id2, self.versions.get(author_id2, 0), match_firstletter)
+        if key in self.ratios:
+            self.hits += 1
+            self.ratios.move_to_end(key)
+            return self.ratios[key]
+        self.misses += 1
+        ratio = author1.similarity_ratio(author2, match_firstletter=match_firstletter)
+        self.ratios[key] = ratio
+        if len(self.ratios) > self.maxsize:
+            self.ratios.popitem(last=False)
+        return ratio
+
+
+class MinHashIndex:
+    """
+    Approximate index for retrieving aliases similar to a given alias.
+    Aliases (without periods, casefolded) are split into character n-grams and indexed with MinHash locality sensitive hashing.
+    Aliases whose MinHash signatures are equal in at least one band are candidates.
+    Recall/speed knob: more bands or fewer rows per band give higher recall and more candidates.
+    The n-gram Jaccard similarity where half of the pairs become candidates is about (1 / bands) ** (1 / rows).
+    Has the same candidate generation interface as BlockingIndex.
+    """
+    # Prime above the range of crc32 hashes
+    prime = 4294967311
+
+    def __init__(self, bands: int = 30, rows: int = 2, ngram_size: int = 3, match_firstletter: bool = True, seed: int = 0) -> None:
+        self.bands = bands
+        self.rows = rows
+        self.ngram_size = ngram_size
+        # Only index aliases with the same first letter together
+        self.match_firstletter = match_firstletter
+        # Random hash functions: h(x) = (a * x + b) mod prime
+        generator = numpy.random.default_rng(seed)
+        self.a = generator.integers(1, 2**31, size=(bands * rows, 1), dtype=numpy.uint64)
+        self.b = generator.integers(0, 2**31, size=(bands * rows, 1), dtype=numpy.uint64)
+        # Structure: {(band, first letter, band signature): {author id, ...}}
+        self.buckets = dict()
+        # Structure: {author id: {bucket key, ...}}
+        self.author_keys = dict()
+        # Structure: {author id: {alias, ...}}
+        self.aliases = dict()
+
+    def __len__(self) -> int:
+        return len(self.author_keys)
+
+    def get_ngrams(self, alias: str) -> set[str]:
+        # Pad with spaces, so that first and last letters are in as many n-grams as the rest
+        padded = f"{' ' * (self.ngram_size - 1)}{alias.replace('.', '').casefold()}{' ' * (self.ngram_size - 1)}"
+        return {padded[i:i+self.ngram_size] for i in range(len(padded) - self.ngram_size + 1)}
+
+    def get_signature(self, alias: str) -> numpy.ndarray:
+        # crc32 is stable between runs and processes (unlike hash)
+        ngram_hashes = numpy.array([zlib.crc32(ngram.encode()) for ngram in self.get_ngrams(alias)], dtype=numpy.uint64)
+        return ((self.a * ngram_hashes[None, :] + self.b) % self.prime).min(axis=1)
+
+    def get_keys(self, alias: str) -> set[tuple]:
+        signature = self.get_signature(alias)
+        first_letter = alias[:1] if self.match_firstletter else str()
+        return {
+            (band, first_letter, signature[band*self.rows:(band+1)*self.rows].tobytes())
+            for band in range(self.bands)}
+
+    def add(self, author_id, aliases: set[str]) -> None:
+        """Index author by all its aliases. Re-adding an author indexes its new aliases."""
+        new_aliases = set(aliases).difference(self.aliases.get(author_id, set()))
+        self.aliases.setdefault(author_id, set()).update(new_aliases)
+        keys = set().union(*[self.get_keys(alias) for alias in new_aliases])
+        self.author_keys.setdefault(author_id, set()).update(keys)
+        for key in keys:
+            self.buckets.setdefault(key, set()).add(author_id)
+
+    def remove(self, author_id) -> set:
+        """Remove author from index. Returns an empty set (no blocks are released, for compatibility with BlockingIndex)."""
+        self.aliases.pop(author_id, None)
+        for key in self.author_keys.pop(author_id, set()):
+            self.buckets[key].discard(author_id)
+            if not self.buckets[key]:
+                del self.buckets[key]
+        return set()
+
+    def query(self, alias: str, threshold: float = None) -> dict:
+        """
+        Get authors with aliases similar to the given alias.
+        :param alias: Alias to look up
+        :param threshold: If given, candidates are verified and only ones with a similarity ratio of at least threshold are returned
+        :return: Candidates in the form of {author id: best similarity ratio}. Ratio is None if threshold is not given.
+        """
+        candidate_ids = set().union(*[self.buckets.get(key, set()) for key in self.get_keys(alias)])
+        if threshold is None:
+            return {author_id: None for author_id in candidate_ids}
+        stripped = alias.replace(".", "")
+        candidates = dict()
+        for author_id in candidate_ids:
+            ratio = max([
+                rapidfuzz.distance.Indel.normalized_similarity(stripped, candidate_alias.replace(".", ""))
+                for candidate_alias in self.aliases[author_id]
+                if not self.match_firstletter or candidate_alias[:1] == alias[:1]])
+            if ratio >= threshold:
+                candidates[author_id] = ratio
+        return candidates
+
+    def candidates(self, author_id) -> set:
+        """Get ids of all authors that share a bucket with the given author."""
+        candidates = set()
+        for key in self.author_keys.get(author_id, set()):
+            candidates.update(self.buckets[key])
+        candidates.discard(author_id)
+        return candidates
+
+    def candidate_pairs(self) -> set[tuple]:
+        """Get all unique pairs of author ids that share a bucket."""
+        pairs = set()
+        for bucket in self.buckets.values():
+            for author_id1, author_id2 in itertools.combinations(bucket, 2):
+                pairs.add((author_id1, author_id2) if author_id1 < author_id2 else (author_id2, author_id1))
+        return pairs
+
+    def count_candidate_pairs(self) -> int:
+        """Count unique pairs of author ids that share a bucket, without building the pairs."""
+        return sum(len(self.candidates(author_id)) for author_id in self.author_keys) // 2
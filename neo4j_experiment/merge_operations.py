@@ -0,0 +1,402 @@
+# local
+import log
+import match_operations
+# standard
+import logging
+import multiprocessing
+import time
+# external
+import numpy
+import tqdm
+
+
+class DisjointSet:
+    """
+    Array backed disjoint set (union-find) of author ids.
+    Each set of merged authors is identified by a canonical id: the smallest id in the set (by key, if given).
+    That is the same id that Author.merge keeps, so canonical ids can be used as keys of merged authors.
+    """
+    def __init__(self, ids: list = (), key=None) -> None:
+        """
+        :param ids: Initial ids
+        :param key: Function id -> sort key that decides the canonical id of joined sets (e.g. GuidTable.get_sort_key).
+        None - ids are compared directly.
+        """
+        self.key = key
+        # Structure: [id, ...]
+        self.ids = list()
+        # Structure: {id: index}
+        self.index = dict()
+        # Index of parent element, roots are their own parents
+        self.parent = list()
+        # Size of the set (only relevant for roots)
+        self.size = list()
+        # Index of the canonical id of the set (only relevant for roots)
+        self.canonical = list()
+        # Index of the next element in a circular list of set members
+        self.next = list()
+        # Indexes of elements that were added or whose sets were joined since changes were last cleared
+        self.changed = set()
+        for id in ids:
+            self.add(id)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, id) -> bool:
+        return id in self.index
+
+    def add(self, id) -> None:
+        if id in self.index:
+            return
+        i = len(self.ids)
+        self.ids += [id]
+        self.index[id] = i
+        self.parent += [i]
+        self.size += [1]
+        self.canonical += [i]
+        self.next += [i]
+        self.changed.add(i)
+
+    def find_root(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            # Path halving: point every other element on the path to its grandparent
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def find(self, id):
+        """Get canonical id of the set that the given id belongs to."""
+        return self.ids[self.canonical[self.find_root(self.index[id])]]
+
+    def members(self, id) -> list[int]:
+        """Get indexes of all elements in the set that the given id belongs to."""
+        first = self.index[id]
+        members = [first]
+        i = self.next[first]
+        while i != first:
+            members += [i]
+            i = self.next[i]
+        return members
+
+    def get_changed_ids(self) -> set:
+        """Get ids of all members of sets that were added or joined since changes were last cleared."""
+        changed_roots = {self.find_root(i) for i in self.changed}
+        return {self.ids[i] for root in changed_roots for i in self.members(self.ids[root])}
+
+    def clear_changed(self) -> None:
+        self.changed = set()
+
+    def union(self, id1, id2):
+        """Join sets of two ids. Returns canonical id of the joined set."""
+        root1 = self.find_root(self.index[id1])
+        root2 = self.find_root(self.index[id2])
+        if root1 == root2:
+            return self.ids[self.canonical[root1]]
+        # Union by size: attach smaller tree to the root of the larger one
+        if self.size[root1] < self.size[root2]:
+            root1, root2 = root2, root1
+        self.parent[root2] = root1
+        self.size[root1] += self.size[root2]
+        self.changed.update((root1, root2))
+        # Splice circular member lists together
+        self.next[root1], self.next[root2] = self.next[root2], self.next[root1]
+        canonical1 = self.canonical[root1]
+        canonical2 = self.canonical[root2]
+        canonical_id1, canonical_id2 = self.ids[canonical1], self.ids[canonical2]
+        if (self.key(canonical_id2) < self.key(canonical_id1)) if self.key else (canonical_id2 < canonical_id1):
+            self.canonical[root1] = canonical2
+        return self.ids[self.canonical[root1]]
+
+
+def merge_pairs(authors: dict, author_ids: DisjointSet, pairs: set[tuple]) -> dict:
+    """
+    Merge matched pairs of authors.
+    Every author is merged directly into the author with the canonical id of its set.
+    :param authors: Authors in the form of {canonical id: Author}. Merged authors are removed.
+    :param author_ids: Disjoint set of all author ids
+    :param pairs: Matched pairs of canonical author ids
+    :return: Merged ids in the form of {merged author id: canonical id}
+    """
+    for author_id1, author_id2 in pairs:
+        author_ids.union(author_id1, author_id2)
+    merged_ids = dict()
+    for author_id in {author_id for pair in pairs for author_id in pair}:
+        canonical_id = author_ids.find(author_id)
+        if canonical_id != author_id:
+            authors[canonical_id].merge(authors.pop(author_id), key=author_ids.key)
+            merged_ids[author_id] = canonical_id
+    return merged_ids
+
+
+def remove_publications(authors: dict, author_ids: DisjointSet, authors_by_publication: dict, publication_ids: set) -> set:
+    """
+    Remove publications from their authors, so that the publications can be resolved again (e.g. modified publications).
+    Authors left without publications are removed. Aliases that were merged from the publications are kept:
+    merges can't be undone.
+    :param authors: Authors in the form of {canonical id: Author}
+    :param author_ids: Disjoint set of all author ids
+    :param authors_by_publication: Original author ids in the form of {pub id: {"processed": {id, ...}, "raw": {id, ...}}}.
+    Entries of removed publications are deleted.
+    :param publication_ids: Ids of publications to remove
+    :return: Canonical ids of remaining authors that lost publications
+    """
+    changed_ids = set()
+    for publication_id in publication_ids:
+        pub_authors = authors_by_publication.pop(publication_id, {"processed": set(), "raw": set()})
+        for author_id in pub_authors["processed"].union(pub_authors["raw"]):
+            canonical_id = author_ids.find(author_id)
+            if canonical_id not in authors:
+                continue
+            authors[canonical_id].publications.discard(publication_id)
+            changed_ids.add(canonical_id)
+    for canonical_id in list(changed_ids):
+        if not authors[canonical_id].publications:
+            del authors[canonical_id]
+            changed_ids.discard(canonical_id)
+    return changed_ids
+
+
+class CoauthorIndex:
+    """
+    Compact author - publication incidence structure for looking up coauthors.
+    Publication authors and author publications are stored as CSR style integer arrays (pointers + flat values).
+    Authors are referred to by their disjoint set indexes.
+    Coauthors are found on demand and merged authors are relabelled in place, so the structure is never rebuilt.
+    """
+    def __init__(self, authors_by_publication: dict, author_ids: DisjointSet) -> None:
+        self.author_ids = author_ids
+        publication_authors = list()
+        publication_pointers = [0]
+        for authors in authors_by_publication.values():
+            publication_authors += sorted({author_ids.index[author_id] for author_id in authors["processed"].union(authors["raw"])})
+            publication_pointers += [len(publication_authors)]
+        # Authors of publication i: publication_authors[publication_pointers[i]:publication_pointers[i+1]]
+        self.publication_pointers = numpy.array(publication_pointers, dtype=numpy.int64)
+        self.publication_authors = numpy.array(publication_authors, dtype=numpy.int32)
+        # Publications of author i: author_publications[author_pointers[i]:author_pointers[i+1]]
+        publication_indexes = numpy.repeat(
+            numpy.arange(len(publication_pointers) - 1, dtype=numpy.int32),
+            numpy.diff(self.publication_pointers))
+        self.author_publications = publication_indexes[numpy.argsort(self.publication_authors, kind="stable")]
+        author_counts = numpy.bincount(self.publication_authors, minlength=len(author_ids))
+        self.author_pointers = numpy.concatenate(([0], numpy.cumsum(author_counts)))
+        # Index of the canonical author of every author
+        self.labels = numpy.array(
+            [author_ids.index[author_ids.find(author_id)] for author_id in author_ids.ids],
+            dtype=numpy.int32)
+
+    def coauthor_indexes(self, author_id) -> numpy.ndarray:
+        """Get sorted unique indexes of canonical coauthors of an author."""
+        members = self.author_ids.members(author_id)
+        publications = numpy.concatenate(
+            [self.author_publications[self.author_pointers[i]:self.author_pointers[i+1]] for i in members])
+        authors = numpy.concatenate(
+            [self.publication_authors[self.publication_pointers[i]:self.publication_pointers[i+1]] for i in publications]
+            or [numpy.empty(0, dtype=numpy.int32)])
+        coauthors = numpy.unique(self.labels[authors])
+        return coauthors[coauthors != self.labels[self.author_ids.index[author_id]]]
+
+    def coauthors(self, author_id) -> set:
+        """Get canonical ids of coauthors of an author."""
+        return {self.author_ids.ids[i] for i in self.coauthor_indexes(author_id)}
+
+    def relabel(self, merged_ids: dict) -> None:
+        """
+        Update canonical labels of merged authors.
+        :param merged_ids: Merged ids in the form of {merged author id: canonical id}
+        """
+        for merged_id in set(merged_ids.values()):
+            self.labels[self.author_ids.members(merged_id)] = self.author_ids.index[merged_id]
+
+
+# Resolver of the worker process
+# Inherited from the parent process on fork, so the cycle's state isn't pickled per task
+worker_resolver = None
+
+
+def init_worker(resolver: 'AuthorResolver') -> None:
+    global worker_resolver
+    worker_resolver = resolver
+    # Parallelism comes from processes, don't oversubscribe cores with rapidfuzz threads
+    worker_resolver.alias_scorer.workers = 1
+
+
+def find_match_pairs_worker(author_ids: list) -> tuple[list[tuple], int, int]:
+    """Find match pairs of a partition of dirty authors. Returns pairs and similarity cache hits and misses."""
+    similarity_cache = worker_resolver.similarity_cache
+    n_hits = similarity_cache.hits
+    n_misses = similarity_cache.misses
+    match_pairs = worker_resolver.find_partition_match_pairs(author_ids)
+    return match_pairs, similarity_cache.hits - n_hits, similarity_cache.misses - n_misses
+
+
+class AuthorResolver:
+    """
+    Incremental matching of authors between publications.
+    Authors are matched if they have similar aliases and at least one pair of their coauthors has similar aliases.
+    Shared coauthors and identical coauthor aliases are checked first, coauthor aliases are compared fuzzily only if there are none.
+    Keeps a set of dirty authors, whose aliases or coauthors changed since they were last scored.
+    Every cycle re-scores only pairs that involve a dirty author, until no authors are dirty.
+    """
+    def __init__(
+            self,
+            authors: dict,
+            author_ids: DisjointSet,
+            authors_by_publication: dict,
+            blocking_index: match_operations.BlockingIndex,
+            alias_scorer: match_operations.AliasScorer,
+            threshold: float,
+            similarity_cache: match_operations.SimilarityCache = None,
+            n_processes: int = 1,
+            partition_size: int = 500,
+            max_coauthor_comparisons: int = None,
+            dirty_ids: set = None) -> None:
+        # Structure: {canonical id: Author}
+        self.authors = authors
+        self.author_ids = author_ids
+        self.blocking_index = blocking_index
+        self.alias_scorer = alias_scorer
+        self.threshold = threshold
+        # Coauthor pairs recur across candidate pairs and cycles
+        self.similarity_cache = similarity_cache or match_operations.SimilarityCache()
+        self.coauthor_index = CoauthorIndex(authors_by_publication, author_ids)
+        # Coauthors looked up during the current cycle
+        # Structure: {canonical id: {coauthor canonical id, ...}}
+        self.coauthors = dict()
+        # Exact coauthor evidence of authors looked up during the current cycle
+        # Structure: {canonical id: (sorted coauthor indexes, {(first letter, alias without periods), ...})}
+        self.coauthor_keys = dict()
+        # Max number of fuzzy coauthor comparisons per candidate pair, None for no limit
+        self.max_coauthor_comparisons = max_coauthor_comparisons
+        # All authors are scored in the first cycle, unless only some of them are new (incremental run)
+        self.dirty_ids = set(authors) if dirty_ids is None else set(dirty_ids).intersection(authors)
+        # Scoring is split between processes in partitions of dirty authors
+        # Only used where processes can be forked: the pipeline scripts aren't safe to re-import in spawned processes
+        self.n_processes = n_processes if "fork" in multiprocessing.get_all_start_methods() else 1
+        self.partition_size = partition_size
+
+    def get_coauthors(self, author_id) -> set:
+        if author_id not in self.coauthors:
+            self.coauthors[author_id] = self.coauthor_index.coauthors(author_id)
+        return self.coauthors[author_id]
+
+    def get_coauthor_keys(self, author_id) -> tuple[numpy.ndarray, set]:
+        if author_id not in self.coauthor_keys:
+            coauthor_indexes = self.coauthor_index.coauthor_indexes(author_id)
+            alias_keys = {
+                (first_letter, stripped)
+                for coauthor_id in self.get_coauthors(author_id)
+                for first_letter, stripped, _ in self.authors[coauthor_id].alias_keys}
+            self.coauthor_keys[author_id] = (coauthor_indexes, alias_keys)
+        return self.coauthor_keys[author_id]
+
+    def has_shared_coauthors(self, author_id1, author_id2) -> bool:
+        """
+        Exact tier of coauthor evidence: authors share a coauthor or their coauthors share an alias.
+        Either means a coauthor similarity ratio of 1.0.
+        """
+        coauthor_indexes1, alias_keys1 = self.get_coauthor_keys(author_id1)
+        coauthor_indexes2, alias_keys2 = self.get_coauthor_keys(author_id2)
+        if numpy.intersect1d(coauthor_indexes1, coauthor_indexes2, assume_unique=True).size:
+            return True
+        return not alias_keys1.isdisjoint(alias_keys2)
+
+    def has_similar_coauthors(self, author_id1, author_id2) -> bool:
+        if self.has_shared_coauthors(author_id1, author_id2):
+            return True
+        # Fuzzy tier: compare coauthor aliases pairwise
+        n_comparisons = 0
+        for coauthor_id1 in self.get_coauthors(author_id1):
+            for coauthor_id2 in self.get_coauthors(author_id2):
+                if self.max_coauthor_comparisons is not None and n_comparisons >= self.max_coauthor_comparisons:
+                    return False
+                n_comparisons += 1
+                coauthor_similarity_ratio = self.similarity_cache.similarity_ratio(
+                    coauthor_id1,
+                    self.authors[coauthor_id1],
+                    coauthor_id2,
+                    self.authors[coauthor_id2],
+                    match_firstletter=True)
+                if coauthor_similarity_ratio > self.threshold:
+                    return True
+        return False
+
+    def get_candidate_ids(self, author_id1) -> list:
+        # Pairs of two dirty authors are scored once: from the author with the smaller id
+        return [
+            author_id2 for author_id2 in self.blocking_index.candidates(author_id1)
+            if author_id2 not in self.dirty_ids or author_id2 > author_id1]
+
+    def find_partition_match_pairs(self, author_ids: list) -> list[tuple]:
+        """Find matching pairs of a partition of dirty authors. Aliases of the whole partition are scored in one batch."""
+        name_match_pairs = self.alias_scorer.batch_matching_pairs([
+            (author_id, self.get_candidate_ids(author_id)) for author_id in author_ids])
+        return [pair for pair in name_match_pairs if self.has_similar_coauthors(*pair)]
+
+    def find_author_match_pairs(self, author_id1) -> list[tuple]:
+        """Find matching pairs of a dirty author."""
+        return self.find_partition_match_pairs([author_id1])
+
+    def find_match_pairs(self) -> set[tuple]:
+        """Find matching pairs of authors that involve at least one dirty author."""
+        dirty_ids = list(self.dirty_ids)
+        partitions = [dirty_ids[i:i+self.partition_size] for i in range(0, len(dirty_ids), self.partition_size)]
+        if self.n_processes <= 1 or len(partitions) <= 1:
+            return {pair for author_ids in tqdm.tqdm(partitions) for pair in self.find_partition_match_pairs(author_ids)}
+
+        match_pairs = set()
+        with multiprocessing.get_context("fork").Pool(
+                processes=self.n_processes,
+                initializer=init_worker,
+                initargs=(self,)) as pool:
+            # Matched pairs are streamed back as soon as a partition is scored
+            for pairs, n_hits, n_misses in tqdm.tqdm(pool.imap_unordered(find_match_pairs_worker, partitions), total=len(partitions)):
+                match_pairs.update(pairs)
+                self.similarity_cache.hits += n_hits
+                self.similarity_cache.misses += n_misses
+        return match_pairs
+
+    def apply_merges(self, merged_ids: dict) -> None:
+        """
+        Update indexes and coauthors with merged authors.
+        Marks merged authors and their coauthors as dirty.
+        :param merged_ids: Merged ids in the form of {merged author id: canonical id}
+        """
+        self.dirty_ids = set()
+        self.coauthors = dict()
+        self.coauthor_keys = dict()
+        self.coauthor_index.relabel(merged_ids)
+        for alias_id in merged_ids:
+            self.dirty_ids.update(self.blocking_index.remove(alias_id))
+            self.alias_scorer.remove(alias_id)
+        for merged_id in set(merged_ids.values()):
+            # Cached ratios of merged authors are stale, because they have new aliases
+            self.similarity_cache.invalidate(merged_id)
+            # Re-index merged author with the added aliases
+            self.blocking_index.add(merged_id, self.authors[merged_id].aliases)
+            self.alias_scorer.add(merged_id, self.authors[merged_id].aliases)
+            self.dirty_ids.update({merged_id}.union(self.get_coauthors(merged_id)))
+        # Merged away authors may have been marked dirty before they were merged
+        self.dirty_ids.intersection_update(self.authors)
+
+    def run_cycle(self) -> int:
+        """Run a single matching cycle. Returns number of merged authors."""
+        match_pairs = self.find_match_pairs()
+        merged_ids = merge_pairs(self.authors, self.author_ids, match_pairs)
+        self.apply_merges(merged_ids)
+        return len(merged_ids)
+
+    def resolve(self, logger: logging.Logger) -> int:
+        """Run matching cycles until no authors are dirty. Returns total number of merged authors."""
+        n_merged_total = 0
+        while self.dirty_ids:
+            n_initial = len(self.authors)
+            n_dirty = len(self.dirty_ids)
+            start_time = time.time()
+            n_merged = self.run_cycle()
+            n_merged_total += n_merged
+            log.merge_cycle_result(n_initial, n_merged, time.time() - start_time, logger, n_dirty)
+        log.similarity_cache_result(self.similarity_cache.hits, self.similarity_cache.misses, logger)
+        return n_merged_total
@@ -0,0 +1,232 @@
+# local
+import author_patterns
+import data_operations
+import synthetic_data
+# standard
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+
+################################################
+# Microbenchmarks of data_operations hot paths #
+################################################
+
+# Usage: python microbenchmark.py [--update-baseline]
+# Every hot path is called on real-world-shaped inputs from the synthetic corpus.
+# Results (calls per second, allocations per call and peak traced memory per call) are compared against the stored baseline.
+# Exits with code 1 if any hot path is slower, allocates more or has a higher peak traced memory than the baseline
+# by more than the threshold.
+# Timings depend on the machine, so the baseline isn't committed: create it with --update-baseline on the machine
+# that runs the check. Without a baseline the check fails.
+
+update_baseline = "--update-baseline" in sys.argv[1:]
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "microbenchmark_baseline.json")
+results_directory = os.path.abspath("./benchmark_results")
+# Allowed relative regression before a benchmark fails
+regression_threshold = 0.2
+n_inputs = 2000
+# Timing is the best of repeats, so that background load on the machine affects results less
+n_repeats = 7
+min_repeat_time = 0.2
+seed = 0
+
+logger = logging.getLogger("benchmark")
+logger.addHandler(logging.StreamHandler(sys.stdout))
+logger.setLevel(logging.getLevelName("INFO"))
+
+
+def time_calls(function, setup, n_repeats: int, min_repeat_time: float) -> float:
+    """
+    Time calls of a function on inputs given by setup.
+    :param function: Function to call with every input
+    :param setup: Function that returns a fresh list of input argument tuples (not timed)
+    :param n_repeats: Number of timed repeats
+    :param min_repeat_time: Inputs are re-created and called again until a repeat has taken at least this many seconds
+    :return: Best calls per second of the repeats
+    """
+    # Warm up caches before timing
+    for arguments in setup():
+        function(*arguments)
+    best_ops_per_sec = 0
+    for _ in range(n_repeats):
+        repeat_time = 0
+        n_calls = 0
+        while repeat_time < min_repeat_time:
+            inputs = setup()
+            start_time = time.perf_counter()
+            for arguments in inputs:
+                function(*arguments)
+            repeat_time += time.perf_counter() - start_time
+            n_calls += len(inputs)
+        best_ops_per_sec = max(best_ops_per_sec, n_calls / repeat_time)
+    return best_ops_per_sec
+
+
+def count_allocations(function, setup) -> float:
+    """
+    Get mean number of memory blocks allocated by a call that are still in use when the call returns
+    (the return value and anything the call keeps), from the interpreter's count of allocated blocks.
+    Temporary objects that are freed before the call returns are not counted.
+    """
+    inputs = setup()
+    return_values = [None] * len(inputs)
+    # Cyclic garbage collection during the calls would free blocks of earlier inputs
+    gc.collect()
+    gc.disable()
+    blocks_before = sys.getallocatedblocks()
+    for i, arguments in enumerate(inputs):
+        return_values[i] = function(*arguments)
+    n_blocks = sys.getallocatedblocks() - blocks_before
+    gc.enable()
+    return max(n_blocks, 0) / len(inputs)
+
+
+def trace_calls(function, setup) -> float:
+    """Get mean peak traced memory (bytes) of a single call above the memory in use before the call."""
+    inputs = setup()
+    peaks = list()
+    tracemalloc.start()
+    for arguments in inputs:
+        tracemalloc.reset_peak()
+        memory_before, _ = tracemalloc.get_traced_memory()
+        function(*arguments)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        peaks += [peak_memory - memory_before]
+    tracemalloc.stop()
+    return sum(peaks) / len(peaks)
+
+
+###################
+# Generate inputs #
+###################
+
+rng = random.Random(seed)
+publications = synthetic_data.generate_publications(n_inputs, seed=seed, cyrillic_share=0.1, typo_rate=0.05)
+
+author_cleaner = data_operations.AuthorStringCleaner(
+    delimiter=";",
+    unwanted_substrings=author_patterns.unwanted_substrings)
+author_parser = data_operations.AuthorStringParser(
+    patterns_extract=author_patterns.patterns_extract,
+    patterns_detect=author_patterns.patterns_detect,
+    secondary_delimiters=[r"\s", ","])
+author_standardizer = data_operations.AuthorStringStandardizer(author_patterns.patterns_standardize, author_patterns.initial)
+
+# Single author strings, the way clean_data.py splits them
+author_strings = [
+    author_cleaner.remove_substrings(author_string)
+    for _, _, authors_text in publications
+    for author_string in author_cleaner.split(author_cleaner.latinize(author_cleaner.clean_delimiter(authors_text)))]
+author_strings = rng.sample(author_strings, min(n_inputs, len(author_strings)))
+cleaned_strings = [author_cleaner.clean(author_string) for author_string in author_strings]
+parsed_strings = [author_string for author_string in cleaned_strings if author_parser.check_exact_match(author_string)]
+# Authors separated by commas instead of the delimiter: "Tamm, K., Saar, M."
+bad_delimiter_strings = [
+    f"{parsed_strings[i]}, {parsed_strings[i + 1]}"
+    for i in range(0, len(parsed_strings) - 1, 2)]
+standardized_strings = [author_standardizer.standardize(author_string) for author_string in parsed_strings]
+author_pairs = [
+    (rng.choice(standardized_strings), rng.choice(standardized_strings))
+    for _ in range(n_inputs)]
+
+# Structure: {benchmark name: (function, setup)}
+benchmarks = {
+    "AuthorStringCleaner.clean": (
+        author_cleaner.clean,
+        lambda: [(author_string,) for author_string in author_strings]),
+    "AuthorStringParser.check_exact_match": (
+        author_parser.check_exact_match,
+        lambda: [(author_string,) for author_string in cleaned_strings]),
+    "AuthorStringParser.parse_bad_delimiter": (
+        author_parser.parse_bad_delimiter,
+        lambda: [(author_string,) for author_string in bad_delimiter_strings]),
+    "AuthorStringStandardizer.standardize": (
+        author_standardizer.standardize,
+        lambda: [(author_string,) for author_string in parsed_strings]),
+    "Author.similarity_ratio": (
+        data_operations.Author.similarity_ratio,
+        lambda: [
+            (data_operations.Author(alias=alias1), data_operations.Author(alias=alias2))
+            for alias1, alias2 in author_pairs]),
+    "Author.merge": (
+        data_operations.Author.merge,
+        lambda: [
+            (data_operations.Author(id=i, alias=alias1), data_operations.Author(id=i + 1, alias=alias2))
+            for i, (alias1, alias2) in enumerate(author_pairs)])}
+
+
+##################
+# Run benchmarks #
+##################
+
+results = dict()
+for benchmark_name, (function, setup) in benchmarks.items():
+    results[benchmark_name] = {
+        "ops_per_sec": time_calls(function, setup, n_repeats, min_repeat_time),
+        "allocations_per_call": count_allocations(function, setup),
+        "peak_bytes_per_call": trace_calls(function, setup)}
+
+baseline = dict()
+if os.path.exists(baseline_path):
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+
+regressions = list()
+# Benchmarks without a baseline of all metrics (new benchmarks or a baseline of an earlier version)
+missing_baselines = list()
+for benchmark_name, result in results.items():
+    baseline_result = baseline.get(benchmark_name)
+    comparison_string = "no baseline"
+    if baseline_result and baseline_result.keys() >= result.keys():
+        speed_ratio = result["ops_per_sec"] / baseline_result["ops_per_sec"]
+        # Counts below one per call are compared as one, so that a single extra block isn't a regression
+        allocation_ratio = max(result["allocations_per_call"], 1) / max(baseline_result["allocations_per_call"], 1)
+        memory_ratio = result["peak_bytes_per_call"] / max(baseline_result["peak_bytes_per_call"], 1)
+        comparison_string = (
+            f"{round(speed_ratio * 100)} % of baseline speed, {round(allocation_ratio * 100)} % of baseline allocations, "
+            f"{round(memory_ratio * 100)} % of baseline peak memory")
+        if speed_ratio < 1 - regression_threshold \
+                or allocation_ratio > 1 + regression_threshold \
+                or memory_ratio > 1 + regression_threshold:
+            regressions += [benchmark_name]
+    else:
+        missing_baselines += [benchmark_name]
+    logger.info(f"{benchmark_name:<40} {round(result['ops_per_sec']):>10} ops/s "
+                f"{result['allocations_per_call']:>8.1f} blocks/call "
+                f"{round(result['peak_bytes_per_call']):>8} peak B/call  ({comparison_string})")
+
+
+################
+# Save results #
+################
+
+os.makedirs(results_directory, exist_ok=True)
+results_path = os.path.join(results_directory, f"microbenchmark_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+with open(results_path, "w") as results_file:
+    json.dump({
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "regression_threshold": regression_threshold,
+        "results": results,
+        "regressions": regressions}, results_file, indent=2)
+logger.info(f"\nMicrobenchmark results saved to {results_path}")
+
+if update_baseline:
+    with open(baseline_path, "w") as baseline_file:
+        json.dump(results, baseline_file, indent=2)
+    logger.info(f"Baseline saved to {baseline_path}")
+elif missing_baselines:
+    logger.info(f"No baseline of {', '.join(missing_baselines)} in {baseline_path}. Create it with --update-baseline.")
+    sys.exit(1)
+elif regressions:
+    logger.info(f"Regressed beyond {round(regression_threshold * 100)} %: {', '.join(regressions)}")
+    sys.exit(1)
@@ -23,16 +23,31 @@ def get_publications(transaction):
     values = [record.values() for record in result]
     return values
 
-def create_author_node(transaction, **kwargs):
-    property_placeholders = ", ".join([f"{key}: ${key}" for key in kwargs.keys()])
-    cypher_pattern = f"MERGE (author:Author {{{property_placeholders}}}) RETURN id(author)"
-    values = dict()
+def create_author_node(transaction, id, **kwargs):
+    # Author is identified by id only: properties of an existing author (e.g. aliases) are updated in place
+    property_placeholders = ", ".join([f"author.{key} = ${key}" for key in kwargs.keys()])
+    cypher_pattern = f"MERGE (author:Author {{id: $id}}) SET {property_placeholders} RETURN id(author)"
+    values = {"id": id}
     for key, value in kwargs.items():
         values[key] = json.dumps(value) if isinstance(value, (list, dict)) else value
     node_id = transaction.run(cypher_pattern, values).single().value()
     # Return id of the new node as verification
     return node_id
 
+def delete_other_authors(transaction, author_ids):
+    # Authors that were merged into other authors or lost all their publications
+    cypher_pattern = "MATCH (author:Author) WHERE NOT author.id IN $author_ids DETACH DELETE author"
+    _ = transaction.run(cypher_pattern, {"author_ids": author_ids})
+    return
+
+def delete_other_author_publication_edges(transaction, author_id, publication_ids):
+    # Edges to publications that the author no longer has (e.g. the publication was modified and resolved again)
+    match_pattern = "MATCH (author:Author {id: $author_id})-[edge:PARTICIPATED_IN]->(publication:Publication)"
+    delete_pattern = "WHERE NOT publication.id IN $publication_ids DELETE edge"
+    cypher_pattern = f"{match_pattern}\n{delete_pattern}"
+    _ = transaction.run(cypher_pattern, {"author_id": author_id, "publication_ids": publication_ids})
+    return
+
 def create_author_publication_edge(transaction, author_id, publication_id):
     match_pattern = f"MATCH (author: Author {{id: $author_id}}), (publication: Publication {{id: $publication_id}})"
     create_pattern = "MERGE (author)-[:PARTICIPATED_IN]->(publication)"
@@ -2,9 +2,15 @@
 # standard
 import json
 import os
+import re
 import sqlite3
 
 
+# Tokenizer of full-text indexes. unicode61 splits words in any script and folds case and diacritics,
+# so that Estonian õ, ä, ö, ü, š, ž also match o, a, o, u, s, z. porter reduces English words to their stems.
+fulltext_tokenizer = "porter unicode61 remove_diacritics 2"
+
+
 def get_connection(path: str) -> sqlite3.Connection:
     """
     Get SQLite connection to a given database path.
@@ -74,6 +80,97 @@ def insert_row(table: str, connection: sqlite3.Connection, **kwargs) -> int:
     return sql_cursor.rowcount
 
 
+def insert_rows(table: str, column_names: list[str], rows: list[tuple], connection: sqlite3.Connection) -> int:
+    """
+    Inserts multiple rows to a SQLite table in a single statement
+    :param table: Name of the table to insert to
+    :param column_names: Names of the columns to insert to
+    :param rows: Rows to insert. Tuples of values in the order of column_names. Lists and dicts are saved as json.
+    :param connection: SQLite connection object
+    :return: Number of rows inserted
+    """
+    column_names_string = ",".join(column_names)
+    placeholder_string = ", ".join(["?"] * len(column_names))
+    sql_statement = f"""
+        INSERT INTO {table}
+            ({column_names_string})
+        VALUES
+            ({placeholder_string});
+        """
+    values = (
+        tuple(json.dumps(value) if isinstance(value, (list, dict)) else value for value in row)
+        for row in rows)
+    sql_cursor = connection.cursor()
+    sql_cursor.executemany(sql_statement, values)
+    return sql_cursor.rowcount
+
+
+def create_fulltext_index(
+        table: str,
+        columns: list[str],
+        connection: sqlite3.Connection,
+        tokenizer: str = fulltext_tokenizer) -> None:
+    """
+    Creates a FTS5 full-text index of text columns of a table and indexes the rows in the table.
+    The index is a table named {table}Text that refers to the rows of the table by rowid (text is not duplicated).
+    Create the index after bulk loading the table: indexing all rows at once is faster than indexing every insert.
+    Rows inserted later are not indexed before the index is created again.
+    :param table: Name of the table to index
+    :param columns: Names of the text columns to index
+    :param connection: SQLite connection object
+    :param tokenizer: FTS5 tokenizer
+    :return: None
+    """
+    index = f"{table}Text"
+    sql_cursor = connection.cursor()
+    sql_cursor.execute(f"DROP TABLE IF EXISTS {index}")
+    sql_cursor.execute(f"""
+        CREATE VIRTUAL TABLE {index} USING fts5(
+            {", ".join(columns)},
+            content='{table}',
+            content_rowid='rowid',
+            tokenize='{tokenizer}');
+        """)
+    sql_cursor.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+    return
+
+
+def search_fulltext(
+        table: str,
+        query: str,
+        connection: sqlite3.Connection,
+        key_column: str = "Guid",
+        column_weights: list[float] = None,
+        limit: int = None) -> list:
+    """
+    Ranked full-text search from a table indexed by create_fulltext_index.
+    Every word of the query has to be found in some indexed column. Words also match as prefixes,
+    so that Estonian compound words and inflections are found (e.g. kliima matches kliimamuutuse).
+    :param table: Name of the indexed table
+    :param query: Search words
+    :param connection: SQLite connection object
+    :param key_column: Column of the table to return
+    :param column_weights: Weights of matches in the indexed columns, in the order of the index columns. E.g. [10, 1]
+    :param limit: Max number of results
+    :return: Key column values of matching rows, best match first
+    """
+    index = f"{table}Text"
+    words = re.findall(r"\w+", query)
+    if not words:
+        return list()
+    match_string = " ".join(f'"{word}"*' for word in words)
+    weights_string = "".join(f", {weight}" for weight in column_weights or [])
+    limit_string = "" if limit is None else f"LIMIT {int(limit)}"
+    sql_statement = f"""
+        SELECT {table}.{key_column}
+        FROM {index}
+        JOIN {table} ON {table}.rowid = {index}.rowid
+        WHERE {index} MATCH ?
+        ORDER BY bm25({index}{weights_string})
+        {limit_string};
+        """
+    sql_cursor = connection.cursor()
+    return [key for key, in sql_cursor.execute(sql_statement, (match_string,))]
 
 
 
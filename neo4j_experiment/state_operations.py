@@ -0,0 +1,203 @@
+# local
+import data_operations
+import merge_operations
+import sql_operations
+# standard
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+
+
+# Structure: {table name: {column name: SQLite type name}}
+state_tables = {
+    # Guids of dense integer author ids
+    "AuthorGuid": {
+        "Id": "INTEGER PRIMARY KEY",
+        "Guid": "TEXT"},
+    # Union-find mapping: canonical id of every author id
+    "AuthorCanonical": {
+        "Id": "INTEGER PRIMARY KEY",
+        "CanonicalId": "INTEGER"},
+    # Merged authors, keyed by canonical id
+    "Author": {
+        "CanonicalId": "INTEGER PRIMARY KEY",
+        "Id": "INTEGER",
+        "Name": "TEXT",
+        "Aliases": "TEXT",
+        "Publications": "TEXT"},
+    # Original author ids of every publication
+    "PublicationAuthor": {
+        "PublicationId": "TEXT",
+        "AuthorId": "INTEGER",
+        "Source": "TEXT"},
+    # Hash of the author data of every publication, for finding modified publications
+    "PublicationHash": {
+        "PublicationId": "TEXT PRIMARY KEY",
+        "Hash": "TEXT"},
+    "Setting": {
+        "Key": "TEXT PRIMARY KEY",
+        "Value": "TEXT"}}
+
+
+def state_exists(path: str) -> bool:
+    """Check if there is a saved author resolution state in the given path."""
+    if not os.path.exists(path):
+        return False
+    connection = sql_operations.get_connection(path)
+    try:
+        n_settings = connection.cursor().execute("SELECT COUNT(*) FROM Setting").fetchone()[0]
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        connection.close()
+    return n_settings > 0
+
+
+def get_publication_hash(authors_data: str, authors_text: str) -> str:
+    """Get hash of the author data of a publication. Publications with changed author data have to be resolved again."""
+    return hashlib.blake2b(json.dumps([authors_data, authors_text]).encode("utf8"), digest_size=16).hexdigest()
+
+
+def save_state(
+        path: str,
+        author_guids: data_operations.GuidTable,
+        author_ids: merge_operations.DisjointSet,
+        authors: dict,
+        authors_by_publication: dict,
+        publication_hashes: dict,
+        publication_ids: set = None) -> None:
+    """
+    Save author resolution state to a SQLite database.
+    Blocking and scoring indexes are not saved: they are rebuilt from author aliases when the state is loaded.
+    :param path: Path to SQLite database
+    :param author_guids: Guid table of author ids. Authors without Guid get their generated Guid assigned here,
+    so that they keep it in later runs.
+    :param author_ids: Disjoint set of all author ids
+    :param authors: Merged authors in the form of {canonical id: Author}
+    :param authors_by_publication: Original author ids in the form of {pub id: {"processed": {id, ...}, "raw": {id, ...}}}
+    :param publication_hashes: Hashes of publication author data in the form of {pub id: hash}
+    :param publication_ids: Ids of publications resolved in this run. Only rows of these publications, their authors
+    and authors merged since the state was loaded are written. None - replace previously saved state.
+    :return: None
+    """
+    incremental_save = publication_ids is not None and state_exists(path)
+    connection = sql_operations.get_connection(path)
+    sql_cursor = connection.cursor()
+    with connection:
+        if not incremental_save:
+            for table, columns in state_tables.items():
+                sql_cursor.execute(f"DROP TABLE IF EXISTS {table}")
+                sql_operations.create_table(table, columns, connection)
+            publication_ids = set(authors_by_publication)
+            changed_ids = set(author_ids.ids)
+            old_publication_author_ids = set()
+        else:
+            changed_ids = author_ids.get_changed_ids()
+            # Authors that the resolved publications had in the saved state
+            old_publication_author_ids = {
+                author_id for publication_id in publication_ids
+                for author_id, in sql_cursor.execute(
+                    "SELECT AuthorId FROM PublicationAuthor WHERE PublicationId = ? AND AuthorId IS NOT NULL",
+                    (publication_id,))}
+        sql_cursor.execute(
+            "CREATE INDEX IF NOT EXISTS PublicationAuthorPublicationId ON PublicationAuthor (PublicationId)")
+
+        # Rows of authors that were merged, got new publications or lost publications
+        publication_author_ids = {
+            author_id for publication_id in publication_ids
+            for source_author_ids in authors_by_publication[publication_id].values()
+            for author_id in source_author_ids}
+        affected_ids = changed_ids | publication_author_ids | old_publication_author_ids
+        affected_ids |= {author_ids.find(id) for id in affected_ids}
+        canonical_ids = {author_ids.find(id) for id in affected_ids}.intersection(authors)
+        for canonical_id in canonical_ids:
+            author_guids.get_guid(authors[canonical_id].id)
+
+        sql_cursor.executemany(
+            "INSERT OR REPLACE INTO AuthorGuid (Id, Guid) VALUES (?, ?)",
+            author_guids.items() if not incremental_save
+            else ((id, author_guids.get_guid(id)) for id in sorted(author_guids.changed_ids)))
+        sql_cursor.executemany(
+            "INSERT OR REPLACE INTO AuthorCanonical (Id, CanonicalId) VALUES (?, ?)",
+            ((id, author_ids.find(id)) for id in changed_ids))
+        # Merged away authors and authors left without publications
+        sql_cursor.executemany(
+            "DELETE FROM Author WHERE CanonicalId = ?",
+            ((id,) for id in affected_ids.difference(canonical_ids)))
+        sql_cursor.executemany(
+            "INSERT OR REPLACE INTO Author (CanonicalId, Id, Name, Aliases, Publications) VALUES (?, ?, ?, ?, ?)",
+            ((canonical_id, author.id, author.name, json.dumps(sorted(author.aliases)), json.dumps(sorted(author.publications)))
+             for canonical_id, author in ((canonical_id, authors[canonical_id]) for canonical_id in canonical_ids)))
+
+        sql_cursor.executemany(
+            "DELETE FROM PublicationAuthor WHERE PublicationId = ?",
+            ((publication_id,) for publication_id in publication_ids))
+        sql_operations.insert_rows(
+            "PublicationAuthor",
+            ["PublicationId", "AuthorId", "Source"],
+            ((pub_id, author_id, source)
+             for pub_id in publication_ids
+             for source, source_author_ids in authors_by_publication[pub_id].items()
+             for author_id in source_author_ids),
+            connection)
+        # Publications without authors are saved too, so that they aren't considered new in the next run
+        sql_operations.insert_rows(
+            "PublicationAuthor",
+            ["PublicationId", "AuthorId", "Source"],
+            ((pub_id, None, None)
+             for pub_id in publication_ids
+             if not authors_by_publication[pub_id]["processed"] and not authors_by_publication[pub_id]["raw"]),
+            connection)
+        sql_cursor.executemany(
+            "INSERT OR REPLACE INTO PublicationHash (PublicationId, Hash) VALUES (?, ?)",
+            ((pub_id, publication_hashes.get(pub_id)) for pub_id in publication_ids))
+        sql_cursor.execute(
+            "INSERT OR REPLACE INTO Setting (Key, Value) VALUES ('generated_id_handle', ?)",
+            (author_guids.generated_id_handle,))
+    connection.close()
+    author_guids.changed_ids = set()
+    author_ids.clear_changed()
+
+
+def load_state(path: str) -> tuple[data_operations.GuidTable, merge_operations.DisjointSet, dict, dict, dict]:
+    """
+    Load author resolution state saved by save_state.
+    :param path: Path to SQLite database
+    :return: Guid table, disjoint set of author ids, authors in the form of {canonical id: Author},
+    authors by publication in the form of {pub id: {"processed": {id, ...}, "raw": {id, ...}}}
+    and hashes of publication author data in the form of {pub id: hash}
+    """
+    connection = sql_operations.get_connection(path)
+    sql_cursor = connection.cursor()
+    settings = dict(sql_cursor.execute("SELECT Key, Value FROM Setting").fetchall())
+
+    author_guids = data_operations.GuidTable(generated_id_handle=settings["generated_id_handle"])
+    for id, guid in sql_cursor.execute("SELECT Id, Guid FROM AuthorGuid ORDER BY Id"):
+        author_guids.add(id, guid)
+
+    canonical_ids = sql_cursor.execute("SELECT Id, CanonicalId FROM AuthorCanonical ORDER BY Id").fetchall()
+    author_ids = merge_operations.DisjointSet([id for id, _ in canonical_ids], key=author_guids.get_sort_key)
+    for id, canonical_id in canonical_ids:
+        author_ids.union(id, canonical_id)
+    # Only changes made after loading are saved
+    author_ids.clear_changed()
+
+    authors = dict()
+    for canonical_id, id, name, aliases, publications in sql_cursor.execute(
+            "SELECT CanonicalId, Id, Name, Aliases, Publications FROM Author ORDER BY CanonicalId"):
+        author = data_operations.Author(id=id, name=name, publications=set(json.loads(publications)))
+        author.aliases.update(sys.intern(alias) for alias in json.loads(aliases))
+        author.alias_keys = {author.get_alias_key(alias) for alias in author.aliases}
+        authors[canonical_id] = author
+
+    authors_by_publication = dict()
+    for pub_id, author_id, source in sql_cursor.execute(
+            "SELECT PublicationId, AuthorId, Source FROM PublicationAuthor ORDER BY rowid"):
+        pub_authors = authors_by_publication.setdefault(pub_id, {"processed": set(), "raw": set()})
+        if source is not None:
+            pub_authors[source].add(author_id)
+    publication_hashes = dict(sql_cursor.execute("SELECT PublicationId, Hash FROM PublicationHash").fetchall())
+    connection.close()
+    return author_guids, author_ids, authors, authors_by_publication, publication_hashes
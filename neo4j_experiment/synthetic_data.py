@@ -0,0 +1,118 @@
+# standard
+import json
+import random
+import uuid
+# external
+import transliterate
+
+
+first_names = [
+    "Aivar", "Andres", "Anna", "Anneli", "Ants", "Eva", "Helen", "Indrek", "Jaan", "Jüri", "Kadri", "Kai", "Kati",
+    "Katrin", "Liis", "Maarja", "Madis", "Mari", "Marko", "Mart", "Mihkel", "Piret", "Peeter", "Rein", "Riina",
+    "Tiina", "Tiit", "Toomas", "Urmas", "Ülle", "John", "Peter", "Maria", "David", "Thomas", "Fiona", "Sergei",
+    "Olga", "Natalya", "Dmitri", "Aleksandr", "Irina", "Tatjana", "Vladimir", "Yulia", "Aleksei"]
+
+last_names = [
+    "Tamm", "Saar", "Sepp", "Mägi", "Kask", "Kukk", "Rebane", "Ilves", "Pärn", "Koppel", "Lepik", "Oja", "Raud",
+    "Kuusk", "Karu", "Lepp", "Vaher", "Kivi", "Põder", "Luik", "Smith", "Shore", "Lewis", "Fletcher", "Ivanov",
+    "Ivanova", "Kuznetsov", "Smirnova", "Petrov", "Volkova", "Sokolov", "Morozova", "van der Berg", "de Jong",
+    "Kalamees", "Kõrgesaar", "Tammsaare", "Vallikivi", "Rummel", "Jõgi"]
+
+# Suffixes that make unique surnames out of the common ones
+surname_suffixes = ["", "", "", "e", "a", "mets", "maa", "oja", "son", "berg", "ski"]
+
+role_names = ["Author", "Author", "Author", "Editor", "Compiler"]
+
+# Structure: {format name: function (first name, last name) -> author string}
+author_formats = {
+    "last_initial": lambda first, last: f"{last}, {first[0]}.",
+    "initial_last": lambda first, last: f"{first[0]}. {last}",
+    "last_first": lambda first, last: f"{last}, {first}",
+    "first_last": lambda first, last: f"{first} {last}"}
+initials_formats = ["last_initial", "initial_last"]
+full_name_formats = ["last_first", "first_last"]
+
+
+def add_typo(string: str, rng: random.Random) -> str:
+    """Replace, delete or duplicate a random character after the first one."""
+    if len(string) < 3:
+        return string
+    i = rng.randrange(1, len(string))
+    typo_type = rng.choice(["replace", "delete", "duplicate"])
+    if typo_type == "replace":
+        return f"{string[:i]}{rng.choice('aeioukstnr')}{string[i+1:]}"
+    if typo_type == "delete":
+        return f"{string[:i]}{string[i+1:]}"
+    return f"{string[:i]}{string[i]}{string[i:]}"
+
+
+def generate_people(n_people: int, rng: random.Random) -> list[tuple[str, str, str]]:
+    """
+    Generate people with ETIS Guids.
+    :return: People in the form of [(Guid, first name, last name), ...]
+    """
+    people = list()
+    for _ in range(n_people):
+        last_name = f"{rng.choice(last_names)}{rng.choice(surname_suffixes)}"
+        people += [(str(uuid.UUID(int=rng.getrandbits(128))), rng.choice(first_names), last_name)]
+    return people
+
+
+def generate_publications(
+        n_publications: int,
+        seed: int = 0,
+        people_per_publication: float = 0.5,
+        max_authors: int = 8,
+        group_size: int = 10,
+        clustering: float = 0.8,
+        processed_share: float = 0.6,
+        cyrillic_share: float = 0.05,
+        initials_share: float = 0.6,
+        typo_rate: float = 0.03) -> list[list]:
+    """
+    Generate a deterministic synthetic corpus of ETIS-shaped publication records.
+    :param n_publications: Number of publications
+    :param seed: Random seed. Same seed and parameters give the same corpus.
+    :param people_per_publication: Number of distinct people relative to the number of publications
+    :param max_authors: Maximum number of authors of a publication
+    :param group_size: Size of the research groups that authors of a publication are drawn from
+    :param clustering: Probability that an author is drawn from the publication's group, otherwise drawn from all people
+    :param processed_share: Probability that an author is listed in the Authors field (with Guid) too
+    :param cyrillic_share: Probability that an author is written in Cyrillic in AuthorsText
+    :param initials_share: Probability that an author is written with initials in AuthorsText
+    :param typo_rate: Probability of a typo in an author's last name in AuthorsText
+    :return: Publications in the form of [[Guid, Authors json, AuthorsText], ...] (as neo4j_operations.get_publications)
+    """
+    rng = random.Random(seed)
+    people = generate_people(max(int(n_publications * people_per_publication), group_size), rng)
+    n_groups = max(len(people) // group_size, 1)
+    publications = list()
+    for _ in range(n_publications):
+        group = rng.randrange(n_groups)
+        group_people = people[group * group_size:(group + 1) * group_size]
+        n_authors = rng.randint(1, max_authors)
+        members = list()
+        for _ in range(n_authors):
+            person = rng.choice(group_people) if rng.random() < clustering else rng.choice(people)
+            if person not in members:
+                members += [person]
+
+        authors = list()
+        author_strings = list()
+        for guid, first_name, last_name in members:
+            if rng.random() < processed_share:
+                authors += [{
+                    "Guid": guid,
+                    "IdCode": None,
+                    "Name": f"{first_name} {last_name}",
+                    "RoleName": None,
+                    "RoleNameEng": rng.choice(role_names)}]
+            if rng.random() < typo_rate:
+                last_name = add_typo(last_name, rng)
+            format_names = initials_formats if rng.random() < initials_share else full_name_formats
+            author_string = author_formats[rng.choice(format_names)](first_name, last_name)
+            if rng.random() < cyrillic_share:
+                author_string = transliterate.translit(author_string, "ru")
+            author_strings += [author_string]
+        publications += [[str(uuid.UUID(int=rng.getrandbits(128))), json.dumps(authors), "; ".join(author_strings)]]
+    return publications
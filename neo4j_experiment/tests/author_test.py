@@ -1,4 +1,4 @@
-from data_operations import Author
+from data_operations import Author, GuidTable
 
 def test_init_by_dict():
     author = Author(**{"id":"123", "alias":"J. Smith", "name":"John F. Smith"})
@@ -46,3 +46,27 @@ def test_merging():
     assert author1 == author2
     assert author1.aliases == author2.aliases
     assert author1.name == author2.name
+
+
+def test_merging_integer_ids():
+    author_guids = GuidTable(guids=["b-guid", "a-guid"])
+    generated_id = author_guids.generate_id()
+    author1 = Author(id=author_guids.get_id("b-guid"), alias="J. Smith")
+    author2 = Author(id=author_guids.get_id("a-guid"), alias="John Smith")
+    author3 = Author(id=generated_id, alias="J. Smyth")
+
+    # Integer ids keep the alphabetical precedence of Guids
+    author3.merge(author1)
+    assert author3.id == author_guids.get_id("b-guid")
+    author3.merge(author2)
+    assert author_guids.get_guid(author3.id) == "a-guid"
+    assert author_guids.get_guid(generated_id).startswith("ffffffff")
+    # Guids seen after generated ids still win the merge
+    author4 = Author(id=author_guids.get_id("c-guid"), alias="J. Smith")
+    author5 = Author(id=author_guids.generate_id(), alias="J. Smith")
+    author5.merge(author4)
+    assert author_guids.get_guid(author5.id) == "c-guid"
+
+def test_slots():
+    author = Author(id="123", alias="J. Smith")
+    assert not hasattr(author, "__dict__")
@@ -0,0 +1,121 @@
+import pytest
+from data_operations import Author
+from match_operations import AliasScorer, BlockingIndex, MinHashIndex, SimilarityCache, best_matches, blocking_recall
+
+def test_blocking_keys():
+    blocking_index = BlockingIndex()
+    keys = blocking_index.get_keys("John F. Smith")
+    assert "name:Jsmith" in keys
+    assert "gram:Jmit" in keys
+    assert "initials:JFS" in keys
+    # All keys include the first letter
+    assert not blocking_index.get_keys("J. Smith").intersection(blocking_index.get_keys("R. Smith"))
+
+def test_blocking_candidates():
+    blocking_index = BlockingIndex()
+    blocking_index.add("1", {"J. Smith", "John F. Smith"})
+    blocking_index.add("2", {"J. Smyth"})
+    blocking_index.add("3", {"Peter Fletcher"})
+    assert blocking_index.candidates("1") == {"2"}
+    assert blocking_index.candidate_pairs() == {("1", "2")}
+    assert blocking_index.count_candidate_pairs() == 1
+
+    blocking_index.remove("2")
+    assert blocking_index.candidate_pairs() == set()
+
+def test_oversized_blocks():
+    blocking_index = BlockingIndex(max_block_size=2)
+    for i in range(3):
+        blocking_index.add(str(i), {"J. Smith"})
+    assert blocking_index.candidate_pairs() == set()
+
+def test_blocking_recall():
+    authors = {
+        "1": Author(id="1", alias="J. Smith"),
+        "2": Author(id="2", alias="J. Smitt"),
+        "3": Author(id="3", alias="Peter Fletcher")}
+    blocking_index = BlockingIndex()
+    for author_id, author in authors.items():
+        blocking_index.add(author_id, author.aliases)
+    assert blocking_recall(blocking_index, authors, threshold=0.8) == (2, 2)
+
+def test_alias_scorer():
+    authors = {
+        "1": Author(id="1", alias="J. Smith", name="John F. Smith"),
+        "2": Author(id="2", alias="Peter Fletcher"),
+        "3": Author(id="3", alias="R. Smith"),
+        "4": Author(id="4", alias="K. Tamm"),
+        "5": Author(id="5", alias="Kati Tamm")}
+    alias_scorer = AliasScorer(threshold=0.8, match_firstletter=True)
+    for author_id, author in authors.items():
+        alias_scorer.add(author_id, author.aliases)
+    author_ids = list(authors)
+    scores = alias_scorer.score(author_ids, author_ids)
+    # Same scores as Author.similarity_ratio, ratios below threshold are left out
+    for i, author_id1 in enumerate(author_ids):
+        for j, author_id2 in enumerate(author_ids):
+            ratio = authors[author_id1].similarity_ratio(authors[author_id2], match_firstletter=True)
+            assert scores[i, j] == (ratio if ratio >= 0.8 else 0)
+    # Ratio exactly at threshold is a match
+    assert alias_scorer.matching_pairs("4", ["5"]) == [("4", "5")]
+    assert alias_scorer.matching_pairs("1", ["2", "3"]) == []
+    # Batched pairs are the same as scoring every author separately
+    queries = [(author_id, [candidate_id for candidate_id in author_ids if candidate_id != author_id]) for author_id in author_ids]
+    assert alias_scorer.batch_matching_pairs(queries) == [
+        pair for author_id, candidate_ids in queries
+        for pair in alias_scorer.matching_pairs(author_id, candidate_ids)]
+    assert alias_scorer.batch_matching_pairs(queries) == [
+        (author_ids[i], author_ids[j]) for i, j in zip(*scores.nonzero()) if i != j]
+
+def test_similarity_cache():
+    author1 = Author(id=1, alias="J. Smith")
+    author2 = Author(id=2, alias="J. Smyth")
+    author3 = Author(id=3, alias="J Smith")
+    similarity_cache = SimilarityCache(maxsize=10)
+    ratio = similarity_cache.similarity_ratio(1, author1, 2, author2, match_firstletter=True)
+    assert ratio == author1.similarity_ratio(author2, match_firstletter=True)
+    # Pairs are symmetric
+    assert similarity_cache.similarity_ratio(2, author2, 1, author1, match_firstletter=True) == ratio
+    assert (similarity_cache.hits, similarity_cache.misses) == (1, 1)
+
+    # Merged author gets new aliases, so the cached ratio can't be used
+    author2.merge(author3)
+    similarity_cache.invalidate(2)
+    assert similarity_cache.similarity_ratio(1, author1, 2, author2, match_firstletter=True) == 1.0
+    assert similarity_cache.misses == 2
+
+def test_minhash_index():
+    minhash_index = MinHashIndex(bands=30, rows=2)
+    minhash_index.add(1, {"J. Smith", "John F. Smith"})
+    minhash_index.add(2, {"J. Smitt"})
+    minhash_index.add(3, {"Peter Fletcher"})
+    minhash_index.add(4, {"R. Smith"})
+    assert minhash_index.candidates(1) == {2}
+    assert minhash_index.candidate_pairs() == {(1, 2)}
+    assert minhash_index.count_candidate_pairs() == 1
+    # Query verifies candidates against the threshold
+    assert minhash_index.query("J. Smith", threshold=0.8) == {1: 1.0, 2: pytest.approx(12 / 14)}
+    assert minhash_index.query("Peter Fletcher", threshold=0.8) == {3: 1.0}
+
+    minhash_index.remove(2)
+    assert minhash_index.candidate_pairs() == set()
+    assert 2 not in minhash_index.query("J. Smith")
+
+def test_best_matches():
+    authors = {
+        1: Author(id=1, name="John Smith"),
+        2: Author(id=2, name="Peter Fletcher"),
+        3: Author(id=3, alias="J. Smith"),
+        4: Author(id=4, alias="J. Smith"),
+        5: Author(id=5, alias="K. Tamm"),
+        6: Author(id=6, name="Kati Tamm")}
+    groups = [([1, 2], [5, 3, 4]), ([6], [5]), ([], [3])]
+    # Same result as a sequential scan with similarity_ratio: first best candidate above threshold
+    expected_pairs = list()
+    for query_ids, candidate_ids in groups:
+        for query_id in query_ids:
+            ratios = [authors[query_id].similarity_ratio(authors[candidate_id]) for candidate_id in candidate_ids]
+            if max(ratios) > 0.6:
+                expected_pairs += [(query_id, candidate_ids[ratios.index(max(ratios))])]
+    assert best_matches(authors, groups, threshold=0.6) == expected_pairs == [(1, 3), (6, 5)]
+    assert best_matches(authors, groups, threshold=0.6, batch_size=1) == expected_pairs
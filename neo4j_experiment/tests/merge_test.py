@@ -0,0 +1,100 @@
+import logging
+from data_operations import Author, GuidTable
+from match_operations import AliasScorer, BlockingIndex
+from merge_operations import AuthorResolver, CoauthorIndex, DisjointSet, merge_pairs
+
+def test_disjoint_set():
+    author_ids = DisjointSet(["c", "b", "a", "d"])
+    assert author_ids.find("c") == "c"
+    assert author_ids.union("c", "b") == "b"
+    assert author_ids.union("d", "b") == "b"
+    assert author_ids.union("a", "d") == "a"
+    # Canonical id is the smallest id in the set
+    assert {author_ids.find(id) for id in ["a", "b", "c", "d"]} == {"a"}
+    assert len(author_ids) == 4
+    assert sorted(author_ids.members("b")) == [0, 1, 2, 3]
+
+def test_merge_pairs():
+    authors = {
+        "1": Author(id="1", alias="J. Smith", name="John Smith"),
+        "2": Author(id="2", alias="John Smith"),
+        "3": Author(id="3", alias="J. Smyth"),
+        "4": Author(id="4", alias="Peter Fletcher")}
+    author_ids = DisjointSet(authors)
+    merged_ids = merge_pairs(authors, author_ids, {("2", "3"), ("1", "2")})
+    assert merged_ids == {"2": "1", "3": "1"}
+    assert set(authors) == {"1", "4"}
+    assert authors["1"].aliases == {"J. Smith", "John Smith", "J. Smyth"}
+    assert author_ids.find("3") == "1"
+
+def test_merge_precedence_of_later_guids():
+    # Guid first seen in a later run gets a larger id, but wins the merge by Guid, the same as in a run from scratch
+    author_guids = GuidTable(guids=["b-guid"])
+    later_id = author_guids.get_id("a-guid")
+    generated_id = author_guids.generate_id()
+    authors = {
+        0: Author(id=0, alias="J. Smith"),
+        later_id: Author(id=later_id, alias="J. Smith"),
+        generated_id: Author(id=generated_id, alias="J. Smith")}
+    author_ids = DisjointSet(authors, key=author_guids.get_sort_key)
+    assert merge_pairs(authors, author_ids, {(0, later_id), (later_id, generated_id)}) == {0: later_id, generated_id: later_id}
+    assert authors[later_id].id == later_id
+    assert author_ids.find(0) == later_id
+
+def get_resolver(**kwargs) -> AuthorResolver:
+    authors = {
+        "1": Author(id="1", alias="J. Smith"),
+        "2": Author(id="2", alias="P. Fletcher"),
+        "3": Author(id="3", alias="J. Smyth"),
+        "4": Author(id="4", alias="P. Fletcher"),
+        "5": Author(id="5", alias="J. Smith"),
+        "6": Author(id="6", alias="K. Tamm")}
+    authors_by_publication = {
+        "pub1": {"processed": set(), "raw": {"1", "2"}},
+        "pub2": {"processed": set(), "raw": {"3", "4"}},
+        "pub3": {"processed": set(), "raw": {"5", "6"}}}
+    author_ids = DisjointSet(authors)
+    blocking_index = BlockingIndex()
+    alias_scorer = AliasScorer(threshold=0.8)
+    for author_id, author in authors.items():
+        blocking_index.add(author_id, author.aliases)
+        alias_scorer.add(author_id, author.aliases)
+    return AuthorResolver(authors, author_ids, authors_by_publication, blocking_index, alias_scorer, 0.8, **kwargs)
+
+def test_author_resolver():
+    author_resolver = get_resolver()
+    authors = author_resolver.authors
+    n_merged = author_resolver.resolve(logging.getLogger("test"))
+    # Authors with similar names and similar coauthors are merged, "J. Smith" from pub3 has no similar coauthors
+    assert n_merged == 2
+    assert set(authors) == {"1", "2", "5", "6"}
+    assert author_resolver.coauthor_index.coauthors("1") == {"2"}
+    assert not author_resolver.dirty_ids
+
+def test_coauthor_index():
+    author_ids = DisjointSet(["1", "2", "3", "4"])
+    authors_by_publication = {
+        "pub1": {"processed": {"1"}, "raw": {"2"}},
+        "pub2": {"processed": set(), "raw": {"3", "4"}}}
+    coauthor_index = CoauthorIndex(authors_by_publication, author_ids)
+    assert coauthor_index.coauthors("1") == {"2"}
+    assert coauthor_index.coauthors("3") == {"4"}
+
+    author_ids.union("2", "3")
+    coauthor_index.relabel({"3": "2"})
+    assert coauthor_index.coauthors("2") == {"1", "4"}
+    assert coauthor_index.coauthors("4") == {"2"}
+
+def test_parallel_author_resolver():
+    author_resolver = get_resolver(n_processes=2, partition_size=1)
+    n_merged = author_resolver.resolve(logging.getLogger("test"))
+    assert n_merged == 2
+    assert set(author_resolver.authors) == {"1", "2", "5", "6"}
+
+def test_coauthor_evidence():
+    author_resolver = get_resolver(max_coauthor_comparisons=0)
+    # Coauthors with identical aliases are found without fuzzy comparisons
+    assert author_resolver.has_shared_coauthors("1", "3")
+    assert author_resolver.has_similar_coauthors("1", "3")
+    assert not author_resolver.has_shared_coauthors("1", "5")
+    assert author_resolver.similarity_cache.misses == 0
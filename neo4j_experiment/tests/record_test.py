@@ -0,0 +1,11 @@
+import os
+from record_operations import RecordDecoder, load_settings
+
+def test_settings_decoder():
+    settings = load_settings(os.path.join(os.path.dirname(__file__), "..", "settings.json"))
+    decoder = RecordDecoder.from_settings(settings)
+    assert decoder.columns == list(settings["publication_columns"])
+    assert decoder.row_class.__name__ == "Publication"
+    # Dates are decoded to days since 1970-01-01
+    for column in settings["publication_date_columns"]:
+        assert settings["publication_columns"][column] == "INT"
@@ -0,0 +1,44 @@
+import os
+from record_operations import load_settings
+from sql_operations import create_fulltext_index, create_table, get_connection, insert_rows, search_fulltext
+
+def test_fulltext_search():
+    connection = get_connection(":memory:")
+    create_table("PublicationRaw", {"Guid": "TEXT PRIMARY KEY", "Title": "TEXT", "AbstractEst": "TEXT"}, connection)
+    insert_rows(
+        "PublicationRaw",
+        ["Guid", "Title", "AbstractEst"],
+        [
+            ("pub1", "Climate change in Estonian forests", None),
+            ("pub2", "Protein folding", "Valkude voltumine ja kliimamuutuste mõju"),
+            ("pub3", "Eesti keele grammatika", "Käänded ja pöörded"),
+            ("pub4", "Kliima", "Changing climates")],
+        connection)
+    create_fulltext_index("PublicationRaw", ["Title", "AbstractEst"], connection)
+
+    assert set(search_fulltext("PublicationRaw", "climate", connection)) == {"pub1", "pub4"}
+    assert set(search_fulltext("PublicationRaw", "kliima", connection)) == {"pub2", "pub4"}
+    # Diacritics are folded
+    assert search_fulltext("PublicationRaw", "poorded", connection) == ["pub3"]
+    assert search_fulltext("PublicationRaw", "climate forests", connection) == ["pub1"]
+    # Matches in columns with larger weight rank higher
+    assert search_fulltext("PublicationRaw", "kliima", connection, column_weights=[10, 1], limit=1) == ["pub4"]
+    assert search_fulltext("PublicationRaw", "kliima", connection, column_weights=[1, 10], limit=1) == ["pub2"]
+    assert search_fulltext("PublicationRaw", "?!", connection) == []
+
+def test_fulltext_search_settings():
+    settings = load_settings(os.path.join(os.path.dirname(__file__), "..", "settings.json"))
+    publication_fulltext_columns = settings["publication_fulltext_columns"]
+    connection = get_connection(":memory:")
+    create_table("PublicationRaw", settings["publication_columns"], connection)
+    insert_rows(
+        "PublicationRaw",
+        ["Guid", "Title", "AbstractEng"],
+        [("pub1", "Forest soils", "Effects of climate change"), ("pub2", "Climate change", "Forest soils")],
+        connection)
+    create_fulltext_index("PublicationRaw", list(publication_fulltext_columns), connection)
+    # Title matches weigh more than abstract matches
+    assert search_fulltext(
+        "PublicationRaw", "climate", connection, column_weights=list(publication_fulltext_columns.values())) == ["pub2", "pub1"]
+    assert search_fulltext(
+        "PublicationRaw", "forest", connection, column_weights=list(publication_fulltext_columns.values())) == ["pub1", "pub2"]
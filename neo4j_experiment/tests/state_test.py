@@ -0,0 +1,69 @@
+from data_operations import Author, GuidTable
+from merge_operations import DisjointSet, merge_pairs, remove_publications
+from state_operations import get_publication_hash, load_state, save_state, state_exists
+
+def get_state():
+    author_guids = GuidTable(guids=["b-guid", "a-guid"])
+    generated_id = author_guids.generate_id()
+    authors = {
+        0: Author(id=0, alias="J. Smith", name="John Smith", publications={"pub1"}),
+        1: Author(id=1, alias="P. Fletcher", publications={"pub1"}),
+        generated_id: Author(id=generated_id, alias="J. Smyth", publications={"pub1"})}
+    author_ids = DisjointSet(authors)
+    merge_pairs(authors, author_ids, {(0, generated_id)})
+    authors_by_publication = {
+        "pub1": {"processed": {0, 1}, "raw": {generated_id}},
+        "pub2": {"processed": set(), "raw": set()}}
+    publication_hashes = {"pub1": get_publication_hash("[]", "Smith, J.; Fletcher, P."), "pub2": get_publication_hash("[]", "")}
+    return author_guids, author_ids, authors, authors_by_publication, publication_hashes
+
+def test_save_and_load_state(tmp_path):
+    path = str(tmp_path / "author_state.sql")
+    author_guids, author_ids, authors, authors_by_publication, publication_hashes = get_state()
+    generated_id = GuidTable.generated_id_start
+    assert not state_exists(path)
+    save_state(path, author_guids, author_ids, authors, authors_by_publication, publication_hashes)
+    assert state_exists(path)
+
+    loaded_guids, loaded_ids, loaded_authors, loaded_authors_by_publication, loaded_hashes = load_state(path)
+    assert loaded_guids.guids == author_guids.guids
+    assert loaded_guids.generated_guids == author_guids.generated_guids
+    assert loaded_guids.get_id("b-guid") == 1
+    assert loaded_ids.find(generated_id) == 0
+    assert set(loaded_authors) == {0, 1}
+    assert loaded_authors[0].aliases == {"John Smith", "J. Smith", "J. Smyth"}
+    assert loaded_authors[0].name == "John Smith"
+    assert loaded_authors[0].similarity_ratio(authors[0]) == 1.0
+    assert loaded_authors_by_publication == authors_by_publication
+    assert loaded_hashes == publication_hashes
+
+def test_incremental_save(tmp_path):
+    path = str(tmp_path / "author_state.sql")
+    save_state(path, *get_state())
+    author_guids, author_ids, authors, authors_by_publication, publication_hashes = load_state(path)
+
+    # Guid first seen in a later run gets a smaller id than generated ids
+    new_id = author_guids.get_id("c-guid")
+    assert new_id < GuidTable.generated_id_start
+    author_ids.add(new_id)
+    authors[new_id] = Author(id=new_id, alias="K. Tamm", publications={"pub3"})
+    authors_by_publication["pub3"] = {"processed": {new_id}, "raw": set()}
+    publication_hashes["pub3"] = get_publication_hash("[]", "Tamm, K.")
+    # Modified publication is removed from its authors and resolved again
+    assert remove_publications(authors, author_ids, authors_by_publication, {"pub1"}) == set()
+    assert set(authors) == {new_id}
+    generated_id = author_guids.generate_id()
+    author_ids.add(generated_id)
+    authors[generated_id] = Author(id=generated_id, alias="P. Fletcher", publications={"pub1"})
+    authors_by_publication["pub1"] = {"processed": set(), "raw": {generated_id}}
+    publication_hashes["pub1"] = get_publication_hash("[]", "Fletcher, P.")
+    save_state(path, author_guids, author_ids, authors, authors_by_publication, publication_hashes, publication_ids={"pub1", "pub3"})
+
+    loaded_guids, loaded_ids, loaded_authors, loaded_authors_by_publication, loaded_hashes = load_state(path)
+    assert loaded_guids.get_id("c-guid") == new_id
+    assert loaded_guids.get_guid(generated_id) == author_guids.get_guid(generated_id)
+    assert set(loaded_authors) == {new_id, generated_id}
+    assert loaded_authors[new_id].aliases == {"K. Tamm"}
+    assert loaded_authors_by_publication == authors_by_publication
+    assert loaded_hashes == publication_hashes
+    assert loaded_ids.find(GuidTable.generated_id_start) == 0
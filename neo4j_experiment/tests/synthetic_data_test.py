@@ -0,0 +1,23 @@
+import json
+import random
+import regex
+from synthetic_data import add_typo, generate_publications
+
+def test_generate_publications():
+    publications = generate_publications(50, seed=1, cyrillic_share=0.5)
+    # Same seed gives the same corpus
+    assert publications == generate_publications(50, seed=1, cyrillic_share=0.5)
+    assert publications != generate_publications(50, seed=2, cyrillic_share=0.5)
+    assert len(publications) == 50
+    for guid, authors, authors_text in publications:
+        assert len(guid) == 36
+        assert all({"Guid", "Name", "RoleNameEng"}.issubset(author) for author in json.loads(authors))
+        assert authors_text
+    assert any(regex.search(r"\p{IsCyrillic}", authors_text) for _, _, authors_text in publications)
+
+def test_add_typo():
+    rng = random.Random(0)
+    for _ in range(20):
+        typo = add_typo("Tamm", rng)
+        assert typo[0] == "T"
+        assert abs(len(typo) - 4) <= 1
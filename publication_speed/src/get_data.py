@@ -3,11 +3,16 @@ import datetime
 import json
 import logging
 import os
-import re
 import sys
 # external
 import requests
 import tqdm
+# local
+# Modules shared between the ETIS projects
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "etis_common"))
+import query_operations
+import record_operations
+import snapshot_operations
 
 
 ##########
@@ -32,6 +37,18 @@ ETIS_INSTITUTION_IDS = {
 }
 
 RAW_DATA_DIRECTORY_PATH = "./data/raw/"
+# Partition columns of raw snapshots in the form of {partition column: (nested) field}.
+# Reads that filter by partition columns open only the matching partitions.
+PROJECT_PARTITIONS = {"Status": "StatusNameEng", "StartYear": "ProjectStartYear"}
+PUBLICATION_PARTITIONS = {"PublishingYear": "DATA.PublishingYear", "ClassificationCode": "DATA.ClassificationCode"}
+
+# Snapshot retention: older raw snapshots are kept deduplicated in the record store and materialised on demand
+MATERIALISED_SNAPSHOTS = 1          # Number of latest snapshots of every stage to keep as files (0 - record store only)
+SNAPSHOT_MAX_AGE_DAYS = None        # Delete snapshots older than this (None - keep all)
+
+# SQLite database of the latest raw snapshots for queries (in the raw data directory)
+QUERY_DATABASE_FILENAME = "etis.sql"
+
 RESULTS_DATA_DIRECTORY_PATH = "./data/results/"
 
 
@@ -82,25 +99,6 @@ def get_timestamp_string() -> str:
     return timestamp_string
 
 
-def read_latest_file(dir_path: str, file_handle: str = None) -> list[dict]:
-    """
-    Reads file with the latest timestamp in filename from given dir_path.
-    If file_handle is given, checks only filenames with the given file_handle followed by a timestamp.
-    """
-    if not file_handle:
-        file_handle = ".+"
-    name_pattern = file_handle + r'_(\d+)'
-
-    files = [file for file in os.listdir(dir_path) if re.match(name_pattern, file)]
-    files_latest = sorted(files, key=lambda x: re.match(name_pattern, x).group(1))[-1]
-    path = f'{dir_path.strip("/")}/{files_latest}'
-
-    with open(path, encoding="utf8") as read_file:
-        data = json.loads(read_file.read())
-    
-    return data
-
-
 #####################
 # Environment setup #
 #####################
@@ -112,6 +110,9 @@ if not os.path.exists(RAW_DATA_DIRECTORY_PATH):
 if not os.path.exists(RESULTS_DATA_DIRECTORY_PATH):
     os.makedirs(RESULTS_DATA_DIRECTORY_PATH)
 
+# Snapshot catalog
+snapshot_catalog = snapshot_operations.SnapshotCatalog(RAW_DATA_DIRECTORY_PATH, n_materialised=MATERIALISED_SNAPSHOTS)
+
 # Logger
 logger = logging.getLogger()
 logger.setLevel("INFO")
@@ -160,20 +161,28 @@ with tqdm.tqdm() as ETIS_progress_bar:
             _ = ETIS_progress_bar.update()
 
 
-projects_save_path = f'{RAW_DATA_DIRECTORY_PATH.strip("/")}/projects_{get_timestamp_string()}.json'
-with open(projects_save_path, "w", encoding="utf8") as save_file:
-    save_file.write(json.dumps(projects, indent=2, ensure_ascii=False))
+# Start year is a partition column of raw project snapshots
+for project in projects:
+    project["ProjectStartYear"] = int(project["ProjectStartDate"][-4:]) if project.get("ProjectStartDate") else None
+
+# Raw data is saved as columnar snapshots: analysis stages read only the columns they use
+projects_save_path = snapshot_catalog.save_snapshot(projects, "projects", get_timestamp_string(), partition_by=PROJECT_PARTITIONS)
 
 info_string = f'Found {len(projects)} relevant projects in ETIS. Saved to {projects_save_path}'
 logger.info(info_string)
 
+n_project_changes = snapshot_catalog.count_changes("projects")
+if n_project_changes:
+    info_string = f'Compared to the previous harvest: {n_project_changes["added"]} projects added, {n_project_changes["removed"]} removed, {n_project_changes["modified"]} modified.'
+    logger.info(info_string)
+
 
 ############################
 # Filter relevant projects #
 ############################
 
 # Reload data from save file
-projects = read_latest_file(RAW_DATA_DIRECTORY_PATH, "projects")
+projects = snapshot_catalog.read_latest_snapshot("projects")
 
 # Filter projects with publications and duration between 2.5 and 3.5 years
 relevant_projects = []
@@ -181,26 +190,25 @@ for project in projects:
     if not project["Publications"]:
         continue
 
-    start_date = datetime.datetime.strptime(project["ProjectStartDate"], "%d.%m.%Y")
-    end_date = datetime.datetime.strptime(project["ProjectEndDate"], "%d.%m.%Y")
-    project_duration = end_date - start_date
-    project_duration_months = project_duration.days // 30
+    # Days since 1970-01-01, parsed once per distinct date
+    project_duration_days = record_operations.get_epoch_day(project["ProjectEndDate"]) - record_operations.get_epoch_day(project["ProjectStartDate"])
+    project_duration_months = project_duration_days // 30
     # Skip projects with duration outside the interval of 2.5 years to 3.5 years
     if not (2.5 * 12 <= project_duration_months <= 3.5 * 12):
         continue
 
     relevant_projects += [project]
 
-relevant_projects_save_path = f'{RAW_DATA_DIRECTORY_PATH.strip("/")}/relevant_projects_{get_timestamp_string()}.json'
-with open(relevant_projects_save_path, "w", encoding="utf8") as save_file:
-    save_file.write(json.dumps(relevant_projects, indent=2, ensure_ascii=False))
+relevant_projects_save_path = snapshot_catalog.save_snapshot(relevant_projects, "relevant_projects", get_timestamp_string())
 
 
 ################################
 # Get project publication info #
 ################################
 
-relevant_projects = read_latest_file(RAW_DATA_DIRECTORY_PATH, "relevant_projects")
+relevant_projects = snapshot_catalog.read_latest_snapshot(
+    "relevant_projects",
+    columns=["Guid", "Publications"])
 
 # Select unique publications (same publications can be reported under several projects)
 n_publications = 0
@@ -253,37 +261,45 @@ for publication in tqdm.tqdm(publications, desc="Requesting ETIS publications"):
     except Exception as exception:
         publications_with_no_data += [publication]
 
-publications_save_path = f'{RAW_DATA_DIRECTORY_PATH.strip("/")}/publications_{get_timestamp_string()}.json'
-with open(publications_save_path, "w", encoding="utf8") as save_file:
-    save_file.write(json.dumps(publications, indent=2, ensure_ascii=False))
+# Partitioned by publishing year and classification code, so that reading only scientific articles skips other partitions
+publications_save_path = snapshot_catalog.save_snapshot(publications, "publications", get_timestamp_string(), sort_by="DATA.ClassificationCode", key_field="GUID", partition_by=PUBLICATION_PARTITIONS)
 
 info_string1 = f'Pulled publication data from ETIS. Saved to {publications_save_path}'
 info_string2 = f'ETIS API failed to return data for {len(publications_with_no_data)} of the {len(publications)} publications'
 logger.info(info_string1)
 logger.info(info_string2)
 
+n_publication_changes = snapshot_catalog.count_changes("publications")
+if n_publication_changes:
+    info_string = f'Compared to the previous harvest: {n_publication_changes["added"]} publications added, {n_publication_changes["removed"]} removed, {n_publication_changes["modified"]} modified.'
+    logger.info(info_string)
+
 
 ################
 # Process data #
 ################
 
 # Reload data from save file
-relevant_projects = read_latest_file(RAW_DATA_DIRECTORY_PATH, "relevant_projects")
-publications = read_latest_file(RAW_DATA_DIRECTORY_PATH, "publications")
-
-# Select only already published scientific articles
-relevalt_publications = []
-for publication in publications:
-    if not publication["DATA"]:
-        continue
-    if not publication["DATA"]["ClassificationCode"] in ETIS_SCIENTIFIC_ARTICLES_CLASSIFICATION_CODES:
-        continue
-    if not publication["DATA"]["PublicationStatusEng"].lower() == "published":
-        continue
-
-    relevalt_publications += [publication]
-
-publication_timestamps = {publication["GUID"]: datetime.datetime.fromisoformat(publication["DATA"]["DateCreated"]) for publication in relevalt_publications}
+relevant_projects = snapshot_catalog.read_latest_snapshot(
+    "relevant_projects",
+    columns=["Publications", "ProjectStartDate", "ProjectEndDate", "FinancingInPeriodsTotal", "Institutions"])
+
+# Already published scientific articles
+etis_database = query_operations.EtisDatabase(
+    f'{RAW_DATA_DIRECTORY_PATH.strip("/")}/{QUERY_DATABASE_FILENAME}',
+    snapshot_catalog,
+    file_handles=["publications"],
+    filters={"publications": {"DATA.ClassificationCode": ETIS_SCIENTIFIC_ARTICLES_CLASSIFICATION_CODES}})
+classification_code_placeholders = ", ".join("?" * len(ETIS_SCIENTIFIC_ARTICLES_CLASSIFICATION_CODES))
+relevant_publications = etis_database.query(
+    f"""
+    SELECT Guid, DateCreated
+    FROM Publication
+    WHERE ClassificationCode IN ({classification_code_placeholders}) AND lower(PublicationStatusEng) = 'published'
+    """,
+    ETIS_SCIENTIFIC_ARTICLES_CLASSIFICATION_CODES)
+
+publication_timestamps = {publication["Guid"]: datetime.datetime.fromisoformat(publication["DateCreated"]) for publication in relevant_publications}
 
 # Get relative times
 project_publication_relative_times = []
@@ -294,9 +310,9 @@ for project in relevant_projects:
 
     result = {}
     project_publication_timestamps = [publication_timestamps[publication["Guid"]] for publication in project_relevant_publications]
-    end_date = datetime.datetime.strptime(project["ProjectEndDate"], "%d.%m.%Y")
-    start_date = datetime.datetime.strptime(project["ProjectStartDate"], "%d.%m.%Y")
-    duration_days = (end_date - start_date).days
+    end_day = record_operations.get_epoch_day(project["ProjectEndDate"])
+    duration_days = end_day - record_operations.get_epoch_day(project["ProjectStartDate"])
+    end_date = datetime.datetime.combine(record_operations.get_date(end_day), datetime.time())
     # Days from project end to publication
     relative_time_days = [(end_date - timestamp).days for timestamp in project_publication_timestamps]
 
@@ -325,3 +341,13 @@ logger.info(info_string)
 project_publication_relative_times_path = f'{RESULTS_DATA_DIRECTORY_PATH.strip("/")}/project_publication_relative_times_{get_timestamp_string()}.json'
 with open(project_publication_relative_times_path, "w", encoding="utf8") as save_file:
     save_file.write(json.dumps(project_publication_relative_times, indent=2, ensure_ascii=False))
+
+
+############################
+# Apply snapshot retention #
+############################
+
+n_removed_snapshots, n_dematerialised_snapshots = snapshot_catalog.apply_retention(max_age_days=SNAPSHOT_MAX_AGE_DAYS)
+
+info_string = f'Removed {n_removed_snapshots} expired raw snapshots. Moved {n_dematerialised_snapshots} older raw snapshots to the record store.'
+logger.info(info_string)